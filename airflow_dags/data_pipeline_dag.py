@@ -44,6 +44,7 @@ with DAG(
 
     # --------------------
     # Stage 2: Load Meter CSV into Postgres
+    # (chunks are checkpointed, so a retry only loads what the failed try didn't commit)
     # --------------------
     load_meter_csv_task = PythonOperator(
         task_id="load_meter_data_to_postgres",
@@ -52,6 +53,7 @@ with DAG(
             "csv_relative_path": "raw/final_meter_features.csv",
             "table_name": "meter_data_raw",
         },
+        retries=2,
     )
 
     # --------------------
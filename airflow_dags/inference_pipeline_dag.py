@@ -34,13 +34,14 @@ with DAG(
         python_callable=load_latest_model,
     )
 
-    # Stage 2: Prepare features for inference
+    # Stage 2: Check the input and resolve the NaN fill values (training means)
     prepare_features_task = PythonOperator(
         task_id="prepare_features_for_inference",
         python_callable=prepare_features_for_inference,
     )
 
-    # Stage 3: Make predictions
+    # Stage 3: Score rows past the watermark in chunks (INFERENCE_CHUNK_SIZE rows) and append
+    # them to the predictions CSV; everything is re-scored when the model version changes
     prediction_task = PythonOperator(
         task_id="make_predictions",
         python_callable=make_predictions,
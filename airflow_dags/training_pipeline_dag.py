@@ -4,7 +4,8 @@ from datetime import datetime
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 
-from src.models.train import train_logistic_regression, log_model_to_mlflow
+from src.models.train import train_logistic_regression, log_model_to_mlflow, replay_mlflow_spool
+from src.models.model_sweep import run_model_sweep
 
 default_args = {
     "owner": "airflow",
@@ -25,7 +26,8 @@ with DAG(
     max_active_runs=1,
 ) as dag:
 
-    print("🧱 [DAG PARSE] Defining tasks train_linear_regression_model and log_model_to_mlflow")
+    print("🧱 [DAG PARSE] Defining tasks train_linear_regression_model, log_model_to_mlflow, replay_mlflow_spool "
+          "and model_sweep")
 
     train_model_task = PythonOperator(
         task_id="train_logistic_regression_model",
@@ -40,6 +42,23 @@ with DAG(
         provide_context=True,
     )
 
-    train_model_task >> log_model_task
+    # Finishes MLflow runs left in the spool (server down, upload cut short at task exit)
+    replay_spool_task = PythonOperator(
+        task_id="replay_mlflow_spool",
+        python_callable=replay_mlflow_spool,
+        provide_context=True,
+    )
+
+    # K-fold CV over the candidate grid once the main model is trained (MODEL_SWEEP_WORKERS processes),
+    # a no-op unless MODEL_SWEEP_ENABLED=1;
+    # saves its best candidate under artifacts/sweep (served model is unchanged) and logs every
+    # candidate to MLflow, spooling runs for replay_mlflow_spool
+    model_sweep_task = PythonOperator(
+        task_id="model_sweep",
+        python_callable=run_model_sweep,
+        provide_context=True,
+    )
+
+    train_model_task >> [log_model_task, model_sweep_task] >> replay_spool_task
 
     print("✅ [DAG PARSE] DAG meter_training_pipeline_dag is fully defined.")
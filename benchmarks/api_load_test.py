@@ -0,0 +1,225 @@
+"""
+Load test / latency benchmark for the model API.
+
+Replays realistic meter payloads against /predict, /predict/batch and
+/predict/stream with a configurable number of concurrent clients and reports
+throughput and p50/p95/p99 latency as JSON, so runs can be compared across
+commits.
+
+Usage (from the repo root):
+    # In-process (ASGI transport, no network, lifespan included)
+    python benchmarks/api_load_test.py --requests 2000 --concurrency 32
+
+    # Against a running server
+    python benchmarks/api_load_test.py --url http://localhost:5501 --scenarios predict batch
+
+Payloads are sampled from data/raw/final_meter_features.csv unless --payloads
+points to a JSON-lines file with one feature record per line.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CSV = os.path.join(REPO_ROOT, "data", "raw", "final_meter_features.csv")
+
+FEATURE_COLS = ['voltage', 'temperature', 'power_factor', 'load_kw', 'frequency_hz',
+                'hour', 'day_of_week', 'is_weekend', 'voltage_flag', 'pf_issue',
+                'high_temp', 'load_intensity']
+INT_COLS = {'hour', 'day_of_week', 'is_weekend', 'voltage_flag', 'pf_issue', 'high_temp'}
+
+
+def load_payloads(csv_path=DEFAULT_CSV, payloads_path=None, limit=None, seed=42):
+    """Feature records (dicts) to replay, from a JSON-lines file or the meter features CSV."""
+    if payloads_path:
+        with open(payloads_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        df = pd.read_csv(csv_path, usecols=FEATURE_COLS)
+        df = df.fillna(df.mean())
+        records = [
+            {col: int(row[col]) if col in INT_COLS else float(row[col]) for col in FEATURE_COLS}
+            for row in df.to_dict(orient="records")
+        ]
+    random.Random(seed).shuffle(records)
+    return records[:limit] if limit else records
+
+
+def summarize(name, latencies, rows_per_request, errors, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000
+    completed = len(latencies)
+    summary = {
+        "scenario": name,
+        "requests": completed,
+        "errors": errors,
+        "rows": completed * rows_per_request,
+        "elapsed_seconds": round(elapsed, 4),
+        "requests_per_second": round(completed / elapsed, 1) if elapsed else None,
+        "rows_per_second": round(completed * rows_per_request / elapsed, 1) if elapsed else None,
+    }
+    if completed:
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        summary.update({
+            "latency_ms": {
+                "mean": round(float(latencies_ms.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(latencies_ms.max()), 3),
+            }
+        })
+    return summary
+
+
+async def run_scenario(client, name, make_request, total_requests, concurrency, rows_per_request):
+    """Fires total_requests requests from `concurrency` concurrent clients."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, rows_per_request, errors, time.perf_counter() - started)
+
+
+def build_scenarios(payloads, batch_size, stream_rows):
+    n = len(payloads)
+
+    async def predict(client, i):
+        return await client.post("/predict", json=payloads[i % n])
+
+    async def batch(client, i):
+        start = (i * batch_size) % n
+        records = [payloads[(start + k) % n] for k in range(batch_size)]
+        return await client.post("/predict/batch", json={"records": records})
+
+    async def columnar(client, i):
+        start = (i * batch_size) % n
+        records = [payloads[(start + k) % n] for k in range(batch_size)]
+        columns = {col: [r[col] for r in records] for col in FEATURE_COLS}
+        return await client.post("/predict/batch", json={"columns": columns})
+
+    async def stream(client, i):
+        start = (i * stream_rows) % n
+        body = "".join(json.dumps(payloads[(start + k) % n]) + "\n" for k in range(stream_rows))
+        return await client.post("/predict/stream", content=body.encode(),
+                                 headers={"Content-Type": "application/x-ndjson"})
+
+    return {
+        "predict": (predict, 1),
+        "batch": (batch, batch_size),
+        "columnar": (columnar, batch_size),
+        "stream": (stream, stream_rows),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(url=None, scenarios=("predict", "batch"), requests=1000, concurrency=16,
+                        batch_size=100, stream_rows=1000, warmup=50, payloads=None):
+    """Runs the scenarios in-process (url=None) or against url; returns the JSON-able report."""
+    import httpx
+
+    payloads = payloads or load_payloads()
+    available = build_scenarios(payloads, batch_size, stream_rows)
+
+    async def run_all(client):
+        results = []
+        for name in scenarios:
+            make_request, rows = available[name]
+            # Warm up connection pools, caches and lazy imports before measuring
+            await run_scenario(client, f"{name}-warmup", make_request, warmup, concurrency, rows)
+            results.append(await run_scenario(client, name, make_request, requests, concurrency, rows))
+        return results
+
+    if url:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+            results = await run_all(client)
+    else:
+        sys.path.insert(0, REPO_ROOT)
+        os.chdir(REPO_ROOT)  # the app resolves its model and templates relative to the repo root
+        from src.api.server import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                results = await run_all(client)
+
+    return {
+        "commit": _git_commit(),
+        "target": url or "in-process",
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "stream_rows": stream_rows,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: in-process)")
+    parser.add_argument("--scenarios", nargs="+", default=["predict", "batch"],
+                        choices=["predict", "batch", "columnar", "stream"])
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100, help="Rows per /predict/batch request")
+    parser.add_argument("--stream-rows", type=int, default=1000, help="Rows per /predict/stream request")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per scenario")
+    parser.add_argument("--payloads", default=None, help="JSON-lines file of feature records")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="In-process only: disable the /predict cache (PREDICT_CACHE_SIZE=0)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        os.environ["PREDICT_CACHE_SIZE"] = "0"
+
+    report = asyncio.run(run_benchmark(
+        url=args.url,
+        scenarios=args.scenarios,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        stream_rows=args.stream_rows,
+        warmup=args.warmup,
+        payloads=load_payloads(payloads_path=args.payloads),
+    ))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Rows/sec of batch inference (src/models/inference.py) with 1..N worker processes.
+
+Builds a synthetic input by repeating final_meter_features.csv until it has
+--rows rows (ids renumbered), then times make_predictions() per worker count
+and reports rows/sec and speed-up over one worker as JSON.
+
+Usage (from the repo root):
+    python benchmarks/inference_scaling.py --rows 2000000 --workers 1 2 4 8 --output scaling.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from src.models import inference  # noqa: E402
+
+
+def build_input(rows, path):
+    base = pd.read_csv(inference.METER_DATA_CSV)
+    written = 0
+    with open(path, "w", newline="") as out:
+        while written < rows:
+            block = base.head(rows - written).copy()
+            block["id"] = range(written + 1, written + len(block) + 1)
+            block.to_csv(out, header=(written == 0), index=False)
+            written += len(block)
+    return path
+
+
+def measure(csv_path, output_path, workers, chunksize):
+    start = time.perf_counter()
+    summary = inference.make_predictions(csv_path=csv_path, output_path=output_path,
+                                         chunksize=chunksize, workers=workers)
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "rows": summary["rows"],
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(summary["rows"] / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunksize", type=int, default=inference.INFERENCE_CHUNK_SIZE)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = build_input(args.rows, os.path.join(tmp_dir, "meter_features.csv"))
+        output_path = os.path.join(tmp_dir, "predictions.csv")
+        results = [measure(csv_path, output_path, workers, args.chunksize) for workers in args.workers]
+
+    baseline = results[0]["rows_per_second"]
+    for result in results:
+        result["speedup"] = round(result["rows_per_second"] / baseline, 2)
+
+    report = json.dumps({"cpu_count": os.cpu_count(), "chunksize": args.chunksize, "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
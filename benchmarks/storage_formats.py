@@ -0,0 +1,80 @@
+"""
+CSV vs Parquet vs Feather for final_meter_features: file size, write time,
+full read time and projected read time (the 12 features + target that
+training and inference need), as JSON.
+
+Builds a synthetic input by repeating final_meter_features.csv until it has
+--rows rows. Needs pyarrow.
+
+Usage (from the repo root):
+    python benchmarks/storage_formats.py --rows 2000000 --output storage.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from src.data.features import FEATURE_COLS, TARGET_COL  # noqa: E402
+from src.data.storage import FORMAT_SUFFIXES, read_table, write_table  # noqa: E402
+from src.models.inference import METER_DATA_CSV  # noqa: E402
+
+
+def build_frame(rows):
+    base = pd.read_csv(METER_DATA_CSV)
+    repeats = -(-rows // len(base))
+    df = pd.concat([base] * repeats, ignore_index=True).head(rows)
+    df["id"] = range(1, len(df) + 1)
+    return df
+
+
+def _timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best, 4)
+
+
+def measure(df, fmt, tmp_dir, repeat):
+    path = os.path.join(tmp_dir, f"final_meter_features{FORMAT_SUFFIXES[fmt]}")
+    projection = FEATURE_COLS + [TARGET_COL]
+    write_seconds = _timed(lambda: write_table(df, path), 1)
+    return {
+        "format": fmt,
+        "size_mb": round(os.path.getsize(path) / 1024 ** 2, 2),
+        "write_seconds": write_seconds,
+        # CSV re-parses date on every full read to match the typed columnar schema
+        "read_all_seconds": _timed(
+            lambda: read_table(path) if fmt != "csv" else pd.read_csv(path, parse_dates=["date"]), repeat),
+        "read_projected_seconds": _timed(lambda: read_table(path, columns=projection), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Reads per measurement (best is reported)")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    df = build_frame(args.rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [measure(df, fmt, tmp_dir, args.repeat) for fmt in ("csv", "parquet", "feather")]
+
+    report = json.dumps({"rows": args.rows, "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Startup time and memory of the model API with 1 vs N uvicorn workers,
+with and without memory-mapped (shared) model arrays. Besides the linear
+model, registry models named with --preload (default: the LSTM checkpoint,
+mapped with torch.load(mmap=True)) are loaded at startup and measured too.
+
+Usage (from the repo root, Linux only - reads /proc):
+    python benchmarks/worker_memory.py --workers 1 4 --output worker_memory.json
+
+Memory is summed over the uvicorn supervisor and all of its child processes.
+RSS counts shared pages once per process; PSS splits them between the
+processes mapping them, so total PSS is the real footprint of N workers.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def _ready(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/model", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def _loaded_models(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/models", timeout=5) as response:
+        report = json.load(response)
+    loaded = sorted(name for name, versions in report["models"].items() if any(v["loaded"] for v in versions))
+    return loaded, report["loaded_bytes"]
+
+
+def measure(workers, mmap, port, model_path, preload=(), timeout=120):
+    env = dict(os.environ, MODEL_MMAP="1" if mmap else "0", MODEL_POLL_INTERVAL="0",
+               MODEL_REGISTRY_PRELOAD=",".join(preload))
+    if model_path:
+        env["MODEL_PATH"] = model_path
+    cmd = [sys.executable, "-m", "uvicorn", "src.api.server:app",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env)
+    try:
+        # Ready once every worker process exists and the app answers
+        while time.perf_counter() - start < timeout:
+            worker_pids = _children(proc.pid) if workers > 1 else [proc.pid]
+            if len(worker_pids) >= workers and _ready(port):
+                break
+            time.sleep(0.05)
+        else:
+            raise TimeoutError(f"Server with {workers} worker(s) did not start in {timeout}s")
+        startup_seconds = time.perf_counter() - start
+
+        # Let the remaining workers finish importing before sampling memory
+        time.sleep(2.0)
+        pids = [proc.pid] + _children(proc.pid)
+        memory = [_memory_kb(pid) for pid in pids]
+        # Answered by one worker; every worker preloads the same models
+        preloaded, registry_bytes = _loaded_models(port)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    return {
+        "workers": workers,
+        "mmap": mmap,
+        "startup_seconds": round(startup_seconds, 3),
+        "preloaded_models": preloaded,
+        "registry_model_mb_per_worker": round(registry_bytes / 1024 / 1024, 1),
+        "processes": len(memory),
+        "per_process_rss_mb": [round(m["rss"] / 1024, 1) for m in memory],
+        "total_rss_mb": round(sum(m["rss"] for m in memory) / 1024, 1),
+        "total_pss_mb": round(sum(m["pss"] for m in memory) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--model-path", default=None, help="Artifact to serve (defaults to MODEL_PATH)")
+    parser.add_argument("--preload", nargs="*", default=["lstm_meter_model"],
+                        help="Registry models to load at startup (needs torch for .pt); pass none to skip")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = [
+        measure(workers, mmap, args.port, args.model_path, args.preload)
+        for workers in args.workers
+        for mmap in (False, True)
+    ]
+    report = json.dumps({"results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
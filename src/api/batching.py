@@ -0,0 +1,122 @@
+# src/api/batching.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row requests into micro-batches.
+
+    Callers await submit(row); a background task drains the queue into batches
+    of at most max_batch_size rows, waiting at most max_wait_us microseconds
+    after the first row of a batch arrives, scores each batch with one
+    vectorized score_fn(X) call and resolves every caller's future.
+
+    score_fn returns (predictions, tag); each caller gets (prediction, tag),
+    e.g. the model version the whole batch was scored with.
+
+    score_fn runs in a worker thread so a slow model doesn't stall the event
+    loop. `inline` (a bool, or a callable checked per batch) calls it on the
+    loop instead, for scorers known to be cheap such as a compiled LinearScorer.
+    """
+
+    def __init__(self, score_fn, max_batch_size=256, max_wait_us=500, inline=False):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.score_fn = score_fn
+        self.inline = inline
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_us = int(max_wait_us)
+        self._pending = deque()
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Starts the background drain task on the running event loop."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Micro-batching enabled (max_batch_size={self.max_batch_size}, "
+            f"max_wait_us={self.max_wait_us})"
+        )
+
+    async def stop(self):
+        """Stops the drain task; requests still queued get a RuntimeError."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    async def submit(self, row):
+        """Queues one feature row and waits for its (prediction, tag)."""
+        if not self.running:
+            raise RuntimeError("Micro-batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        self._wakeup.set()
+        return await future
+
+    async def _next_batch(self):
+        # Block for the first row, then wait for more until the batch or the wait budget is full
+        while not self._pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        deadline = time.perf_counter() + self.max_wait_us / 1_000_000
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+
+        size = min(len(self._pending), self.max_batch_size)
+        return [self._pending.popleft() for _ in range(size)]
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            futures = [future for _, future in batch]
+            X = np.array([row for row, _ in batch], dtype=np.float64)
+            try:
+                if self.inline() if callable(self.inline) else self.inline:
+                    predictions, tag = self.score_fn(X)
+                else:
+                    predictions, tag = await run_in_threadpool(self.score_fn, X)
+            except Exception as e:
+                logger.error(f"❌ Micro-batch scoring failed: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for future, prediction in zip(futures, predictions):
+                # Callers that disconnected have cancelled futures
+                if not future.done():
+                    future.set_result((float(prediction), tag))
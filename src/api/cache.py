@@ -0,0 +1,98 @@
+# src/api/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions keyed on a canonical feature tuple.
+
+    Float features are optionally rounded to a multiple of `quantum` so that
+    readings differing only in noise share an entry. The cache is bound to one
+    model version: a lookup or store for a different version clears it first.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=300.0, quantum=0.0):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.quantum = float(quantum)
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def make_key(self, values):
+        """Canonical (optionally quantized) tuple for a row of feature values."""
+        if self.quantum > 0:
+            q = self.quantum
+            return tuple(round(v / q) * q for v in values)
+        return tuple(float(v) for v in values)
+
+    def _sync_version(self, model_version):
+        # Caller holds the lock
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key, model_version):
+        """Returns the cached prediction or None."""
+        with self._lock:
+            self._sync_version(model_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            prediction, expires_at = entry
+            if self.ttl_seconds > 0 and expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prediction
+
+    def put(self, key, model_version, prediction):
+        with self._lock:
+            self._sync_version(model_version)
+            self._entries[key] = (prediction, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "quantum": self.quantum,
+                "model_version": self.model_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
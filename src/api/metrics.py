@@ -0,0 +1,220 @@
+# src/api/metrics.py
+
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from tens of microseconds (compiled scorer) up to seconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def set_total(self, *labelvalues, value):
+        """Mirrors a running total kept by another component (e.g. the prediction cache)."""
+        with self._lock:
+            self._series[labelvalues] = value
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for labelvalues, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labelvalues, value):
+        with self._lock:
+            self._series[labelvalues] = value
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labelvalues, value):
+        # Per-bucket (non-cumulative) counts; cumulated only when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1], v[2]) for k, v in sorted(self._series.items())]
+        for labelvalues, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus registry: counters, gauges and histograms
+    rendered in the text exposition format. Callbacks run at scrape time to
+    refresh gauges that mirror state owned elsewhere (model version, cache).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collect_callbacks = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_collect(self, callback):
+        self._collect_callbacks.append(callback)
+        return callback
+
+    def render(self):
+        for callback in self._collect_callbacks:
+            callback()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Records consecutive stage durations of one request into a histogram.
+    The first mark() measures from the request start stamped by MetricsMiddleware.
+    """
+
+    __slots__ = ("histogram", "endpoint", "_last")
+
+    def __init__(self, histogram, endpoint, start=None):
+        self.histogram = histogram
+        self.endpoint = endpoint
+        self._last = start if start is not None else time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.histogram.observe(self.endpoint, stage, value=now - self._last)
+        self._last = now
+
+
+class NullStageTimer:
+    """Stand-in used when metrics are disabled."""
+
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests, in-flight requests and end-to-end
+    latency per route. It stamps the request start time into scope["state"] so
+    handlers can attribute the time spent before they run (body read, JSON
+    parsing and pydantic validation).
+    """
+
+    def __init__(self, app, requests_total, request_seconds, in_flight):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_seconds = request_seconds
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = start
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            # Route template (not the raw path) keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.requests_total.inc(scope["method"], path, str(status["code"]))
+            self.request_seconds.observe(path, value=time.perf_counter() - start)
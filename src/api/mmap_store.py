@@ -0,0 +1,54 @@
+# src/api/mmap_store.py
+
+import io
+import logging
+import os
+import tempfile
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+
+def default_mmap_dir():
+    """tmpfs when available, so mapped pages are shared without touching disk."""
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/model_api"
+    return os.path.join(tempfile.gettempdir(), "model_api_mmap")
+
+
+def load_shared_model(payload, version, mmap_dir):
+    """
+    Loads a pickled model so that its numpy arrays are memory-mapped read-only.
+
+    The first process to see `version` unpickles `payload` once and re-dumps it
+    uncompressed as <mmap_dir>/<version>.joblib (written to a temp file and
+    renamed, so concurrent workers never read a partial file). Every process
+    then joblib.load()s that file with mmap_mode="r", so all uvicorn workers
+    share the same physical pages for the model's arrays.
+    """
+    os.makedirs(mmap_dir, exist_ok=True)
+    target = os.path.join(mmap_dir, f"{version}.joblib")
+
+    if not os.path.exists(target):
+        model = joblib.load(io.BytesIO(payload))
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, target)
+        logger.info(f"💾 Exported memory-mappable model {version} to {target}")
+
+    return joblib.load(target, mmap_mode="r")
+
+
+def load_torch_shared(path, mmap=True):
+    """
+    torch.load with mmap=True (torch >= 2.1) so tensor storages are mapped
+    from the checkpoint file instead of copied into each worker.
+    """
+    import torch
+
+    try:
+        return torch.load(path, map_location="cpu", weights_only=False, mmap=mmap)
+    except TypeError:
+        # Older torch without the mmap argument
+        return torch.load(path, map_location="cpu")
@@ -0,0 +1,169 @@
+# src/api/model_manager.py
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+import joblib
+from starlette.concurrency import run_in_threadpool
+
+from src.api.mmap_store import load_shared_model
+from src.api.scoring import build_scorer
+from src.models.partitioned import PARTITIONS_FILENAME, load_partition_table
+
+logger = logging.getLogger(__name__)
+
+
+class ModelVersion:
+    """
+    One loaded model artifact: the estimator, its compiled scorer and where it came from.
+    """
+
+    def __init__(self, model, scorer, version, path, mtime, load_seconds, partitions=None):
+        self.model = model
+        self.scorer = scorer
+        # Per-meter CoefficientTable fit alongside this model, if any
+        self.partitions = partitions
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "model_type": type(self.model).__name__,
+            "compiled": self.scorer.compiled,
+            "partitioned_by": self.partitions.partition_by if self.partitions is not None else None,
+            "partitions": self.partitions.n_partitions if self.partitions is not None else 0,
+            "mtime": self.mtime,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 6),
+        }
+
+
+class ModelManager:
+    """
+    Serves the model at `path` and hot-reloads it when the artifact changes.
+
+    The file is polled by (mtime, size); only when that changes is the content
+    hashed, and only a new hash triggers a load. The new ModelVersion replaces
+    `current` in a single reference assignment, so in-flight requests keep
+    scoring with the version they already hold. The replaced version stays in
+    memory as `previous` for instant rollback.
+
+    With mmap_dir set, model arrays are memory-mapped from an uncompressed
+    per-version export so that all workers share one copy.
+
+    A coefficient table saved next to the artifact for the same version
+    (TRAIN_PARTITION) is loaded with it, for scoring by meter_id.
+    """
+
+    def __init__(self, path, feature_columns, poll_interval=10.0, mmap_dir=None, partitions_path=None):
+        self.path = path
+        self.partitions_path = partitions_path or os.path.join(os.path.dirname(path), PARTITIONS_FILENAME)
+        self.feature_columns = list(feature_columns)
+        self.poll_interval = poll_interval
+        self.mmap_dir = mmap_dir
+        self.current = None
+        self.previous = None
+        self._seen_stat = None
+        self._reload_lock = threading.Lock()
+        self._watch_task = None
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load_version(self, stat):
+        start = time.perf_counter()
+        # Hash and unpickle the same bytes, so the version always matches what was loaded
+        with open(self.path, "rb") as f:
+            payload = f.read()
+        version = hashlib.sha256(payload).hexdigest()[:12]
+        if self.current is not None and version == self.current.version:
+            return None
+        if self.previous is not None and version == self.previous.version:
+            return self.previous
+
+        if self.mmap_dir:
+            model = load_shared_model(payload, version, self.mmap_dir)
+        else:
+            model = joblib.load(io.BytesIO(payload))
+        scorer = build_scorer(model, self.feature_columns)
+        partitions = load_partition_table(self.partitions_path, version)
+        if partitions is not None and partitions.features != self.feature_columns:
+            logger.warning(f"⚠️ Ignoring {self.partitions_path}: features {partitions.features} do not match")
+            partitions = None
+        return ModelVersion(
+            model, scorer, version, self.path, stat[0] / 1e9, time.perf_counter() - start, partitions
+        )
+
+    def load(self):
+        """Loads the artifact synchronously (used at startup)."""
+        self.reload_if_changed()
+        if self.current is None:
+            raise RuntimeError(f"No model could be loaded from {self.path}")
+        return self.current
+
+    def reload_if_changed(self):
+        """
+        Loads the artifact if its content changed since the last check.
+        Returns True when a new version was swapped in.
+        """
+        with self._reload_lock:
+            stat = self._stat()
+            if stat == self._seen_stat:
+                return False
+
+            new_version = self._load_version(stat)
+            # Only remember the stat once the file loaded cleanly, so a half-written
+            # artifact is retried on the next poll
+            self._seen_stat = stat
+            if new_version is None:
+                return False
+
+            self.previous, self.current = self.current, new_version
+            logger.info(
+                f"✅ Model version {new_version.version} loaded from {self.path} "
+                f"in {new_version.load_seconds:.3f}s"
+            )
+            return True
+
+    def rollback(self):
+        """Swaps back to the previously served version."""
+        with self._reload_lock:
+            if self.previous is None:
+                raise RuntimeError("No previous model version to roll back to")
+            self.current, self.previous = self.previous, self.current
+            logger.info(f"↩️ Rolled back to model version {self.current.version}")
+            return self.current
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await run_in_threadpool(self.reload_if_changed)
+            except Exception as e:
+                logger.warning(f"⚠️ Model reload failed, still serving {self.current.version}: {e}")
+
+    def start_watching(self):
+        """Starts polling the artifact in the background (no-op if poll_interval <= 0)."""
+        if self.poll_interval and self.poll_interval > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop_watching(self):
+        if self._watch_task is None:
+            return
+        self._watch_task.cancel()
+        try:
+            await self._watch_task
+        except asyncio.CancelledError:
+            pass
+        self._watch_task = None
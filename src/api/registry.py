@@ -0,0 +1,321 @@
+# src/api/registry.py
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.api.mmap_store import load_shared_model, load_torch_shared
+from src.api.scoring import LINEAR_ESTIMATORS, build_scorer
+
+logger = logging.getLogger(__name__)
+
+SKLEARN_SUFFIXES = (".pkl", ".joblib")
+TORCH_SUFFIXES = (".pt", ".pth")
+
+
+class ModelNotFoundError(KeyError):
+    """No artifact with the requested name/version is registered."""
+
+
+class ModelNotServableError(ValueError):
+    """The artifact loads but cannot produce predictions (e.g. a bare state_dict)."""
+
+
+class ModelEntry:
+    """
+    One artifact file on disk: name (file stem), version (content hash) and
+    size, plus the entry of the preprocessor it is served with, if any.
+    """
+
+    def __init__(self, name, version, path, size_bytes, mtime):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.size_bytes = size_bytes
+        self.mtime = mtime
+        self.preprocessor = None
+
+    @property
+    def key(self):
+        return (self.name, self.version, self.preprocessor.version if self.preprocessor else None)
+
+    @property
+    def format(self):
+        return "torch" if self.path.endswith(TORCH_SUFFIXES) else "sklearn"
+
+
+class LoadedModel:
+    """
+    A loaded artifact plus a predict(rows) adapter for its format. With a
+    preprocessor (e.g. a OneHotEncoder), its input columns are transformed
+    first and replaced by its output columns.
+    """
+
+    def __init__(self, entry, model, load_seconds, preprocessor=None):
+        self.entry = entry
+        self.model = model
+        self.preprocessor = preprocessor
+        self.load_seconds = load_seconds
+        self.last_used = time.time()
+        # Resident size is approximated by the artifact size on disk
+        self.memory_bytes = entry.size_bytes + (entry.preprocessor.size_bytes if entry.preprocessor else 0)
+        self._scorer = None
+
+        feature_names = getattr(model, "feature_names_in_", None)
+        if (isinstance(model, LINEAR_ESTIMATORS) and feature_names is not None
+                and np.ndim(model.coef_) == 1):
+            self._scorer = build_scorer(model, list(feature_names))
+
+    @property
+    def feature_names(self):
+        names = getattr(self.model, "feature_names_in_", None)
+        return list(names) if names is not None else None
+
+    def _preprocess(self, frame):
+        inputs = list(self.preprocessor.feature_names_in_)
+        missing = [c for c in inputs if c not in frame.columns]
+        if missing:
+            raise ValueError(f"Records are missing {self.entry.preprocessor.name} inputs {missing}")
+        encoded = self.preprocessor.transform(frame[inputs])
+        encoded = encoded.toarray() if hasattr(encoded, "toarray") else np.asarray(encoded)
+        encoded = pd.DataFrame(encoded, columns=self.preprocessor.get_feature_names_out(), index=frame.index)
+        return pd.concat([frame.drop(columns=inputs), encoded], axis=1)
+
+    def _to_input(self, instances=None, records=None):
+        if self.preprocessor is not None and records is None:
+            raise ValueError(f"'{self.entry.name}' is served with {self.entry.preprocessor.name}: send named records")
+        if records is not None:
+            frame = pd.DataFrame.from_records(records)
+            if self.preprocessor is not None:
+                frame = self._preprocess(frame)
+            if self.feature_names is not None:
+                missing = [c for c in self.feature_names if c not in frame.columns]
+                if missing:
+                    raise ValueError(f"Records are missing features {missing}")
+                frame = frame[self.feature_names]
+            return frame
+        if self.feature_names is not None:
+            return pd.DataFrame(instances, columns=self.feature_names)
+        return np.asarray(instances)
+
+    def predict(self, instances=None, records=None):
+        """Scores either positional instances (lists) or named records (dicts)."""
+        if self.entry.format == "torch":
+            if instances is None:
+                raise ModelNotServableError(
+                    f"'{self.entry.name}' is a torch model and takes positional 'instances', not 'records'"
+                )
+            return self._predict_torch(instances)
+
+        X = self._to_input(instances, records)
+        if self._scorer is not None:
+            return self._scorer.predict(np.asarray(X, dtype=np.float64))
+        if hasattr(self.model, "predict"):
+            return np.asarray(self.model.predict(X))
+        if hasattr(self.model, "transform"):
+            output = self.model.transform(X)
+            return output.toarray() if hasattr(output, "toarray") else np.asarray(output)
+        raise ModelNotServableError(f"{type(self.model).__name__} has no predict() or transform()")
+
+    def _predict_torch(self, instances):
+        import torch
+
+        if not isinstance(self.model, torch.nn.Module):
+            raise ModelNotServableError(
+                f"'{self.entry.name}' is a {type(self.model).__name__} (weights only); "
+                "the network class is needed to serve it"
+            )
+        with torch.no_grad():
+            output = self.model(torch.as_tensor(np.asarray(instances), dtype=torch.float32))
+        return output.cpu().numpy()
+
+
+class ModelRegistry:
+    """
+    Serves the artifact files directly in `roots` (not subdirectories, which
+    hold caches and spooled copies) by name and version. `preprocessors`
+    maps a model name to the name of an artifact it is served with (e.g.
+    its encoder); those are not exposed as models of their own.
+
+    Unknown names trigger a rescan at most once per `rescan_interval`
+    seconds (otherwise they 404 straight away); call scan() to pick up new
+    artifacts immediately. Files are only re-hashed when their size or
+    mtime changed. Models load lazily on first use. Each (name, version) has its own load
+    lock, so a slow load only blocks requests for that model. Loaded models
+    are kept in LRU order and evicted once their total size exceeds
+    memory_budget_bytes (the model just loaded is never evicted). With
+    mmap_dir set, arrays and tensors are memory-mapped and shared by workers.
+    """
+
+    def __init__(self, roots, memory_budget_bytes=512 * 1024 * 1024, mmap_dir=None, rescan_interval=30.0,
+                 preprocessors=None):
+        self.roots = list(roots)
+        self.preprocessors = dict(preprocessors or {})
+        self.memory_budget_bytes = memory_budget_bytes
+        self.mmap_dir = mmap_dir
+        self.rescan_interval = rescan_interval
+        self._entries = {}
+        self._hashes = {}  # path -> (size, mtime, version)
+        self._last_scan = None
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.evictions = 0
+
+    def scan(self):
+        """Indexes artifact files in the roots; returns {name: [entries, newest first]}."""
+        entries = {}
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for filename in sorted(os.listdir(root)):
+                path = os.path.join(root, filename)
+                if not filename.endswith(SKLEARN_SUFFIXES + TORCH_SUFFIXES) or not os.path.isfile(path):
+                    continue
+                st = os.stat(path)
+                version = self._version(path, st)
+                name = os.path.splitext(filename)[0]
+                entries.setdefault(name, {})[version] = ModelEntry(
+                    name, version, path, st.st_size, st.st_mtime)
+
+        entries = {
+            name: sorted(versions.values(), key=lambda e: e.mtime, reverse=True)
+            for name, versions in entries.items()
+        }
+        for name, preprocessor_name in self.preprocessors.items():
+            preprocessors = entries.pop(preprocessor_name, None)
+            for entry in entries.get(name, []) if preprocessors else []:
+                entry.preprocessor = preprocessors[0]
+
+        with self._lock:
+            self._last_scan = time.monotonic()
+            self._entries = entries
+            return dict(self._entries)
+
+    def _version(self, path, st):
+        """Content hash of an artifact, recomputed only when its size or mtime changed."""
+        cached = self._hashes.get(path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+        with open(path, "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        self._hashes[path] = (st.st_size, st.st_mtime_ns, version)
+        return version
+
+    def _rescan_due(self):
+        """Claims the next rescan if rescan_interval has passed since the last one."""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_scan is not None and now - self._last_scan < self.rescan_interval:
+                return False
+            self._last_scan = now
+            return True
+
+    def resolve(self, name, version=None):
+        """Returns the entry for name/version (newest version when version is None)."""
+        for attempt in range(2):
+            with self._lock:
+                versions = self._entries.get(name, [])
+            if version is None and versions:
+                return versions[0]
+            for entry in versions:
+                if entry.version == version:
+                    return entry
+            # New artifacts may have been dropped in since the last scan, but don't let
+            # requests for unknown names re-hash every artifact each time
+            if attempt == 1 or not self._rescan_due():
+                break
+            self.scan()
+        raise ModelNotFoundError(f"No model '{name}'" + (f" version '{version}'" if version else ""))
+
+    def get(self, name, version=None):
+        """Returns the LoadedModel, loading it on first use."""
+        entry = self.resolve(name, version)
+
+        with self._lock:
+            loaded = self._loaded.get(entry.key)
+            if loaded is not None:
+                self._loaded.move_to_end(entry.key)
+                loaded.last_used = time.time()
+                return loaded
+            load_lock = self._load_locks.setdefault(entry.key, threading.Lock())
+
+        # Load outside the registry lock so other models keep being served
+        with load_lock:
+            with self._lock:
+                loaded = self._loaded.get(entry.key)
+            if loaded is None:
+                loaded = self._load(entry)
+                with self._lock:
+                    self._loaded[entry.key] = loaded
+                    self._evict(keep=entry.key)
+        return loaded
+
+    def _load_artifact(self, entry):
+        if entry.format == "torch":
+            import torch
+            model = load_torch_shared(entry.path, mmap=bool(self.mmap_dir))
+            if isinstance(model, torch.nn.Module):
+                model.eval()
+            return model
+        if self.mmap_dir:
+            with open(entry.path, "rb") as f:
+                return load_shared_model(f.read(), entry.version, self.mmap_dir)
+        return joblib.load(entry.path)
+
+    def _load(self, entry):
+        start = time.perf_counter()
+        model = self._load_artifact(entry)
+        preprocessor = self._load_artifact(entry.preprocessor) if entry.preprocessor else None
+        loaded = LoadedModel(entry, model, time.perf_counter() - start, preprocessor)
+        logger.info(
+            f"✅ Registry loaded {entry.name}@{entry.version} in {loaded.load_seconds:.3f}s"
+        )
+        return loaded
+
+    def _evict(self, keep):
+        # Caller holds the lock
+        used = sum(m.memory_bytes for m in self._loaded.values())
+        for key in list(self._loaded):
+            if used <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            used -= self._loaded.pop(key).memory_bytes
+            self.evictions += 1
+            logger.info(f"♻️ Registry evicted {key[0]}@{key[1]}")
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(m.memory_bytes for m in self._loaded.values())
+
+    def describe(self):
+        """Lists every known model version and whether it is loaded."""
+        with self._lock:
+            entries = dict(self._entries)
+            loaded = dict(self._loaded)
+        return {
+            name: [
+                {
+                    "version": e.version,
+                    "path": e.path,
+                    "format": e.format,
+                    "size_bytes": e.size_bytes,
+                    "latest": i == 0,
+                    "loaded": e.key in loaded,
+                    "preprocessor": (
+                        {"name": e.preprocessor.name, "version": e.preprocessor.version}
+                        if e.preprocessor else None
+                    ),
+                }
+                for i, e in enumerate(versions)
+            ]
+            for name, versions in sorted(entries.items())
+        }
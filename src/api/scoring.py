@@ -0,0 +1,84 @@
+# src/api/scoring.py
+
+import operator
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+
+# Estimators whose predict() is exactly X @ coef_ + intercept_
+LINEAR_ESTIMATORS = (LinearRegression, Ridge, Lasso, ElasticNet)
+
+
+class LinearScorer:
+    """
+    Compiled linear model: a fixed-order float64 weight vector plus a dot product.
+    Skips DataFrame construction and sklearn input validation entirely.
+    """
+
+    compiled = True
+
+    def __init__(self, weights, intercept, feature_columns):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.feature_columns = list(feature_columns)
+        # Plain Python floats: for a single 12-value row this beats np.dot on a list
+        self._weight_list = self.weights.tolist()
+
+    @classmethod
+    def from_model(cls, model, feature_columns):
+        """
+        Extracts coef_/intercept_ from a fitted linear model, reordered to feature_columns.
+        """
+        coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+        trained_on = getattr(model, "feature_names_in_", None)
+        if trained_on is not None:
+            position = {name: i for i, name in enumerate(trained_on)}
+            missing = [col for col in feature_columns if col not in position]
+            if missing or len(trained_on) != len(feature_columns):
+                raise ValueError(
+                    f"Model features {list(trained_on)} do not match {list(feature_columns)}"
+                )
+            coef = coef[[position[col] for col in feature_columns]]
+        elif len(coef) != len(feature_columns):
+            raise ValueError(f"Model has {len(coef)} coefficients, expected {len(feature_columns)}")
+
+        return cls(coef, np.ravel(model.intercept_)[0], feature_columns)
+
+    def predict(self, X):
+        """Scores an (N, F) float matrix in feature_columns order."""
+        return X @ self.weights + self.intercept
+
+    def predict_one(self, values):
+        """Scores a single row given as a sequence of floats in feature_columns order."""
+        return sum(map(operator.mul, self._weight_list, values)) + self.intercept
+
+
+class EstimatorScorer:
+    """
+    Fallback for non-linear models: wraps the estimator's own predict().
+    """
+
+    compiled = False
+
+    def __init__(self, model, feature_columns):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+
+    def predict(self, X):
+        """Scores an (N, F) float matrix in feature_columns order."""
+        return np.asarray(self.model.predict(pd.DataFrame(X, columns=self.feature_columns)))
+
+    def predict_one(self, values):
+        """Scores a single row given as a sequence of floats in feature_columns order."""
+        return float(self.predict(np.asarray([values], dtype=np.float64))[0])
+
+
+def build_scorer(model, feature_columns):
+    """
+    Returns a LinearScorer for plain single-output linear regressors,
+    otherwise an EstimatorScorer around the original model.
+    """
+    if isinstance(model, LINEAR_ESTIMATORS) and np.ndim(model.coef_) == 1:
+        return LinearScorer.from_model(model, feature_columns)
+    return EstimatorScorer(model, feature_columns)
@@ -1,19 +1,160 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import joblib
+import numpy as np
 import os
 
-app = FastAPI()
+from src.api.batching import MicroBatcher
+from src.api.cache import PredictionCache
+from src.api.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsMiddleware,
+    MetricsRegistry,
+    NullStageTimer,
+    StageTimer,
+)
+from src.api.mmap_store import default_mmap_dir
+from src.api.model_manager import ModelManager
+from src.api.registry import ModelNotFoundError, ModelNotServableError, ModelRegistry
+from src.api.scoring import LinearScorer
+from src.api.streaming import (
+    ARROW_STREAM_MEDIA_TYPES,
+    NDJSON_MEDIA_TYPE,
+    DuplexStreamingResponse,
+    StreamFormatError,
+    StreamLineTooLongError,
+    iter_arrow_chunks,
+    iter_ndjson_chunks,
+    prime_chunks,
+    stream_predictions,
+)
 
-# Load the model (Meter Linear Regression model)
+# Model artifact (Meter Linear Regression model), hot-reloaded when it changes
 model_path = os.getenv(
     "MODEL_PATH",
     "src/models/artifacts/models/linear_regression_model.pkl"
 )
-model = joblib.load(model_path)
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "10"))
+
+# Memory-map model arrays so every uvicorn worker shares one read-only copy
+MODEL_MMAP_ENABLED = os.getenv("MODEL_MMAP", "0").lower() in ("1", "true", "yes")
+MODEL_MMAP_DIR = os.getenv("MODEL_MMAP_DIR") or default_mmap_dir()
+
+# Optional micro-batching of concurrent /predict calls (off by default)
+MICROBATCH_ENABLED = os.getenv("PREDICT_MICROBATCH", "0").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "256"))
+MICROBATCH_MAX_WAIT_US = int(os.getenv("MICROBATCH_MAX_WAIT_US", "500"))
+
+# In-process prediction cache in front of /predict (PREDICT_CACHE_SIZE=0 disables it)
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv("PREDICT_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PREDICT_CACHE_TTL", "300")),
+    quantum=float(os.getenv("PREDICT_CACHE_QUANTUM", "0")),
+)
+
+# Per-stage latency histograms and counters, exposed on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+metrics = MetricsRegistry()
+REQUESTS_TOTAL = metrics.counter(
+    "model_api_requests_total", "HTTP requests by method, route and status", ("method", "path", "status"))
+REQUEST_SECONDS = metrics.histogram(
+    "model_api_request_seconds", "End-to-end request latency by route", ("path",))
+IN_FLIGHT = metrics.gauge("model_api_requests_in_flight", "Requests currently being served")
+STAGE_SECONDS = metrics.histogram(
+    "model_api_stage_seconds",
+    "Latency of each serving stage (parse_validate, features, cache, score, serialize)",
+    ("endpoint", "stage"))
+ROWS_SCORED = metrics.counter("model_api_rows_scored_total", "Rows scored by endpoint", ("endpoint",))
+MODEL_LOAD_SECONDS = metrics.gauge(
+    "model_api_model_load_seconds", "Time taken to load the served model version", ("version",))
+CACHE_EVENTS = metrics.counter(
+    "model_api_prediction_cache_events_total", "Prediction cache lookups and evictions", ("event",))
+CACHE_ENTRIES = metrics.gauge("model_api_prediction_cache_entries", "Entries in the prediction cache")
+
+
+@metrics.on_collect
+def _collect_model_and_cache_state():
+    version = model_manager.current
+    MODEL_LOAD_SECONDS.clear()
+    MODEL_LOAD_SECONDS.set(version.version, value=round(version.load_seconds, 6))
+
+    stats = prediction_cache.stats()
+    for event in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        CACHE_EVENTS.set_total(event, value=stats[event])
+    CACHE_ENTRIES.set(value=stats["entries"])
+
+
+def stage_timer(endpoint, request):
+    """Starts per-stage timing for one request (no-op when metrics are disabled)."""
+    if not METRICS_ENABLED:
+        return NullStageTimer()
+    return StageTimer(STAGE_SECONDS, endpoint, getattr(request.state, "request_start", None))
+
+
+# Artifacts directly in MODEL_REGISTRY_DIRS, served by name/version on /models/{name}/predict
+MODEL_REGISTRY_DIRS = os.getenv(
+    "MODEL_REGISTRY_DIRS", os.pathsep.join(["src/models/artifacts", "src/models/artifacts/models"])
+)
+# model=preprocessor pairs: the preprocessor is applied before the model and not served on its own
+MODEL_REGISTRY_PREPROCESSORS = os.getenv("MODEL_REGISTRY_PREPROCESSORS", "logistic_regression_model=encoder")
+
+model_registry = ModelRegistry(
+    MODEL_REGISTRY_DIRS.split(os.pathsep),
+    memory_budget_bytes=int(float(os.getenv("MODEL_REGISTRY_MEMORY_MB", "512")) * 1024 * 1024),
+    mmap_dir=MODEL_MMAP_DIR if MODEL_MMAP_ENABLED else None,
+    rescan_interval=float(os.getenv("MODEL_REGISTRY_RESCAN_SECONDS", "30")),
+    preprocessors=dict(pair.split("=", 1) for pair in MODEL_REGISTRY_PREPROCESSORS.split(",") if pair),
+)
+model_registry.scan()
+# Registry models loaded at startup rather than on first use (comma-separated names),
+# e.g. lstm_meter_model so its memory-mapped weights are shared by every worker
+for preload_name in filter(None, os.getenv("MODEL_REGISTRY_PRELOAD", "").split(",")):
+    model_registry.get(preload_name.strip())
+
+# Rows scored per vectorized call on /predict/stream
+STREAM_CHUNK_ROWS = int(os.getenv("PREDICT_STREAM_CHUNK_ROWS", "10000"))
+# Longest NDJSON line accepted on /predict/stream (a feature row is a few hundred bytes)
+STREAM_MAX_LINE_BYTES = int(os.getenv("PREDICT_STREAM_MAX_LINE_BYTES", str(64 * 1024)))
+
+batcher = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global batcher
+    model_manager.start_watching()
+    if MICROBATCH_ENABLED:
+        batcher = MicroBatcher(
+            score_with_current_model,
+            max_batch_size=MICROBATCH_MAX_SIZE,
+            max_wait_us=MICROBATCH_MAX_WAIT_US,
+            inline=current_model_is_cheap,
+        )
+        await batcher.start()
+    try:
+        yield
+    finally:
+        await model_manager.stop_watching()
+        if batcher is not None:
+            await batcher.stop()
+            batcher = None
+
+
+app = FastAPI(lifespan=lifespan)
+
+if METRICS_ENABLED:
+    app.add_middleware(
+        MetricsMiddleware,
+        requests_total=REQUESTS_TOTAL,
+        request_seconds=REQUEST_SECONDS,
+        in_flight=IN_FLIGHT,
+    )
 
 # CORS (optional but fine)
 app.add_middleware(
@@ -42,31 +183,317 @@ class MeterFeatures(BaseModel):
     load_intensity: float
 
 
+# Column order the model was trained on (same as the MeterFeatures fields)
+FEATURE_COLUMNS = list(MeterFeatures.model_fields)
+
+
+class MeterReading(MeterFeatures):
+    """Features plus the optional meter id, used to pick a per-meter model when one was trained."""
+    meter_id: Optional[str] = None
+
+
+# Load (and compile) the model once at startup
+model_manager = ModelManager(
+    model_path,
+    FEATURE_COLUMNS,
+    poll_interval=MODEL_POLL_INTERVAL,
+    mmap_dir=MODEL_MMAP_DIR if MODEL_MMAP_ENABLED else None,
+)
+model_manager.load()
+
+
+def score_with_current_model(X):
+    """Scores a matrix with the model version served right now."""
+    version = model_manager.current
+    return version.scorer.predict(X), version.version
+
+
+def current_model_is_cheap():
+    """True when the served model is a compiled linear scorer (a dot product, fine on the event loop)."""
+    return isinstance(model_manager.current.scorer, LinearScorer)
+
+
+class MeterFeatureColumns(BaseModel):
+    """Columnar batch payload: one array per feature, all the same length."""
+    voltage: List[float]
+    temperature: List[float]
+    power_factor: List[float]
+    load_kw: List[float]
+    frequency_hz: List[float]
+    hour: List[int]
+    day_of_week: List[int]
+    is_weekend: List[int]
+    voltage_flag: List[int]
+    pf_issue: List[int]
+    high_temp: List[int]
+    load_intensity: List[float]
+    meter_id: Optional[List[Optional[str]]] = None
+
+
+class RegistryPredictRequest(BaseModel):
+    """Positional rows ("instances") or named feature dicts ("records") for any registry model."""
+    instances: Optional[List[List[Any]]] = None
+    records: Optional[List[Dict[str, Any]]] = None
+
+
+class BatchPredictRequest(BaseModel):
+    """Either a list of feature records or a columnar payload (not both)."""
+    records: Optional[List[MeterReading]] = None
+    columns: Optional[MeterFeatureColumns] = None
+
+
+def records_to_matrix(records: List[MeterFeatures]) -> np.ndarray:
+    """Stack feature records into an (N, 12) float64 matrix in FEATURE_COLUMNS order."""
+    return np.array(
+        [[getattr(r, col) for col in FEATURE_COLUMNS] for r in records],
+        dtype=np.float64,
+    ).reshape(len(records), len(FEATURE_COLUMNS))
+
+
+def columns_to_matrix(columns: MeterFeatureColumns) -> np.ndarray:
+    """Stack a columnar payload into an (N, 12) float64 matrix in FEATURE_COLUMNS order."""
+    arrays = [np.asarray(getattr(columns, col), dtype=np.float64) for col in FEATURE_COLUMNS]
+    lengths = {len(a) for a in arrays}
+    if len(lengths) != 1:
+        raise ValueError(f"All feature columns must have the same length, got {sorted(lengths)}")
+    return np.column_stack(arrays)
+
+
 @app.post("/predict")
-def predict(features: MeterFeatures):
-    import pandas as pd
-    import numpy as np
-
-    # Build a single-row DataFrame matching your training features
-    df = pd.DataFrame([{
-        "voltage": features.voltage,
-        "temperature": features.temperature,
-        "power_factor": features.power_factor,
-        "load_kw": features.load_kw,
-        "frequency_hz": features.frequency_hz,
-        "hour": features.hour,
-        "day_of_week": features.day_of_week,
-        "is_weekend": features.is_weekend,
-        "voltage_flag": features.voltage_flag,
-        "pf_issue": features.pf_issue,
-        "high_temp": features.high_temp,
-        "load_intensity": features.load_intensity,
-    }])
-
-    # Get prediction
-    predicted_units = float(model.predict(df)[0])
-
-    return {"prediction": round(predicted_units, 2), "units": "kWh"}
+async def predict(features: MeterReading, request: Request):
+    timer = stage_timer("predict", request)
+    timer.mark("parse_validate")
+
+    # Feature values in training column order
+    values = [getattr(features, col) for col in FEATURE_COLUMNS]
+    timer.mark("features")
+
+    # Readings for a meter with its own model are scored from the coefficient table
+    partition_version = model_manager.current if features.meter_id is not None else None
+    partitions = partition_version.partitions if partition_version is not None else None
+
+    # Repeat readings are answered straight from the cache
+    if prediction_cache.enabled:
+        cache_key = prediction_cache.make_key(values)
+        if partitions is not None:
+            cache_key += (features.meter_id,)
+        current_version = model_manager.current.version
+        cached = prediction_cache.get(cache_key, current_version)
+        timer.mark("cache")
+        if cached is not None:
+            response = JSONResponse(
+                {"prediction": cached, "units": "kWh", "model_version": current_version})
+            timer.mark("serialize")
+            return response
+
+    # Get prediction (coalesced with concurrent requests when micro-batching is on)
+    if partitions is not None:
+        # Hash lookup plus a 12-term dot product: cheaper than queueing for the batcher
+        model_version = partition_version.version
+        predicted_units = partitions.predict_one(values, features.meter_id)
+    elif batcher is not None:
+        predicted_units, model_version = await batcher.submit(values)
+    else:
+        # Hold one version for the whole request, even if a reload swaps it meanwhile
+        version = model_manager.current
+        model_version = version.version
+        if version.scorer.compiled:
+            predicted_units = version.scorer.predict_one(values)
+        else:
+            # sklearn fallback is too slow to run on the event loop
+            predicted_units = await run_in_threadpool(version.scorer.predict_one, values)
+
+    prediction = round(predicted_units, 2)
+    if prediction_cache.enabled:
+        prediction_cache.put(cache_key, model_version, prediction)
+    timer.mark("score")
+    ROWS_SCORED.inc("predict")
+
+    response = JSONResponse({"prediction": prediction, "units": "kWh", "model_version": model_version})
+    timer.mark("serialize")
+    return response
+
+
+@app.post("/predict/batch")
+def predict_batch(payload: BatchPredictRequest, request: Request):
+    """Score N meters with a single vectorized model call."""
+    timer = stage_timer("predict_batch", request)
+    timer.mark("parse_validate")
+
+    if (payload.records is None) == (payload.columns is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'records' or 'columns'")
+
+    try:
+        if payload.records is not None:
+            X = records_to_matrix(payload.records)
+        else:
+            X = columns_to_matrix(payload.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    timer.mark("features")
+
+    if len(X) == 0:
+        return {"predictions": [], "count": 0, "units": "kWh",
+                "model_version": model_manager.current.version}
+
+    if payload.records is not None:
+        meter_ids = [r.meter_id for r in payload.records]
+    else:
+        meter_ids = payload.columns.meter_id
+        if meter_ids is not None and len(meter_ids) != len(X):
+            raise HTTPException(status_code=422, detail="meter_id must have one entry per row")
+
+    # One vectorized scoring call for the whole batch (per-meter coefficients when trained)
+    version = model_manager.current
+    if version.partitions is not None and meter_ids is not None and any(m is not None for m in meter_ids):
+        predictions, model_version = version.partitions.predict(X, meter_ids), version.version
+    else:
+        predictions, model_version = score_with_current_model(X)
+    timer.mark("score")
+    ROWS_SCORED.inc("predict_batch", amount=len(predictions))
+
+    response = JSONResponse({
+        "predictions": np.round(predictions, 2).tolist(),
+        "count": len(predictions),
+        "units": "kWh",
+        "model_version": model_version,
+    })
+    timer.mark("serialize")
+    return response
+
+
+def _count_stream_rows(rows):
+    ROWS_SCORED.inc("predict_stream", amount=rows)
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """
+    Scores an NDJSON or Arrow IPC stream of feature rows chunk by chunk and
+    streams NDJSON predictions back while the upload is still arriving.
+    Rows with a meter_id use the per-meter coefficient table when one is served.
+    A bad first chunk is rejected with 400 (413 for an oversized line); later
+    errors end the stream with an {"error": ...} line.
+    """
+    content_type = request.headers.get("content-type", NDJSON_MEDIA_TYPE).split(";")[0].strip()
+
+    if content_type in ARROW_STREAM_MEDIA_TYPES:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=415, detail="Arrow input requires pyarrow to be installed")
+        chunks = iter_arrow_chunks(request.stream(), FEATURE_COLUMNS, STREAM_CHUNK_ROWS)
+    elif content_type in (NDJSON_MEDIA_TYPE, "application/jsonl", "application/json"):
+        chunks = iter_ndjson_chunks(request.stream(), FEATURE_COLUMNS, STREAM_CHUNK_ROWS,
+                                    max_line_bytes=STREAM_MAX_LINE_BYTES)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'")
+
+    # The whole stream is scored with the version served when it started
+    version = model_manager.current
+    try:
+        chunks = await prime_chunks(chunks)
+    except StreamLineTooLongError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StreamFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return DuplexStreamingResponse(
+        stream_predictions(chunks, version.scorer, on_chunk_scored=_count_stream_rows,
+                           partitions=version.partitions),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"X-Model-Version": version.version},
+    )
+
+
+@app.get("/models")
+def list_models():
+    """All registered model versions, which are loaded, and the memory budget."""
+    return {
+        "models": model_registry.describe(),
+        "loaded_bytes": model_registry.loaded_bytes(),
+        "memory_budget_bytes": model_registry.memory_budget_bytes,
+        "evictions": model_registry.evictions,
+    }
+
+
+@app.post("/models/reload")
+def reload_models():
+    """Rescans MODEL_REGISTRY_DIRS now instead of waiting for the rescan interval."""
+    model_registry.scan()
+    return {"models": model_registry.describe()}
+
+
+@app.post("/models/{name}/predict")
+def predict_with_registry_model(name: str, payload: RegistryPredictRequest, version: Optional[str] = None):
+    """Scores rows with any registered model; the newest version is used unless ?version= is given."""
+    if (payload.instances is None) == (payload.records is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'instances' or 'records'")
+
+    try:
+        loaded = model_registry.get(name, version)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Cannot load '{name}': {e}")
+
+    try:
+        predictions = loaded.predict(instances=payload.instances, records=payload.records)
+    except ModelNotServableError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Cannot serve '{name}': {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid input for '{name}': {e}")
+    ROWS_SCORED.inc("models_predict", amount=len(predictions))
+
+    return {
+        "model": name,
+        "model_version": loaded.entry.version,
+        "predictions": np.asarray(predictions).tolist(),
+        "count": len(predictions),
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of the serving metrics."""
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit, miss and eviction counters of the /predict cache."""
+    return prediction_cache.stats()
+
+
+@app.get("/model")
+def model_info():
+    """Currently served model version and the one kept for rollback."""
+    previous = model_manager.previous
+    return {
+        "current": model_manager.current.info(),
+        "previous": previous.info() if previous is not None else None,
+    }
+
+
+@app.post("/model/reload")
+def reload_model():
+    """Checks the artifact now instead of waiting for the next poll."""
+    try:
+        reloaded = model_manager.reload_if_changed()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+    return {"reloaded": reloaded, "model_version": model_manager.current.version}
+
+
+@app.post("/model/rollback")
+def rollback_model():
+    """Swaps back to the previous model version."""
+    try:
+        version = model_manager.rollback()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"model_version": version.version}
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -0,0 +1,240 @@
+# src/api/streaming.py
+
+import asyncio
+import io
+import json
+import logging
+import queue
+import threading
+
+import numpy as np
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPES = ("application/vnd.apache.arrow.stream", "application/x-arrow-stream")
+
+
+class StreamFormatError(ValueError):
+    """Raised when a streamed row or record batch cannot be turned into features."""
+
+
+class StreamLineTooLongError(StreamFormatError):
+    """Raised when an NDJSON line exceeds the line length limit."""
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that may keep reading the request body while it streams.
+
+    On ASGI servers older than spec 2.4 Starlette listens for disconnects by
+    calling receive() concurrently, which would swallow the body chunks the
+    response generator is still consuming. Disconnects surface instead as a
+    ClientDisconnect from request.stream() or a failed send.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_chunks(byte_stream, feature_columns, chunk_rows, max_line_bytes=None):
+    """
+    Parses an NDJSON byte stream into (X, ids, meter_ids) chunks of at most
+    chunk_rows rows. Only one partial line and one chunk of rows are buffered
+    at a time; a line longer than max_line_bytes raises StreamLineTooLongError.
+    """
+    pending = b""
+    rows, ids, meter_ids = [], [], []
+    line_no = 0
+
+    def check_length(line):
+        if max_line_bytes is not None and len(line) > max_line_bytes:
+            raise StreamLineTooLongError(f"Line {line_no + 1}: longer than {max_line_bytes} bytes")
+
+    def parse(line):
+        try:
+            record = json.loads(line)
+            row = [float(record[col]) for col in feature_columns]
+        except (ValueError, KeyError, TypeError) as e:
+            raise StreamFormatError(f"Line {line_no}: invalid feature row ({e})")
+        rows.append(row)
+        ids.append(record.get("id"))
+        meter_ids.append(record.get("meter_id"))
+
+    async for data in byte_stream:
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            check_length(line)
+            line_no += 1
+            if line.strip():
+                parse(line)
+            if len(rows) >= chunk_rows:
+                yield np.array(rows, dtype=np.float64), ids, meter_ids
+                rows, ids, meter_ids = [], [], []
+        # Fail before buffering more of a line that is already too long
+        check_length(pending)
+
+    if pending.strip():
+        line_no += 1
+        parse(pending)
+    if rows:
+        yield np.array(rows, dtype=np.float64), ids, meter_ids
+
+
+async def prime_chunks(chunks):
+    """
+    Reads the first chunk before the response starts, so a stream that is
+    bad from the start raises StreamFormatError (and can get a 4xx) instead
+    of a 200 ending in an error line. Returns an iterator over every chunk.
+    """
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def primed():
+        if first is not None:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return primed()
+
+
+class _QueueReader(io.RawIOBase):
+    """Blocking file-like view over byte chunks put on a bounded queue (None = EOF)."""
+
+    def __init__(self, chunks, closed_event):
+        self._chunks = chunks
+        self._closed_event = closed_event
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            if self._closed_event.is_set():
+                self._eof = True
+                break
+            try:
+                chunk = self._chunks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+async def iter_arrow_chunks(byte_stream, feature_columns, chunk_rows, max_buffered_chunks=8):
+    """
+    Reads an Arrow IPC stream into (X, ids, meter_ids) chunks of at most chunk_rows rows.
+
+    pyarrow's stream reader is blocking, so it runs in a worker thread fed
+    through a bounded queue; record batches are decoded as they arrive.
+    """
+    import pyarrow as pa
+
+    chunks = queue.Queue(maxsize=max_buffered_chunks)
+    closed = threading.Event()
+
+    def put(item):
+        # Give up once the reader side is gone instead of blocking forever
+        while not closed.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    async def feed():
+        try:
+            async for data in byte_stream:
+                if data:
+                    await run_in_threadpool(put, data)
+        finally:
+            await run_in_threadpool(put, None)
+
+    def read_batches():
+        try:
+            reader = pa.ipc.open_stream(_QueueReader(chunks, closed))
+        except pa.ArrowInvalid as e:
+            raise StreamFormatError(f"Invalid Arrow IPC stream ({e})")
+        missing = [col for col in feature_columns if col not in reader.schema.names]
+        if missing:
+            raise StreamFormatError(f"Arrow stream is missing feature columns {missing}")
+
+        for batch in reader:
+            for offset in range(0, batch.num_rows, chunk_rows):
+                part = batch.slice(offset, chunk_rows)
+                X = np.column_stack([
+                    part.column(col).to_numpy(zero_copy_only=False).astype(np.float64)
+                    for col in feature_columns
+                ])
+                ids, meter_ids = (
+                    part.column(col).to_pylist() if col in reader.schema.names else [None] * part.num_rows
+                    for col in ("id", "meter_id")
+                )
+                yield X, ids, meter_ids
+
+    feeder = asyncio.create_task(feed())
+    try:
+        async for item in iterate_in_threadpool(read_batches()):
+            yield item
+    finally:
+        closed.set()
+        feeder.cancel()
+        try:
+            await feeder
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+async def stream_predictions(chunks, scorer, on_chunk_scored=None, partitions=None):
+    """
+    Scores (X, ids, meter_ids) chunks as they arrive and yields NDJSON
+    prediction lines; with a coefficient table (`partitions`), chunks that
+    carry meter ids are scored per meter, as /predict does.
+    A malformed input ends the stream with a final {"error": ...} line.
+    on_chunk_scored(rows) is called after each chunk, e.g. to count rows.
+    """
+    rows_scored = 0
+    try:
+        async for X, ids, meter_ids in chunks:
+            with_meter = np.array([m is not None for m in meter_ids], dtype=bool)
+            if partitions is not None and with_meter.all():
+                predictions = partitions.predict(X, meter_ids)
+            else:
+                if scorer.compiled:
+                    predictions = scorer.predict(X)
+                else:
+                    predictions = await run_in_threadpool(scorer.predict, X)
+                if partitions is not None and with_meter.any():
+                    # Like /predict: only rows that name a meter use the coefficient table
+                    predictions = np.array(predictions, dtype=np.float64)
+                    predictions[with_meter] = partitions.predict(
+                        X[with_meter], [m for m in meter_ids if m is not None])
+
+            lines = [
+                json.dumps({"id": row_id, "prediction": round(float(p), 2)})
+                if row_id is not None else json.dumps({"prediction": round(float(p), 2)})
+                for row_id, p in zip(ids, predictions)
+            ]
+            rows_scored += len(lines)
+            if on_chunk_scored is not None:
+                on_chunk_scored(len(lines))
+            yield ("\n".join(lines) + "\n").encode()
+    except StreamFormatError as e:
+        logger.warning(f"⚠️ Stream aborted after {rows_scored} rows: {e}")
+        yield (json.dumps({"error": str(e), "rows_scored": rows_scored}) + "\n").encode()
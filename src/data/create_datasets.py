@@ -2,6 +2,11 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+try:
+    from src.data.storage import DATA_FORMAT, with_format, write_table
+except ImportError:  # run as a script from src/data
+    from storage import DATA_FORMAT, with_format, write_table
+
 class FeatureEngineering:
 
     def __init__(self):
@@ -97,9 +102,10 @@ class FeatureEngineering:
     def remove_unnecessary_columns(self, df):
         print("🧹 Removing unnecessary columns...")
 
+        # connection_type is kept: TRAIN_PARTITION=connection_type fits one model per type
         drop_cols = [
             "name", "mobile_number", "address", "city", "pincode",
-            "connection_type", "tariff_plan", "connection_date",
+            "tariff_plan", "connection_date",
             "phase", "status", "reading_date"
         ]
 
@@ -109,12 +115,16 @@ class FeatureEngineering:
         return df
 
     # -----------------------------
-    # Step 4: Save Final CSV
+    # Step 4: Save Final CSV (plus a typed Parquet/Feather copy when DATA_FORMAT asks for one)
     # -----------------------------
     def save_data(self, df):
         df.to_csv(self.output_file, index=False)
         print(f"💾 Saved to: {self.output_file}")
 
+        if DATA_FORMAT != "csv":
+            columnar_file = write_table(df, with_format(self.output_file, DATA_FORMAT))
+            print(f"💾 Saved to: {columnar_file}")
+
     # -----------------------------
     # Step 5: Pipeline Run
     # -----------------------------
@@ -0,0 +1,304 @@
+# src/data/dataset_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.data.storage import PARQUET_ROW_GROUP_SIZE, iter_table, read_columns
+
+logger = logging.getLogger(__name__)
+
+# Preprocessed copies of the meter features, one directory per source fingerprint
+DATASET_CACHE_DIR = os.getenv(
+    'DATASET_CACHE_DIR', os.path.join(os.path.dirname(__file__), '../../data/cache')
+)
+# Set to 1 to read training and full single-process inference through the cache. Off by
+# default: building an entry hashes and re-parses the whole source after every change
+DATASET_CACHE = os.getenv('DATASET_CACHE', '0') == '1'
+# Least recently used entries beyond this are deleted
+DATASET_CACHE_MAX_ENTRIES = int(os.getenv('DATASET_CACHE_MAX_ENTRIES', '4'))
+
+CACHE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+STAT_INDEX_NAME = 'stat_index.json'
+
+# datetime64[ns] stored as int64; this value is NaT
+NAT = np.iinfo(np.int64).min
+
+
+def _file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CachedDataset:
+    """
+    Memory-mapped, preprocessed meter features of one source file.
+
+    X is the float64 feature matrix with NaNs already filled from the
+    source's own means (what training uses); `missing` lists the (row,
+    column) positions that were NaN, so other fill values (inference uses the
+    training means) are applied by patching only those cells.
+    """
+
+    def __init__(self, entry_dir, manifest):
+        self.entry_dir = entry_dir
+        self.manifest = manifest
+        self.rows = manifest['rows']
+        self.source_size = manifest['source_size']
+        self.features = manifest['features']
+        self.fill_means = manifest['fill_means']
+        self.ids = self._array('ids')
+        self.X = self._array('X')
+        self.units = self._array('units')
+        self.missing = self._array('missing')
+        self.meter_codes = self._array('meter_codes')
+        self.meter_ids = np.asarray(manifest['meter_ids'], dtype=object)
+        self.dates = self._array('dates') if 'dates' in manifest['arrays'] else None
+
+    def _array(self, name):
+        spec = self.manifest['arrays'][name]
+        shape = tuple(spec['shape'])
+        if 0 in shape:
+            return np.empty(shape, dtype=spec['dtype'])
+        return np.memmap(os.path.join(self.entry_dir, spec['file']), dtype=spec['dtype'], mode='r', shape=shape)
+
+    def __len__(self):
+        return self.rows
+
+    def feature_matrix(self, start=0, stop=None, fill_means=None):
+        """
+        Rows [start, stop) of X. With the cached fill values this is a view of
+        the memory map; other `fill_means` are applied to a copy.
+        """
+        stop = self.rows if stop is None else stop
+        X = self.X[start:stop]
+        if fill_means is None or all(fill_means[col] == self.fill_means[col] for col in self.features):
+            return X
+        fill = np.array([fill_means[col] for col in self.features])
+        X = np.array(X)
+        lo, hi = np.searchsorted(self.missing[:, 0], [start, stop])
+        rows, cols = self.missing[lo:hi, 0] - start, self.missing[lo:hi, 1]
+        X[rows, cols] = fill[cols]
+        return X
+
+    def target(self):
+        """Target with NaNs filled from its mean."""
+        return np.where(np.isnan(self.units), self.fill_means[TARGET_COL], self.units)
+
+    def frame(self, start=0, stop=None):
+        """id, meter_id, units and (if the source has it) date of rows [start, stop)."""
+        stop = self.rows if stop is None else stop
+        codes = np.asarray(self.meter_codes[start:stop])
+        meter_ids = self.meter_ids[np.maximum(codes, 0)] if len(self.meter_ids) else np.full(len(codes), None)
+        columns = {
+            'id': np.asarray(self.ids[start:stop]),
+            'meter_id': np.where(codes >= 0, meter_ids, None),
+            'units': np.asarray(self.units[start:stop]),
+        }
+        if self.dates is not None:
+            # NAT (int64 min) is exactly numpy's NaT
+            columns['date'] = pd.to_datetime(np.asarray(self.dates[start:stop]).view('datetime64[ns]'))
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, stop))
+
+    def iter_chunks(self, chunksize, fill_means=None):
+        """Yields (X DataFrame, id columns DataFrame) per `chunksize` rows, like iter_inference_chunks."""
+        for start in range(0, self.rows, chunksize):
+            stop = min(start + chunksize, self.rows)
+            X = pd.DataFrame(self.feature_matrix(start, stop, fill_means), columns=self.features,
+                             index=pd.RangeIndex(start, stop))
+            yield X, self.frame(start, stop)
+
+
+class DatasetCache:
+    """
+    Preprocessed datasets keyed by the source's content.
+
+    The key hashes the source's sha256 together with the feature list and
+    cache format; the sha256 itself is only recomputed when the file's
+    (size, mtime, inode) changes, so an unchanged source costs a stat(). An
+    entry is built in one streaming pass: raw columns are appended to flat
+    files, and the NaN cells of X are filled in place afterwards.
+    """
+
+    def __init__(self, cache_dir=DATASET_CACHE_DIR, max_entries=DATASET_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _stat_index_path(self):
+        return os.path.join(self.cache_dir, STAT_INDEX_NAME)
+
+    def _load_stat_index(self):
+        try:
+            with open(self._stat_index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def source_digest(self, path):
+        """sha256 of the source, memoized across processes on (size, mtime_ns, inode)."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = [st.st_size, st.st_mtime_ns, st.st_ino]
+        with self._lock:
+            index = self._load_stat_index()
+            cached = index.get(path)
+        if cached is not None and cached['stat'] == key:
+            return cached['sha256'], st.st_size
+        digest = _file_sha256(path)
+        with self._lock:
+            index = self._load_stat_index()
+            index[path] = {'stat': key, 'sha256': digest}
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._stat_index_path()}.tmp-{os.getpid()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self._stat_index_path())
+        return digest, st.st_size
+
+    def fingerprint(self, path, features=FEATURE_COLS):
+        digest, size = self.source_digest(path)
+        key = json.dumps({'format': CACHE_FORMAT, 'features': list(features), 'source_sha256': digest})
+        return hashlib.sha256(key.encode()).hexdigest(), size
+
+    def load(self, path, features=FEATURE_COLS, chunksize=PARQUET_ROW_GROUP_SIZE):
+        """The CachedDataset for `path`, built on the first call for this content."""
+        fingerprint, size = self.fingerprint(path, features)
+        entry_dir = os.path.join(self.cache_dir, fingerprint)
+        dataset = self._open(entry_dir)
+        if dataset is not None:
+            logger.info(f"✅ Dataset cache hit for {os.path.basename(path)} ({dataset.rows} rows, {fingerprint[:12]})")
+            return dataset
+
+        logger.info(f"🧮 Building dataset cache for {path} ({fingerprint[:12]})")
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            manifest = _build_entry(path, tmp_dir, list(features), chunksize)
+            manifest['source'] = os.path.abspath(path)
+            manifest['source_size'] = size
+            with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                pass  # another process built the same entry first
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._evict(keep=fingerprint)
+        return self._open(entry_dir)
+
+    def _open(self, entry_dir):
+        manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('format') != CACHE_FORMAT:
+                raise ValueError(f"format {manifest.get('format')}")
+            dataset = CachedDataset(entry_dir, manifest)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Discarding dataset cache entry {os.path.basename(entry_dir)[:12]}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        os.utime(manifest_path)  # recency for eviction
+        return dataset
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.cache_dir, name, MANIFEST_NAME)
+            if name != keep and os.path.exists(manifest_path):
+                entries.append((os.path.getmtime(manifest_path), name))
+        for _, name in sorted(entries, reverse=True)[max(self.max_entries - 1, 0):]:
+            logger.info(f"🗑️ Evicting dataset cache entry {name[:12]}")
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+def _build_entry(path, entry_dir, features, chunksize):
+    """Streams `path` into flat arrays under `entry_dir`; returns the manifest."""
+    available = set(read_columns(path))
+    has_dates = 'date' in available
+    columns = ['id', 'meter_id', TARGET_COL] + features + (['date'] if has_dates else [])
+    names = ['ids', 'X', 'units', 'meter_codes'] + (['dates'] if has_dates else [])
+    dtypes = {'ids': '<i8', 'X': '<f8', 'units': '<f8', 'meter_codes': '<i4', 'dates': '<i8'}
+    files = {name: open(os.path.join(entry_dir, f"{name}.bin"), 'wb') for name in names}
+
+    rows = 0
+    sums = np.zeros(len(features) + 1)
+    counts = np.zeros(len(features) + 1)
+    missing = []
+    meter_codes = {}
+    try:
+        for chunk in iter_table(path, columns=columns, chunksize=chunksize):
+            X = chunk[features].to_numpy(dtype=np.float64)
+            units = chunk[TARGET_COL].to_numpy(dtype=np.float64)
+            values = np.column_stack([X, units])
+            sums += np.nansum(values, axis=0)
+            counts += (~np.isnan(values)).sum(axis=0)
+            nan_rows, nan_cols = np.nonzero(np.isnan(X))
+            missing.append(np.column_stack([nan_rows + rows, nan_cols]))
+
+            codes, uniques = pd.factorize(chunk['meter_id'])
+            lookup = np.array([meter_codes.setdefault(meter_id, len(meter_codes)) for meter_id in uniques],
+                              dtype=np.int32)
+            codes = np.where(codes >= 0, lookup[np.maximum(codes, 0)] if len(lookup) else -1, -1)
+
+            np.ascontiguousarray(chunk['id'].to_numpy(), dtype=dtypes['ids']).tofile(files['ids'])
+            np.ascontiguousarray(X, dtype=dtypes['X']).tofile(files['X'])
+            units.astype(dtypes['units']).tofile(files['units'])
+            codes.astype(dtypes['meter_codes']).tofile(files['meter_codes'])
+            if has_dates:
+                dates = pd.to_datetime(chunk['date']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+                dates.astype(dtypes['dates']).tofile(files['dates'])
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    means = sums / np.where(counts > 0, counts, 1)
+    fill_means = dict(zip(features + [TARGET_COL], means.tolist()))
+    missing = np.concatenate(missing) if missing else np.empty((0, 2))
+    missing = np.ascontiguousarray(missing, dtype=np.int64)
+    missing.tofile(os.path.join(entry_dir, 'missing.bin'))
+
+    # Fill the NaN cells of X in place
+    if len(missing):
+        X = np.memmap(os.path.join(entry_dir, 'X.bin'), dtype=dtypes['X'], mode='r+', shape=(rows, len(features)))
+        X[missing[:, 0], missing[:, 1]] = means[missing[:, 1]]
+        X.flush()
+        del X
+
+    shapes = {'ids': [rows], 'X': [rows, len(features)], 'units': [rows], 'meter_codes': [rows],
+              'dates': [rows], 'missing': [len(missing), 2]}
+    dtypes['missing'] = '<i8'
+    return {
+        'format': CACHE_FORMAT,
+        'rows': rows,
+        'features': features,
+        'fill_means': fill_means,
+        'meter_ids': list(meter_codes),
+        'arrays': {name: {'file': f"{name}.bin", 'dtype': dtypes[name], 'shape': shapes[name]}
+                   for name in names + ['missing']},
+    }
+
+
+_default_cache = DatasetCache()
+
+
+def load_dataset(path, chunksize=PARQUET_ROW_GROUP_SIZE):
+    """Loads `path` through the process-wide DatasetCache."""
+    return _default_cache.load(path, chunksize=chunksize)
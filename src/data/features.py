@@ -0,0 +1,54 @@
+# src/data/features.py
+
+import json
+import os
+
+import pandas as pd
+
+from src.data.storage import iter_table
+
+# Model input features, in training order (exclude id, meter_id, units, date, voltage_status)
+FEATURE_COLS = ['voltage', 'temperature', 'power_factor', 'load_kw', 'frequency_hz',
+                'hour', 'day_of_week', 'is_weekend', 'voltage_flag', 'pf_issue',
+                'high_temp', 'load_intensity']
+
+TARGET_COL = 'units'
+
+
+def save_feature_means(means, path):
+    """
+    Persists the training-set feature means used to fill missing values,
+    so inference fills NaNs exactly like training did.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {col: float(means[col]) for col in FEATURE_COLS}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+    return payload
+
+
+def load_feature_means(path):
+    """Returns {feature: mean} from `path`, or None if missing or incomplete."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        means = json.load(f)
+    if any(col not in means for col in FEATURE_COLS):
+        return None
+    return {col: float(means[col]) for col in FEATURE_COLS}
+
+
+def compute_feature_means(csv_path, chunksize=100_000):
+    """
+    Column means over the whole dataset (CSV, Parquet or Feather) in one
+    streaming pass (sum / non-null count per chunk), so memory stays bounded
+    by the chunk size.
+    """
+    sums = pd.Series(0.0, index=FEATURE_COLS)
+    counts = pd.Series(0, index=FEATURE_COLS)
+    for chunk in iter_table(csv_path, columns=FEATURE_COLS, chunksize=chunksize):
+        sums += chunk.sum()
+        counts += chunk.count()
+    return (sums / counts).to_dict()
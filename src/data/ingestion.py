@@ -1,25 +1,84 @@
 # src/data/ingestion.py
 
+import io
+import math
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from src.data.storage import csv_header_end, iter_csv_byte_range, range_fingerprint, split_csv_byte_ranges
 
 logger = logging.getLogger(__name__)
 
 # Base directory for CSV inside container
 BASE_DATA_DIR = "/opt/airflow/data"   # Adjust ONLY if your docker-compose uses a different mount
 
+# Rows parsed and COPY'd at a time when loading raw tables
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "100000"))
+# CSVs are loaded as byte-range chunks of about this size, one transaction (and checkpoint) each
+INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_BYTES", str(64 * 1024 * 1024)))
+# Chunks loaded concurrently, each on its own pooled connection (keep below Postgres max_connections)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+# Byte ranges already loaded per (table, source CSV), so a failed load resumes instead of restarting
+INGEST_CHECKPOINT_TABLE = os.getenv("INGEST_CHECKPOINT_TABLE", "ingestion_checkpoints")
+# Rows read from the head of a CSV (plus as many bytes from its tail) to infer column types
+INGEST_SCHEMA_SAMPLE_ROWS = int(os.getenv("INGEST_SCHEMA_SAMPLE_ROWS", "10000"))
+
+# Added to every raw table: the CSV and chunk each row came from, so a chunk can be deleted and reloaded
+LINEAGE_COLUMNS = [("_source", "TEXT"), ("_start_byte", "BIGINT")]
+
+INT32_MIN, INT32_MAX = -(2 ** 31), 2 ** 31 - 1
+# Longer digit strings may not fit in BIGINT
+BIGINT_MAX_DIGITS = 18
+
+# pandas dtype each Postgres type is parsed as; TIMESTAMP and TEXT go through as text
+PANDAS_DTYPES = {
+    "INTEGER": "Int64",
+    "BIGINT": "Int64",
+    "NUMERIC": "str",
+    "DOUBLE PRECISION": "float64",
+    "TIMESTAMP": "str",
+    "TEXT": "str",
+}
+
+# information_schema.columns.data_type of each Postgres type
+PG_DATA_TYPES = {
+    "INTEGER": "integer",
+    "BIGINT": "bigint",
+    "NUMERIC": "numeric",
+    "DOUBLE PRECISION": "double precision",
+    "TIMESTAMP": "timestamp without time zone",
+    "TEXT": "text",
+}
+# (existing, inferred) column types left alone: the existing column already holds every inferred value
+WIDER_TYPES = {
+    ("bigint", "integer"),
+    ("numeric", "integer"), ("numeric", "bigint"),
+    ("double precision", "integer"), ("double precision", "bigint"),
+}
+
+
+def _pg_settings():
+    return {
+        "host": os.getenv("PG_HOST", "postgres"),
+        "port": os.getenv("PG_PORT", "5432"),
+        "dbname": os.getenv("PG_DB", "airflow"),
+        "user": os.getenv("PG_USER", "airflow"),
+        "password": os.getenv("PG_PASSWORD", "airflow"),
+    }
+
 
 def get_pg_connection():
-    return psycopg2.connect(
-        host=os.getenv("PG_HOST", "postgres"),
-        port=os.getenv("PG_PORT", "5432"),
-        dbname=os.getenv("PG_DB", "airflow"),
-        user=os.getenv("PG_USER", "airflow"),
-        password=os.getenv("PG_PASSWORD", "airflow"),
-    )
+    return psycopg2.connect(**_pg_settings())
+
+
+def get_pg_pool(maxconn):
+    """Thread-safe pool of at most `maxconn` connections, opened as needed."""
+    return ThreadedConnectionPool(1, maxconn, **_pg_settings())
 
 
 def resolve_csv_path(relative_path: str) -> str:
@@ -83,46 +142,290 @@ def run_meter_feature_engineering_dag():
         raise
 
 
-def load_csv_to_raw_table(csv_relative_path: str, table_name: str):
+def _sample_csv(csv_path, sample_rows):
+    """
+    Up to `sample_rows` rows from the head of the CSV plus the rows in the
+    same number of bytes at its tail (where ids and dates are largest),
+    all as strings.
+    """
+    header_end = csv_header_end(csv_path)
+    size = os.path.getsize(csv_path)
+    with open(csv_path, "rb") as f:
+        f.seek(header_end)
+        for _ in range(sample_rows):
+            if not f.readline():
+                break
+        head_end = f.tell()
+        tail_start = size - (head_end - header_end)
+        if tail_start > head_end:
+            f.seek(tail_start - 1)
+            f.readline()  # move to the start of the next line
+            tail = f.read()
+        else:
+            tail = b""
+        f.seek(0)
+        data = f.read(head_end) + tail
+    return pd.read_csv(io.BytesIO(data), dtype=str)
+
+
+def _infer_column_type(values):
+    """Postgres type for one sampled column (non-null strings)."""
+    if values.empty:
+        return "TEXT"
+    if values.str.fullmatch(r"[+-]?\d+").all():
+        if values.str.lstrip("+-").str.len().max() > BIGINT_MAX_DIGITS:
+            return "NUMERIC"
+        numbers = values.astype("int64")
+        return "INTEGER" if numbers.between(INT32_MIN, INT32_MAX).all() else "BIGINT"
+    if pd.to_numeric(values, errors="coerce").notna().all():
+        return "DOUBLE PRECISION"
+    if (values.str.match(r"\d{4}-\d{2}-\d{2}").all()
+            and pd.to_datetime(values, format="ISO8601", errors="coerce").notna().all()):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def infer_table_schema(csv_path, sample_rows=None):
+    """
+    [(column, Postgres type)] for a CSV, inferred from a sample of its rows:
+    INTEGER/BIGINT (NUMERIC past BIGINT), DOUBLE PRECISION, TIMESTAMP (ISO
+    8601 dates) or TEXT.
+    """
+    sample = _sample_csv(csv_path, sample_rows or INGEST_SCHEMA_SAMPLE_ROWS)
+    schema = [(col, _infer_column_type(sample[col].dropna())) for col in sample.columns]
+    logger.info(f"🔎 Inferred schema of {csv_path} from {len(sample)} sampled rows: "
+                + ", ".join(f"{col} {sql_type}" for col, sql_type in schema))
+    return schema
+
+
+def _iter_typed_chunks(csv_path, schema, byte_range, chunksize):
+    """
+    Parses bytes [start, end) of the CSV `chunksize` rows at a time straight into the schema's types,
+    which coerces whole columns at once and fails on a value the type can't
+    hold (e.g. a fraction in a column sampled as INTEGER) instead of mangling it.
+    """
+    dtypes = {col: PANDAS_DTYPES[sql_type] for col, sql_type in schema}
+    try:
+        yield from iter_csv_byte_range(csv_path, byte_range, chunksize=chunksize, dtype=dtypes)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"❌ {csv_path} has values that don't fit the inferred schema ({e}); "
+                         f"raise INGEST_SCHEMA_SAMPLE_ROWS or fix the data") from e
+
+
+def _copy_chunk(cur, table_name, df):
+    """Sends one chunk to Postgres as CSV over COPY ... FROM STDIN (empty fields load as NULL)."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table_name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _pending_ranges(csv_path, done, chunk_bytes):
+    """
+    Byte ranges of the CSV's data rows not covered by the `done` ranges,
+    split at line boundaries into chunks of about `chunk_bytes`.
+    """
+    pending = []
+    position, size = csv_header_end(csv_path), os.path.getsize(csv_path)
+    for start, end in sorted(done) + [(size, size)]:
+        if start > position:
+            parts = math.ceil((start - position) / chunk_bytes)
+            pending.extend(split_csv_byte_ranges(csv_path, parts, size=start, start=position))
+        position = max(position, end)
+    return pending
+
+
+def _load_checkpoints(cur, table_name, csv_path):
+    """
+    Loaded byte ranges of `csv_path` whose bytes are unchanged. For ranges
+    that changed, the checkpoints and the rows loaded from them are deleted
+    in the caller's transaction, so those bytes are loaded again exactly once.
+    Raises ValueError when those rows can't all be found (e.g. loaded before
+    rows carried their lineage): truncate the table and reload instead.
+    """
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {INGEST_CHECKPOINT_TABLE} (
+            table_name TEXT NOT NULL,
+            source TEXT NOT NULL,
+            start_byte BIGINT NOT NULL,
+            end_byte BIGINT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            row_count BIGINT NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, source, start_byte)
+        );
+    """)
+    cur.execute(
+        f"SELECT start_byte, end_byte, fingerprint, row_count FROM {INGEST_CHECKPOINT_TABLE} "
+        f"WHERE table_name = %s AND source = %s",
+        (table_name, csv_path),
+    )
+    size = os.path.getsize(csv_path)
+    done, stale, stale_rows = [], [], 0
+    for start, end, fingerprint, row_count in cur.fetchall():
+        if end <= size and range_fingerprint(csv_path, start, end) == fingerprint:
+            done.append((start, end))
+        else:
+            stale.append(start)
+            stale_rows += row_count
+    if stale:
+        logger.warning(f"⚠️ {csv_path} changed since {len(stale)} chunk(s) were loaded into {table_name}; "
+                       f"deleting their {stale_rows} rows and loading those bytes again")
+        cur.execute(
+            f"DELETE FROM {table_name} WHERE _source = %s AND _start_byte = ANY(%s)",
+            (csv_path, stale),
+        )
+        if cur.rowcount != stale_rows:
+            raise ValueError(f"❌ Found {cur.rowcount} of the {stale_rows} rows loaded from the changed chunks "
+                             f"of {csv_path}; truncate {table_name} and reload it")
+        cur.execute(
+            f"DELETE FROM {INGEST_CHECKPOINT_TABLE} "
+            f"WHERE table_name = %s AND source = %s AND start_byte = ANY(%s)",
+            (table_name, csv_path, stale),
+        )
+    return done
+
+
+def _load_byte_range(pool, csv_path, table_name, schema, byte_range, chunksize):
+    """
+    COPYs one byte range of the CSV, tagging rows with their lineage, and
+    records its checkpoint in the same transaction, so a chunk is either
+    fully loaded and checkpointed or not at all.
+    """
+    lineage = {"_source": csv_path, "_start_byte": byte_range[0]}
+    conn = pool.getconn()
+    broken = True
+    try:
+        rows = 0
+        with conn:
+            with conn.cursor() as cur:
+                for chunk in _iter_typed_chunks(csv_path, schema, byte_range, chunksize):
+                    _copy_chunk(cur, table_name, chunk.assign(**lineage))
+                    rows += len(chunk)
+                cur.execute(
+                    f"INSERT INTO {INGEST_CHECKPOINT_TABLE} "
+                    f"(table_name, source, start_byte, end_byte, fingerprint, row_count) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s)",
+                    (table_name, csv_path, byte_range[0], byte_range[1],
+                     range_fingerprint(csv_path, *byte_range), rows),
+                )
+        broken = False
+        return rows
+    finally:
+        # Don't hand a connection that failed mid-COPY to the next chunk
+        pool.putconn(conn, close=broken)
+
+
+def _migrate_column_types(cur, table_name, schema):
+    """
+    Alters columns of an existing table whose type differs from the inferred
+    schema (e.g. a table created when every column was TEXT), casting the
+    rows already loaded. Raises ValueError when those rows don't cast.
+    """
+    cur.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s",
+        (table_name.lower(),),
+    )
+    existing = dict(cur.fetchall())
+    changes = []
+    for col, sql_type in schema:
+        current = existing.get(col.lower())
+        if current is not None and current != PG_DATA_TYPES[sql_type] \
+                and (current, PG_DATA_TYPES[sql_type]) not in WIDER_TYPES:
+            changes.append((col, current, sql_type))
+    if not changes:
+        return []
+
+    logger.warning(f"⚠️ Migrating {table_name} to the inferred schema: "
+                   + ", ".join(f"{col} {current} -> {sql_type}" for col, current, sql_type in changes))
+    try:
+        cur.execute(f"ALTER TABLE {table_name} "
+                    + ", ".join(f"ALTER COLUMN {col} TYPE {sql_type} USING {col}::{sql_type}"
+                                for col, _, sql_type in changes))
+    except psycopg2.Error as e:
+        raise ValueError(f"❌ Rows already in {table_name} don't cast to the inferred schema ({e}); "
+                         f"drop the table and load it again") from e
+    return changes
+
+
+def load_csv_to_raw_table(csv_relative_path: str, table_name: str, chunksize=None, workers=None,
+                          chunk_bytes=None, pool=None):
     """
     Loads a CSV into a Postgres RAW table.
     Schema is created automatically.
     Expects relative path like: 'raw/meter_data.csv'
+
+    Column types come from infer_table_schema(), plus LINEAGE_COLUMNS
+    recording the CSV and chunk of each row; columns of an existing table
+    with another type are migrated to them. The file is split into
+    byte-range chunks of about `chunk_bytes` (default INGEST_CHUNK_BYTES)
+    that `workers` threads (default INGEST_WORKERS) load concurrently over a
+    bounded connection pool, each streamed in with COPY `chunksize` rows at
+    a time. Every chunk is committed together with its checkpoint, so after
+    a failure the next call only loads the chunks that are missing (and,
+    when the CSV was appended to, only the new rows). Chunks whose bytes
+    changed are deleted and loaded again.
+    Returns {'rows', 'chunks', 'skipped_chunks', 'seconds', 'rows_per_second'}.
     """
 
     csv_path = resolve_csv_path(csv_relative_path)
-
-    df = pd.read_csv(csv_path)
-    if df.empty:
+    chunksize = chunksize or INGEST_CHUNK_SIZE
+    workers = workers or INGEST_WORKERS
+    if os.path.getsize(csv_path) <= csv_header_end(csv_path):
         raise ValueError(f"{csv_path} is empty!")
-
-    # Convert numeric columns safely
-    for col in df.select_dtypes(include=["int64", "float64"]).columns:
-        df[col] = df[col].apply(lambda x: int(x) if pd.notnull(x) else None)
-
-    rows = [tuple(row) for row in df.to_numpy()]
-    cols = list(df.columns)
+    schema = infer_table_schema(csv_path)
 
     create_table_query = f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
-            {', '.join([f"{col} TEXT" for col in cols])}
+            {', '.join([f"{col} {sql_type}" for col, sql_type in schema + LINEAGE_COLUMNS])}
         );
     """
 
-    insert_query = f"""
-        INSERT INTO {table_name} ({', '.join(cols)})
-        VALUES %s
-    """
-
-    conn = get_pg_connection()
+    start = time.perf_counter()
+    rows = 0
+    own_pool = pool is None
+    pool = get_pg_pool(workers) if own_pool else pool
 
     try:
-        with conn:
-            with conn.cursor() as cur:
-                cur.execute(create_table_query)
-                execute_values(cur, insert_query, rows)
+        conn = pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(create_table_query)
+                    # Tables created before rows carried their lineage
+                    cur.execute(f"ALTER TABLE {table_name} "
+                                + ", ".join(f"ADD COLUMN IF NOT EXISTS {col} {sql_type}"
+                                            for col, sql_type in LINEAGE_COLUMNS))
+                    _migrate_column_types(cur, table_name, schema)
+                    done = _load_checkpoints(cur, table_name, csv_path)
+        finally:
+            pool.putconn(conn)
+
+        ranges = _pending_ranges(csv_path, done, chunk_bytes or INGEST_CHUNK_BYTES)
+        logger.info(f"📦 Loading {len(ranges)} chunk(s) of {csv_path} into {table_name} with {workers} workers "
+                    f"({len(done)} chunk(s) already loaded)")
 
-        logger.info(f"📥 Loaded {len(rows)} rows into {table_name}.")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as executor:
+            futures = [executor.submit(_load_byte_range, pool, csv_path, table_name, schema, byte_range, chunksize)
+                       for byte_range in ranges]
+            try:
+                for future in as_completed(futures):
+                    rows += future.result()
+                    logger.info(f"📥 Copied {rows} rows into {table_name} "
+                                f"({rows / (time.perf_counter() - start):,.0f} rows/s)")
+            except Exception:
+                # Chunks already committed stay checkpointed; the rest are loaded on the next run
+                for future in futures:
+                    future.cancel()
+                raise
 
     finally:
-        conn.close()
+        if own_pool:
+            pool.closeall()
+
+    seconds = time.perf_counter() - start
+    rate = rows / seconds if seconds else 0.0
+    logger.info(f"📥 Loaded {rows} rows into {table_name} in {seconds:.1f}s ({rate:,.0f} rows/s).")
+    return {"rows": rows, "chunks": len(ranges), "skipped_chunks": len(done),
+            "seconds": seconds, "rows_per_second": rate}
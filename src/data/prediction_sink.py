@@ -0,0 +1,126 @@
+# src/data/prediction_sink.py
+
+import io
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_TABLE = os.getenv("PREDICTIONS_TABLE", "meter_unit_predictions")
+
+# Output columns as written by inference, and their Postgres types
+PREDICTION_COLUMNS = [
+    ("id", "BIGINT NOT NULL"),
+    ("model_version", "TEXT NOT NULL"),
+    ("meter_id", "TEXT"),
+    ("actual_units", "DOUBLE PRECISION"),
+    ("predicted_units", "DOUBLE PRECISION"),
+]
+
+
+def create_predictions_table(table=PREDICTIONS_TABLE, connect=None):
+    """
+    Creates the predictions table if it does not exist. Run once before any
+    sink opens: concurrent CREATE TABLE IF NOT EXISTS from parallel shards
+    can fail on a pg_type unique violation.
+    """
+    if connect is None:
+        from src.data.ingestion import get_pg_connection
+        connect = get_pg_connection
+    conn = connect()
+    columns = ",\n                ".join(f"{name} {sql_type}" for name, sql_type in PREDICTION_COLUMNS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                {columns},
+                scored_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, model_version)
+                );
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class PostgresPredictionSink:
+    """
+    Streams prediction chunks into a typed Postgres table.
+
+    Each chunk is COPY'd (CSV over STDIN) into a session temp table and
+    upserted into the target on (id, model_version) in the same transaction,
+    so re-running a chunk overwrites instead of duplicating. The temp table
+    is ON COMMIT DELETE ROWS, so it is empty again after every chunk.
+    The target table must already exist (see create_predictions_table).
+    """
+
+    def __init__(self, model_version, table=PREDICTIONS_TABLE, connect=None):
+        self.model_version = model_version
+        self.table = table
+        self.staging_table = f"{table}_staging"
+        self._connect = connect
+        self.conn = None
+        self.rows = 0
+        self.seconds = 0.0
+
+    def open(self):
+        if self._connect is None:
+            from src.data.ingestion import get_pg_connection
+            self._connect = get_pg_connection
+        self.conn = self._connect()
+        with self.conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {self.staging_table}
+                (LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+            """)
+        self.conn.commit()
+        logger.info(f"✅ Writing predictions to Postgres table {self.table}")
+        return self
+
+    def write(self, results_df):
+        """COPYs one chunk of inference output (id, meter_id, actual_units, predicted_units) and upserts it."""
+        if results_df.empty:
+            return 0
+        start = time.perf_counter()
+        names = [name for name, _ in PREDICTION_COLUMNS]
+        # ON CONFLICT can't touch the same key twice in one statement: keep the last reading per id
+        frame = results_df.assign(model_version=self.model_version)[names].drop_duplicates("id", keep="last")
+
+        buffer = io.StringIO()
+        frame.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+
+        updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in names if name not in ("id", "model_version"))
+        try:
+            with self.conn.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY {self.staging_table} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+                cur.execute(f"""
+                    INSERT INTO {self.table} ({', '.join(names)})
+                    SELECT {', '.join(names)} FROM {self.staging_table}
+                    ON CONFLICT (id, model_version) DO UPDATE
+                    SET {updates}, scored_at = now();
+                """)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self.rows += len(frame)
+        self.seconds += time.perf_counter() - start
+        return len(frame)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            rate = self.rows / self.seconds if self.seconds else 0.0
+            logger.info(f"📥 Upserted {self.rows} predictions into {self.table} ({rate:,.0f} rows/s)")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
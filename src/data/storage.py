@@ -0,0 +1,255 @@
+# src/data/storage.py
+
+import hashlib
+import os
+
+import pandas as pd
+
+# Format used for final_meter_features when written by the data pipeline: csv, parquet or feather
+DATA_FORMAT = os.getenv('DATA_FORMAT', 'csv')
+
+FORMAT_SUFFIXES = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+# Parquet row group size; also the unit column projection and batch reads work in
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+# Typed schema for the meter features, so date is parsed once at write time, not on every read
+DATETIME_COLS = ['date']
+
+# Bytes before an offset hashed to detect a CSV that was rewritten, not appended to
+FINGERPRINT_BYTES = 4096
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet/Feather storage needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def storage_format(path):
+    """csv, parquet or feather, from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, suffix in FORMAT_SUFFIXES.items():
+        if ext == suffix:
+            return fmt
+    if ext in ('.arrow', '.ipc'):
+        return 'feather'
+    raise ValueError(f"❌ Unsupported data file extension: {path}")
+
+
+def with_format(path, fmt):
+    """Same path with the extension for `fmt` (e.g. x.csv -> x.parquet)."""
+    return os.path.splitext(path)[0] + FORMAT_SUFFIXES[fmt]
+
+
+def resolve_dataset(path, fmt=None):
+    """
+    The copy of a dataset to read: its DATA_FORMAT (or `fmt`) sibling when that
+    exists, e.g. final_meter_features.parquet next to final_meter_features.csv.
+    """
+    fmt = fmt or DATA_FORMAT
+    if fmt != 'csv':
+        candidate = with_format(path, fmt)
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+def _typed(df):
+    for col in DATETIME_COLS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df = df.assign(**{col: pd.to_datetime(df[col])})
+    return df
+
+
+def write_table(df, path):
+    """Writes df as CSV, Parquet (typed, snappy) or Feather (uncompressed, mmap-able) by extension."""
+    fmt = storage_format(path)
+    tmp_path = f"{path}.tmp"
+    if fmt == 'csv':
+        df.to_csv(tmp_path, index=False)
+    else:
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(_typed(df), preserve_index=False)
+        if fmt == 'parquet':
+            pa.parquet.write_table(table, tmp_path, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        else:
+            pa.feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_columns(path):
+    """Column names without reading any data."""
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    pa = _pyarrow()
+    if fmt == 'parquet':
+        return pa.parquet.ParquetFile(path).schema_arrow.names
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_table(path, columns=None):
+    """Reads only `columns` (all when None); Feather is memory-mapped rather than copied."""
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    pa = _pyarrow()
+    if fmt == 'parquet':
+        return pa.parquet.read_table(path, columns=columns).to_pandas()
+    return pa.feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def iter_table(path, columns=None, chunksize=PARQUET_ROW_GROUP_SIZE):
+    """Yields DataFrames of at most `chunksize` rows with only `columns`."""
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+        return
+    pa = _pyarrow()
+    if fmt == 'parquet':
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    # Feather: one record batch at a time from the memory-mapped file, never the whole table
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize).to_pandas()
+
+
+class ByteRangeFile:
+    """
+    Read-only binary view of bytes [start, end) of a file, so pandas can parse
+    one shard of a CSV without reading the rest.
+    """
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def readline(self, size=-1):
+        limit = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        line = self._file.readline(limit)
+        self._remaining -= len(line)
+        return line
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def csv_header_end(csv_path):
+    """Byte offset where the first data row of a CSV starts."""
+    with open(csv_path, 'rb') as f:
+        return len(f.readline())
+
+
+def tail_fingerprint(path, offset):
+    """
+    sha256 of the FINGERPRINT_BYTES before `offset`: unchanged as long as the
+    file is only appended to. Cheap, but blind to edits further before
+    `offset`; use range_fingerprint() when those must be detected.
+    """
+    start = max(offset - FINGERPRINT_BYTES, 0)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def range_fingerprint(path, start, end, block_size=1024 * 1024):
+    """sha256 of bytes [start, end) of the file, read in blocks: changes with any edit in the range."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def split_csv_byte_ranges(csv_path, shards, size=None, start=None):
+    """
+    Splits the data rows of a CSV from `start` (a line start; default: after
+    the header) up to `size` bytes into at most `shards` contiguous byte
+    ranges of similar size, each starting at a line boundary. Rows must not
+    contain embedded newlines.
+    """
+    size = os.path.getsize(csv_path) if size is None else size
+    with open(csv_path, 'rb') as f:
+        start = len(f.readline()) if start is None else start
+        bounds = [start]
+        for i in range(1, shards):
+            f.seek(max(start + (size - start) * i // shards - 1, bounds[-1]))
+            f.readline()  # move to the start of the next line
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+    return [(begin, end) for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+
+def iter_csv_byte_range(csv_path, byte_range, usecols=None, chunksize=PARQUET_ROW_GROUP_SIZE, dtype=None):
+    """Yields DataFrames parsed from bytes [start, end) of a CSV, using the header's column names."""
+    start, end = byte_range
+    if end <= start:
+        return
+    names = list(pd.read_csv(csv_path, nrows=0).columns)
+    with ByteRangeFile(csv_path, start, end) as source:
+        yield from pd.read_csv(source, header=None, names=names, usecols=usecols, chunksize=chunksize, dtype=dtype)
+
+
+class ParquetAppender:
+    """Streams DataFrame chunks into one Parquet file (one row group per chunk)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, df):
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pa.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,195 @@
+# src/models/artifact_cache.py
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Local copies of model artifacts, one directory per content hash
+MODEL_CACHE_DIR = os.getenv(
+    'MODEL_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'artifacts', 'cache')
+)
+
+# Only estimators from these modules are rebuilt from the .npy fast path
+FAST_PATH_MODULES = ('sklearn.linear_model',)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_value(value):
+    """JSON form of a scalar estimator attribute, or None when it has none."""
+    # numpy scalars first: np.float64 is also a Python float
+    if isinstance(value, np.generic) and value.dtype.kind in 'biuf':
+        return {'value': value.item(), 'dtype': value.dtype.str}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {'value': value}
+    if isinstance(value, np.ndarray) and value.dtype == object and all(isinstance(v, str) for v in value.flat):
+        return {'strings': value.tolist()}
+    return None
+
+
+def _decode_value(spec):
+    if 'strings' in spec:
+        return np.asarray(spec['strings'], dtype=object)
+    if 'dtype' in spec:
+        return np.dtype(spec['dtype']).type(spec['value'])
+    return spec['value']
+
+
+class ArtifactCache:
+    """
+    Content-addressed model loading.
+
+    Artifacts are keyed by the sha256 of their bytes; the hash is only
+    recomputed when the file's (inode, size, mtime) changes. A loaded model
+    is reused for as long as the hash is unchanged, so repeated loads in one
+    process cost a stat(). The first load of a linear model also exports its
+    fitted arrays as .npy files plus a manifest with their hashes under
+    cache_dir/<hash>/; later processes rebuild the estimator from those
+    (integrity-checked, no unpickling) instead of the pickle.
+    """
+
+    def __init__(self, cache_dir=MODEL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._digests = {}  # path -> (stat key, sha256)
+        self._models = {}   # path -> (sha256, model)
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        """sha256 of the artifact, memoized on (inode, size, mtime_ns)."""
+        st = os.stat(path)
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = file_sha256(path)
+        with self._lock:
+            self._digests[path] = (key, digest)
+        return digest
+
+    def load(self, path, loader=joblib.load):
+        """Returns the model stored at `path`; `loader(path)` is only called on a cold cache."""
+        digest = self.digest(path)
+        with self._lock:
+            cached = self._models.get(path)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+
+        model = self._load_exported(digest)
+        if model is None:
+            model = loader(path)
+            try:
+                self._export(digest, model)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not cache model {digest[:12]} in {self.cache_dir}: {e}")
+        else:
+            logger.info(f"✅ Model {digest[:12]} rebuilt from cached arrays (no unpickling)")
+
+        with self._lock:
+            self._models[path] = (digest, model)
+        return model
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.cache_dir, digest)
+
+    def _export(self, digest, model):
+        cls = type(model)
+        if not cls.__module__.startswith(FAST_PATH_MODULES):
+            return False
+
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'source_sha256': digest,
+            'class': f"{cls.__module__}.{cls.__qualname__}",
+            'attributes': {},
+            'arrays': {},
+        }
+        arrays = {}
+        for name, value in vars(model).items():
+            encoded = _encode_value(value)
+            if encoded is not None:
+                manifest['attributes'][name] = encoded
+            elif isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+                arrays[name] = value
+            else:
+                logger.info(f"Model attribute {name!r} ({type(value).__name__}) has no fast path; keeping the pickle")
+                return False
+
+        tmp_dir = f"{self._entry_dir(digest)}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            for name, value in arrays.items():
+                filename = f"{name}.npy"
+                np.save(os.path.join(tmp_dir, filename), value, allow_pickle=False)
+                manifest['arrays'][name] = {
+                    'file': filename,
+                    'sha256': file_sha256(os.path.join(tmp_dir, filename)),
+                }
+            with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                os.rename(tmp_dir, self._entry_dir(digest))
+            except OSError:
+                pass  # another process exported the same artifact first
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.info(f"💾 Cached model {digest[:12]} as .npy arrays in {self._entry_dir(digest)}")
+        return True
+
+    def _load_exported(self, digest):
+        entry_dir = self._entry_dir(digest)
+        manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('format') != MANIFEST_FORMAT or manifest.get('source_sha256') != digest:
+                raise ValueError("manifest does not match the artifact")
+
+            module_name, _, class_name = manifest['class'].rpartition('.')
+            if not module_name.startswith(FAST_PATH_MODULES):
+                raise ValueError(f"class {manifest['class']} is not allowed")
+            cls = getattr(importlib.import_module(module_name), class_name)
+
+            state = {name: _decode_value(spec) for name, spec in manifest['attributes'].items()}
+            for name, spec in manifest['arrays'].items():
+                array_path = os.path.join(entry_dir, spec['file'])
+                if file_sha256(array_path) != spec['sha256']:
+                    raise ValueError(f"{spec['file']} failed its integrity check")
+                state[name] = np.load(array_path, allow_pickle=False)
+        except (OSError, ValueError, KeyError, AttributeError, ImportError) as e:
+            logger.warning(f"⚠️ Discarding cached model {digest[:12]}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # Same as unpickling: an uninitialised instance with the fitted state restored
+        model = cls.__new__(cls)
+        model.__dict__.update(state)
+        return model
+
+
+_default_cache = ArtifactCache()
+
+
+def load_cached_model(path, loader=joblib.load):
+    """Loads `path` through the process-wide ArtifactCache."""
+    return _default_cache.load(path, loader)
@@ -1,12 +1,32 @@
 # src/models/inference.py
 
 import os
+import contextlib
+import hashlib
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import joblib
-import pickle
 import sys
 import logging
 
+from src.data import dataset_cache
+from src.data.features import FEATURE_COLS, compute_feature_means, load_feature_means
+from src.data.storage import (
+    ParquetAppender,
+    csv_header_end,
+    iter_csv_byte_range,
+    iter_table,
+    read_columns,
+    resolve_dataset,
+    split_csv_byte_ranges,
+    storage_format,
+    tail_fingerprint,
+)
+from src.models.artifact_cache import load_cached_model
+from src.models.partitioned import PARTITIONS_FILENAME, CoefficientTable, load_partition_table
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -16,13 +36,57 @@ ARTIFACTS_DIR = os.path.join(os.path.dirname(__file__), 'artifacts')
 MODEL_DIR = os.path.join(ARTIFACTS_DIR, 'models')
 
 METER_DATA_CSV = os.path.join(RAW_DATA_DIR, 'final_meter_features.csv')
+PREDICTIONS_CSV = os.path.join(RAW_DATA_DIR, 'meter_units_predictions.csv')
+FEATURE_MEANS_PATH = os.path.join(MODEL_DIR, 'feature_means.json')
+MODEL_PATH = os.path.join(MODEL_DIR, 'linear_regression_model.pkl')
+PARTITIONS_PATH = os.path.join(MODEL_DIR, PARTITIONS_FILENAME)
+
+# Rows read, scored and written per chunk; peak memory scales with this, not the input size
+INFERENCE_CHUNK_SIZE = int(os.getenv('INFERENCE_CHUNK_SIZE', '100000'))
+
+# Parallel inference: worker processes, and byte-range shards per worker (for load balancing)
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '1'))
+SHARDS_PER_WORKER = 4
+
+# Columns carried from the input into the predictions file
+OUTPUT_ID_COLS = ['id', 'meter_id', 'units']
+OUTPUT_COLS = ['id', 'meter_id', 'actual_units', 'predicted_units']
+WATERMARK_DATE_COL = 'date'
+
+# Score only rows past the last run's watermark, unless the model version changed
+INFERENCE_INCREMENTAL = os.getenv('INFERENCE_INCREMENTAL', '1') == '1'
+
+# Where predictions go: 'file' (PREDICTIONS_CSV or the output path) and/or 'postgres'
+# (upserted into PREDICTIONS_TABLE via COPY, see src/data/prediction_sink.py)
+PREDICTIONS_SINKS = os.getenv('PREDICTIONS_SINKS', 'file')
 
 def load_latest_model():
     """
-    Loads the latest model from artifacts folder with NumPy compatibility fix
+    Loads the latest model from artifacts folder.
+
+    Goes through the content-addressed ArtifactCache: repeated calls in one
+    process reuse the loaded model while its hash is unchanged, and a new
+    process rebuilds a linear model from the cached .npy arrays instead of
+    unpickling. The pickle (with the NumPy compatibility fix) is only read
+    the first time a model version is seen.
+    """
+    return load_cached_model(MODEL_PATH, loader=_unpickle_model)
+
+def load_scoring_model():
+    """
+    The per-meter/per-connection-type CoefficientTable when train.py saved
+    one for the current model version, otherwise the global model.
+    """
+    table = load_partition_table(PARTITIONS_PATH, model_version())
+    if table is not None and table.features == FEATURE_COLS:
+        logger.info(f"✅ Scoring with {table.n_partitions} {table.partition_by} models from {PARTITIONS_PATH}")
+        return table
+    return load_latest_model()
+
+def _unpickle_model(model_path):
+    """
+    Unpickles a model artifact with NumPy compatibility fix
     """
-    model_path = os.path.join(MODEL_DIR, 'linear_regression_model.pkl')
-    
     try:
         # First try standard joblib load
         model = joblib.load(model_path)
@@ -56,51 +120,419 @@ def load_latest_model():
         else:
             raise
 
-def prepare_features_for_inference():
+def get_feature_means(csv_path=None, chunksize=None):
+    """
+    Training-set feature means used to fill missing values. Falls back to one
+    streaming pass over the input when train.py has not saved them yet.
+    """
+    means = load_feature_means(FEATURE_MEANS_PATH)
+    if means is not None:
+        logger.info(f"✅ Loaded training feature means from {FEATURE_MEANS_PATH}")
+        return means
+
+    csv_path = csv_path or resolve_dataset(METER_DATA_CSV)
+    logger.warning(f"⚠️ No feature means at {FEATURE_MEANS_PATH}; computing them from {csv_path}")
+    return compute_feature_means(csv_path, chunksize or INFERENCE_CHUNK_SIZE)
+
+def _is_csv(path):
+    return storage_format(path) == 'csv'
+
+
+def iter_inference_chunks(csv_path=None, chunksize=None, means=None, byte_range=None):
     """
-    Prepares features from meter data for inference
+    Yields (X, chunk) per `chunksize` rows: the feature matrix with NaNs filled
+    from `means`, and the id columns needed for the output. With byte_range,
+    only that shard of a CSV (from split_csv_byte_ranges) is read. Parquet and
+    Feather inputs are read with column projection.
+    """
+    csv_path = csv_path or resolve_dataset(METER_DATA_CSV)
+    chunksize = chunksize or INFERENCE_CHUNK_SIZE
+    means = means if means is not None else get_feature_means(csv_path, chunksize)
+    wanted = set(OUTPUT_ID_COLS + FEATURE_COLS + [WATERMARK_DATE_COL])
+
+    def usecols(col):
+        return col in wanted  # date is optional
+
+    if not _is_csv(csv_path):
+        columns = [col for col in read_columns(csv_path) if col in wanted]
+        for chunk in iter_table(csv_path, columns=columns, chunksize=chunksize):
+            yield chunk[FEATURE_COLS].fillna(means), chunk
+        return
+
+    if byte_range is None:
+        reader = pd.read_csv(csv_path, usecols=usecols, chunksize=chunksize)
+        for chunk in reader:
+            yield chunk[FEATURE_COLS].fillna(means), chunk
+        return
+
+    if byte_range[1] <= byte_range[0]:
+        return
+    for chunk in iter_csv_byte_range(csv_path, byte_range, usecols=usecols, chunksize=chunksize):
+        yield chunk[FEATURE_COLS].fillna(means), chunk
+
+def _cached_chunks(csv_path, size, chunksize, means):
+    """
+    (X, chunk) pairs from the preprocessed dataset cache, or None when the
+    cache is off or the input changed size since it was pinned for this run.
+    """
+    if not dataset_cache.DATASET_CACHE:
+        return None
+    dataset = dataset_cache.load_dataset(csv_path, chunksize)
+    if dataset.source_size != size:
+        return None
+    return dataset.iter_chunks(chunksize, means)
+
+def _after_watermark(chunks, max_id):
+    """Drops rows with id <= max_id (already scored by an earlier run)."""
+    for X, chunk in chunks:
+        new = (chunk['id'] > max_id).to_numpy()
+        if new.any():
+            yield X[new], chunk[new]
+
+def _merge_stats(a, b):
+    """Combines {rows, max_id, max_date} summaries of two scored row sets."""
+    def _max(x, y):
+        return y if x is None else x if y is None else max(x, y)
+    return {
+        'rows': a['rows'] + b['rows'],
+        'max_id': _max(a['max_id'], b['max_id']),
+        'max_date': _max(a['max_date'], b['max_date']),
+    }
+
+def _prediction_sink(to_postgres, version):
+    """PostgresPredictionSink context for `version`, or a no-op when Postgres output is off."""
+    if not to_postgres:
+        return contextlib.nullcontext()
+    from src.data.prediction_sink import PostgresPredictionSink
+    return PostgresPredictionSink(version)
+
+def _write_predictions(model, chunks, path, header=True, sink=None):
+    """
+    Scores each (X, chunk) and appends it to `path` (skipped when None) and to
+    `sink`; returns {rows, max_id, max_date} of the rows written, for the
+    incremental-inference watermark.
+    """
+    stats = {'rows': 0, 'max_id': None, 'max_date': None}
+    parquet = path is not None and path.endswith('.parquet')
+    if path is None:
+        writer = contextlib.nullcontext()
+    else:
+        writer = ParquetAppender(path) if parquet else open(path, 'w', newline='')
+    with writer as out:
+        if header and path is not None and not parquet:
+            out.write(','.join(OUTPUT_COLS) + '\n')
+        for X, chunk in chunks:
+            results_df = pd.DataFrame({
+                'id': chunk['id'].to_numpy(),
+                'meter_id': chunk['meter_id'].to_numpy(),
+                'actual_units': chunk['units'].to_numpy(),
+                'predicted_units': _predict_chunk(model, X, chunk)
+            })
+            if parquet:
+                out.write(results_df)
+            elif out is not None:
+                results_df.to_csv(out, header=False, index=False)
+            if sink is not None:
+                sink.write(results_df)
+            stats = _merge_stats(stats, {
+                'rows': len(results_df),
+                'max_id': int(chunk['id'].max()),
+                'max_date': _max_date(chunk),
+            })
+            logger.info(f"Scored {stats['rows']} rows" + (f" into {os.path.basename(path)}" if path else ""))
+    return stats
+
+def _max_date(chunk):
+    """
+    Latest date of a chunk as 'YYYY-MM-DD HH:MM:SS[.ffffff]', the same whether
+    the dates came from CSV text or a datetime column (cache, Parquet).
+    """
+    if WATERMARK_DATE_COL not in chunk:
+        return None
+    dates = pd.to_datetime(chunk[WATERMARK_DATE_COL].dropna(), format='ISO8601')
+    return dates.max().isoformat(sep=' ') if len(dates) else None
+
+def _predict_chunk(model, X, chunk):
+    if isinstance(model, CoefficientTable):
+        return model.predict(X.to_numpy(dtype='float64'), chunk['meter_id'].to_numpy())
+    return model.predict(X)
+
+def model_version(model_path=None):
+    """Content hash of the model artifact (same scheme as the API's model_version)."""
+    with open(model_path or MODEL_PATH, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def watermark_path_for(output_path):
+    return f"{os.path.splitext(output_path)[0]}.watermark.json"
+
+def load_watermark(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_watermark(watermark, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(tmp_path, path)
+
+def prepare_features_for_inference(csv_path=None, chunksize=None):
+    """
+    Prepares features from meter data for inference.
+
+    Only checks the input and resolves the fill values (saved training means,
+    or one streaming pass); features are built chunk by chunk in make_predictions.
     """
     logger.info("Preparing features for inference...")
-    
-    df = pd.read_csv(METER_DATA_CSV)
-    logger.info(f"Loaded data with shape: {df.shape}")
-    
-    # Select the same features used in training
-    feature_cols = ['voltage', 'temperature', 'power_factor', 'load_kw', 'frequency_hz', 
-                    'hour', 'day_of_week', 'is_weekend', 'voltage_flag', 'pf_issue', 
-                    'high_temp', 'load_intensity']
-    
-    X_prepared = df[feature_cols].copy()
-    
-    # Fill any missing values with mean
-    X_prepared = X_prepared.fillna(X_prepared.mean())
-
-    logger.info(f"✅ Features prepared for inference. Shape: {X_prepared.shape}")
-    return X_prepared, df
-
-def make_predictions():
-    """
-    Loads model, prepares features, and makes predictions
+    csv_path = csv_path or resolve_dataset(METER_DATA_CSV)
+
+    header = read_columns(csv_path)
+    missing = [col for col in OUTPUT_ID_COLS + FEATURE_COLS if col not in header]
+    if missing:
+        raise ValueError(f"❌ Input {csv_path} is missing columns {missing}")
+
+    means = get_feature_means(csv_path, chunksize)
+    logger.info(f"✅ Features ready for inference: {len(FEATURE_COLS)} columns from {csv_path}")
+    return means
+
+# Per-process state of inference pool workers, loaded once by _init_worker
+_worker_model = None
+_worker_means = None
+
+def _init_worker(means):
+    global _worker_model, _worker_means
+    _worker_model = load_scoring_model()
+    _worker_means = means
+
+def _score_shard(csv_path, byte_range, part_path, chunksize, to_postgres=False, version=None):
+    chunks = iter_inference_chunks(csv_path, chunksize, _worker_means, byte_range)
+    # Each shard streams into Postgres over its own connection
+    with _prediction_sink(to_postgres, version) as sink:
+        return _write_predictions(_worker_model, chunks, part_path, header=False, sink=sink)
+
+def _part_path(dataset_dir, index):
+    return os.path.join(dataset_dir, f"part-{index:05d}.parquet")
+
+def _output_size(output_path):
+    """Bytes of a CSV output, or number of part files of a Parquet dataset directory."""
+    if output_path.endswith('.parquet'):
+        return len([f for f in os.listdir(output_path) if f.startswith('part-')])
+    return os.path.getsize(output_path)
+
+def make_predictions(csv_path=None, output_path=None, chunksize=None, workers=None, incremental=None,
+                     sinks=None):
+    """
+    Loads model and scores the meter data chunk by chunk, appending each
+    chunk's predictions to the output CSV so memory stays flat with input size.
+
+    The input may be CSV, Parquet or Feather (DATA_FORMAT picks the sibling of
+    final_meter_features.csv); only the id and feature columns are read. An
+    output path ending in .parquet is written as a Parquet dataset directory
+    of part files instead of a CSV.
+
+    With workers > 1 (default INFERENCE_WORKERS) a CSV input is split into
+    byte-range shards scored on a process pool; each worker loads the model
+    once, and shard outputs are concatenated in input order, so the file is
+    identical to a single-process run.
+
+    Incremental mode (default INFERENCE_INCREMENTAL) keeps a watermark next to
+    the output (max id/date, input offset, model version) and only scores and
+    appends rows past it. Everything is re-scored when the model version changes.
+
+    `sinks` (default PREDICTIONS_SINKS) is a comma-separated list of 'file' and
+    'postgres'; with 'postgres' each chunk is also upserted into the
+    predictions table on (id, model_version), and the file becomes optional.
     """
     logger.info("Starting inference pipeline...")
-    
+    csv_path = csv_path or resolve_dataset(METER_DATA_CSV)
+    output_path = output_path or PREDICTIONS_CSV
+    chunksize = chunksize or INFERENCE_CHUNK_SIZE
+    workers = workers or INFERENCE_WORKERS
+    incremental = INFERENCE_INCREMENTAL if incremental is None else incremental
+    watermark_path = watermark_path_for(output_path)
+    sinks = {name.strip() for name in (sinks or PREDICTIONS_SINKS).split(',') if name.strip()}
+    if not sinks or sinks - {'file', 'postgres'}:
+        raise ValueError(f"❌ Unknown predictions sinks {sorted(sinks)}; use 'file' and/or 'postgres'")
+    write_file, to_postgres = 'file' in sinks, 'postgres' in sinks
+
     try:
-        model = load_latest_model()
-        X_prepared, df = prepare_features_for_inference()
-        predictions = model.predict(X_prepared)
-        logger.info(f"✅ Predictions made. Sample: {predictions[:10]}")
-
-        # Save predictions
-        pred_path = os.path.join(RAW_DATA_DIR, 'meter_units_predictions.csv')
-        results_df = pd.DataFrame({
-            'id': df['id'],
-            'meter_id': df['meter_id'],
-            'actual_units': df['units'],
-            'predicted_units': predictions
-        })
-        results_df.to_csv(pred_path, index=False)
-        logger.info(f"✅ Predictions saved at {pred_path}")
-        return results_df
+        version = model_version()
+        means = get_feature_means(csv_path, chunksize)
+        if to_postgres:
+            # Once here, not per sink: parallel shards would race on CREATE TABLE
+            from src.data.prediction_sink import create_predictions_table
+            create_predictions_table()
+
+        watermark = load_watermark(watermark_path) if incremental else None
+        if watermark is None:
+            reason = "no watermark" if incremental else "incremental mode off"
+        elif watermark['model_version'] != version:
+            reason = f"model version changed {watermark['model_version']} -> {version}"
+        elif watermark['input_path'] != os.path.abspath(csv_path):
+            reason = "input path changed"
+        elif watermark.get('sinks', ['file']) != sorted(sinks):
+            reason = "predictions sinks changed"
+        elif write_file and (not os.path.exists(output_path)
+                             or _output_size(output_path) < watermark['output_size']):
+            reason = "predictions output missing or truncated"
+        else:
+            return _predict_increment(csv_path, output_path if write_file else None, chunksize, means,
+                                      watermark, watermark_path, to_postgres)
+
+        logger.info(f"Full re-score ({reason})")
+        return _predict_full(csv_path, output_path if write_file else None, chunksize, workers, means,
+                             version, watermark_path, to_postgres)
     except Exception as e:
         logger.error(f"❌ Inference pipeline failed: {e}")
         raise
+
+def _predict_full(csv_path, output_path, chunksize, workers, means, version, watermark_path,
+                  to_postgres=False):
+    # Pin the input size up front so rows appended while scoring are left for the next run
+    size = os.path.getsize(csv_path)
+    if workers > 1 and not _is_csv(csv_path):
+        logger.info("Sharded scoring splits CSV inputs only; scoring columnar input in one process")
+        workers = 1
+
+    # Write to a temp file (or dataset directory) and swap it in, so readers never see a partial output
+    tmp_path = f"{output_path}.tmp" if output_path else None
+    dataset = output_path is not None and output_path.endswith('.parquet')
+    if dataset:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+    if workers > 1:
+        stats = _make_predictions_parallel(csv_path, tmp_path, chunksize, workers, means, size,
+                                           to_postgres, version)
+    else:
+        model = load_scoring_model()
+        chunks = _cached_chunks(csv_path, size, chunksize, means)
+        if chunks is None:
+            byte_range = (csv_header_end(csv_path), size) if _is_csv(csv_path) else None
+            chunks = iter_inference_chunks(csv_path, chunksize, means, byte_range=byte_range)
+        with _prediction_sink(to_postgres, version) as sink:
+            stats = _write_predictions(model, chunks, _part_path(tmp_path, 0) if dataset else tmp_path, sink=sink)
+
+    if output_path:
+        if dataset and os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.replace(tmp_path, output_path)
+
+    save_watermark({
+        'model_version': version,
+        'max_id': stats['max_id'],
+        'max_date': stats['max_date'],
+        'rows': stats['rows'],
+        'input_path': os.path.abspath(csv_path),
+        'input_offset': size,
+        'input_fingerprint': tail_fingerprint(csv_path, size),
+        'output_size': _output_size(output_path) if output_path else None,
+        'sinks': sorted((['file'] if output_path else []) + (['postgres'] if to_postgres else [])),
+    }, watermark_path)
+    logger.info(f"✅ Predictions saved to {output_path or 'Postgres'} ({stats['rows']} rows)")
+    return {'rows': stats['rows'], 'total_rows': stats['rows'], 'path': output_path,
+            'mode': 'full', 'model_version': version}
+
+def _predict_increment(csv_path, output_path, chunksize, means, watermark, watermark_path, to_postgres=False):
+    size = os.path.getsize(csv_path)
+    offset = watermark['input_offset']
+    byte_range = None
+    if not _is_csv(csv_path):
+        # Columnar files are rewritten, never appended to: scan them for new ids
+        logger.info(f"Scanning {csv_path} for ids > {watermark['max_id']}")
+    elif size >= offset and tail_fingerprint(csv_path, offset) == watermark['input_fingerprint']:
+        # Input was only appended to: read just the new bytes
+        byte_range = (offset, size)
+    else:
+        logger.warning(f"⚠️ {csv_path} was rewritten; scanning it for ids > {watermark['max_id']}")
+        byte_range = (csv_header_end(csv_path), size)
+
+    chunks = iter_inference_chunks(csv_path, chunksize, means, byte_range=byte_range)
+    if watermark['max_id'] is not None:
+        chunks = _after_watermark(chunks, watermark['max_id'])
+
+    model = load_scoring_model()
+    recorded = watermark['output_size']
+    sink_context = _prediction_sink(to_postgres, watermark['model_version'])
+    if output_path is None:
+        with sink_context as sink:
+            stats = _write_predictions(model, chunks, None, sink=sink)
+    elif output_path.endswith('.parquet'):
+        # Drop parts written by a crashed run after the recorded watermark, then add one part
+        for name in os.listdir(output_path):
+            if name.startswith('part-') and int(name[len('part-'):-len('.parquet')]) >= recorded:
+                os.remove(os.path.join(output_path, name))
+        tmp_part = os.path.join(output_path, f".part-{recorded:05d}.parquet")
+        with sink_context as sink:
+            stats = _write_predictions(model, chunks, tmp_part, sink=sink)
+        if stats['rows']:
+            os.replace(tmp_part, _part_path(output_path, recorded))
+    else:
+        increment_path = f"{output_path}.increment"
+        try:
+            with sink_context as sink:
+                stats = _write_predictions(model, chunks, increment_path, header=False, sink=sink)
+
+            # Drop anything a crashed run appended after the recorded watermark, then append
+            with open(output_path, 'r+b') as out, open(increment_path, 'rb') as increment:
+                out.truncate(recorded)
+                out.seek(0, os.SEEK_END)
+                shutil.copyfileobj(increment, out, 1024 * 1024)
+        finally:
+            if os.path.exists(increment_path):
+                os.remove(increment_path)
+
+    merged = _merge_stats({'rows': watermark['rows'], 'max_id': watermark['max_id'],
+                           'max_date': watermark['max_date']}, stats)
+    save_watermark(dict(
+        watermark,
+        max_id=merged['max_id'],
+        max_date=merged['max_date'],
+        rows=merged['rows'],
+        input_offset=size,
+        input_fingerprint=tail_fingerprint(csv_path, size),
+        output_size=_output_size(output_path) if output_path else None,
+    ), watermark_path)
+    logger.info(f"✅ Appended {stats['rows']} new predictions to {output_path or 'Postgres'} ({merged['rows']} rows)")
+    return {'rows': stats['rows'], 'total_rows': merged['rows'], 'path': output_path,
+            'mode': 'incremental', 'model_version': watermark['model_version']}
+
+def _make_predictions_parallel(csv_path, output_path, chunksize, workers, means, size=None,
+                               to_postgres=False, version=None):
+    ranges = split_csv_byte_ranges(csv_path, workers * SHARDS_PER_WORKER, size)
+    dataset = output_path is not None and (output_path.endswith('.parquet') or os.path.isdir(output_path))
+    if output_path is None:
+        part_paths = [None] * len(ranges)
+    elif dataset:
+        # Shards become the dataset's part files directly, already in input order
+        part_paths = [_part_path(output_path, i) for i in range(len(ranges))]
+    else:
+        part_paths = [f"{output_path}.part{i:05d}" for i in range(len(ranges))]
+    logger.info(f"Scoring {len(ranges)} shards on {workers} worker processes...")
+
+    try:
+        stats = {'rows': 0, 'max_id': None, 'max_date': None}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(means,)) as pool:
+            futures = [
+                pool.submit(_score_shard, csv_path, byte_range, part_path, chunksize, to_postgres, version)
+                for byte_range, part_path in zip(ranges, part_paths)
+            ]
+            for future in futures:
+                stats = _merge_stats(stats, future.result())
+        if dataset or output_path is None:
+            return stats
+
+        # Concatenate shard outputs in input order
+        with open(output_path, 'w', newline='') as out:
+            out.write(','.join(OUTPUT_COLS) + '\n')
+            out.flush()
+            for part_path in part_paths:
+                with open(part_path, 'r', newline='') as part:
+                    shutil.copyfileobj(part, out, 1024 * 1024)
+        return stats
+    finally:
+        if not dataset:
+            for part_path in part_paths:
+                if part_path is not None and os.path.exists(part_path):
+                    os.remove(part_path)
@@ -0,0 +1,283 @@
+# src/models/model_sweep.py
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+from threadpoolctl import threadpool_limits
+
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.data.storage import read_table, resolve_dataset
+from src.models.tracking import make_run_record, record_run
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Paths
+# -------------------------------
+RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../data/raw')
+# Kept apart from the served models (artifacts/models) so a sweep never replaces what the API loads
+SWEEP_DIR = os.getenv('MODEL_SWEEP_DIR', os.path.join(os.path.dirname(__file__), 'artifacts', 'sweep'))
+
+METER_DATA_CSV = os.path.join(RAW_DATA_DIR, 'final_meter_features.csv')
+SWEEP_MODEL_PATH = os.path.join(SWEEP_DIR, 'sweep_best_model.pkl')
+SWEEP_RESULTS_PATH = os.path.join(SWEEP_DIR, 'sweep_results.json')
+
+# Opt-in: the sweep fits every candidate once per fold, far more than the training run itself
+MODEL_SWEEP_ENABLED = os.getenv('MODEL_SWEEP_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Optional JSON file with a list of candidates (same shape as DEFAULT_CANDIDATES)
+MODEL_SWEEP_GRID = os.getenv('MODEL_SWEEP_GRID')
+MODEL_SWEEP_FOLDS = int(os.getenv('MODEL_SWEEP_FOLDS', '5'))
+# Capped at the core count; defaults to at most 4 so the sweep leaves room for other tasks on the worker
+MODEL_SWEEP_WORKERS = min(int(os.getenv('MODEL_SWEEP_WORKERS', str(min(4, os.cpu_count() or 1)))),
+                          os.cpu_count() or 1)
+# Cap on rows used for the sweep (random sample); 0 = all rows
+MODEL_SWEEP_MAX_ROWS = int(os.getenv('MODEL_SWEEP_MAX_ROWS', '100000'))
+SWEEP_SEED = 42
+
+DEFAULT_CANDIDATES = [
+    {'name': 'linear', 'model': 'linear', 'params': {}},
+    *({'name': f'ridge_alpha_{alpha:g}', 'model': 'ridge', 'params': {'alpha': alpha}}
+      for alpha in (0.1, 1.0, 10.0, 100.0)),
+    *({'name': f'lasso_alpha_{alpha:g}', 'model': 'lasso', 'params': {'alpha': alpha}}
+      for alpha in (0.001, 0.01, 0.1)),
+    {'name': 'interactions_ridge_alpha_1', 'model': 'interactions_ridge', 'params': {'alpha': 1.0}},
+    {'name': 'random_forest', 'model': 'random_forest',
+     'params': {'n_estimators': 100, 'max_depth': 12, 'min_samples_leaf': 5}},
+    {'name': 'hist_gradient_boosting', 'model': 'hist_gradient_boosting',
+     'params': {'max_iter': 200, 'learning_rate': 0.1}},
+]
+
+# Tree ensembles take far longer per fold; they are submitted first so they don't end up as stragglers
+SLOW_MODELS = ('random_forest', 'hist_gradient_boosting')
+
+
+def build_estimator(spec):
+    """Unfitted estimator for one candidate spec {'name', 'model', 'params'}."""
+    model, params = spec['model'], dict(spec.get('params', {}))
+    if model == 'linear':
+        return LinearRegression(**params)
+    if model == 'ridge':
+        return make_pipeline(StandardScaler(), Ridge(**params))
+    if model == 'lasso':
+        return make_pipeline(StandardScaler(), Lasso(max_iter=10_000, **params))
+    if model == 'interactions_ridge':
+        return make_pipeline(
+            PolynomialFeatures(degree=2, interaction_only=True, include_bias=False),
+            StandardScaler(), Ridge(**params),
+        )
+    if model == 'random_forest':
+        # One core per fold: the parallelism is across folds
+        return RandomForestRegressor(random_state=SWEEP_SEED, n_jobs=1, **params)
+    if model == 'hist_gradient_boosting':
+        return HistGradientBoostingRegressor(random_state=SWEEP_SEED, **params)
+    raise ValueError(f"❌ Unknown model '{model}' in sweep candidate {spec.get('name')}")
+
+
+def load_candidates(grid_path=None):
+    """Candidates from `grid_path` (default MODEL_SWEEP_GRID) or DEFAULT_CANDIDATES."""
+    grid_path = grid_path or MODEL_SWEEP_GRID
+    if not grid_path:
+        return list(DEFAULT_CANDIDATES)
+    with open(grid_path) as f:
+        candidates = json.load(f)
+    names = [spec['name'] for spec in candidates]
+    if len(set(names)) != len(names):
+        raise ValueError(f"❌ Duplicate candidate names in {grid_path}")
+    for spec in candidates:
+        build_estimator(spec)  # fail fast on typos before starting workers
+    return candidates
+
+
+def assign_folds(n_rows, folds, seed=SWEEP_SEED):
+    """Fold number (0..folds-1) per row: a seeded shuffle dealt round-robin, like KFold(shuffle=True)."""
+    fold_of_row = np.empty(n_rows, dtype=np.int8)
+    fold_of_row[np.random.default_rng(seed).permutation(n_rows)] = np.arange(n_rows) % folds
+    return fold_of_row
+
+
+def load_sweep_data(data_path, max_rows=0):
+    """(X, y) as one C-contiguous float64 matrix [features | target], NaNs filled with column means."""
+    df = read_table(data_path, columns=FEATURE_COLS + [TARGET_COL])
+    if max_rows and len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=SWEEP_SEED)
+    df = df.fillna(df.mean())
+    return np.ascontiguousarray(df[FEATURE_COLS + [TARGET_COL]].to_numpy(dtype=np.float64))
+
+
+# Per-process state of sweep pool workers, attached once by _init_worker
+_worker_shm = None
+_worker_data = None
+_worker_folds = None
+_worker_candidates = None
+
+
+def _init_worker(data_name, data_shape, folds_name, n_rows, candidates):
+    """Maps the parent's shared-memory blocks; nothing row-sized is pickled to workers."""
+    global _worker_shm, _worker_data, _worker_folds, _worker_candidates
+    data_shm = shared_memory.SharedMemory(name=data_name)
+    folds_shm = shared_memory.SharedMemory(name=folds_name)
+    _worker_shm = (data_shm, folds_shm)  # keep the mappings alive
+    _worker_data = np.ndarray(data_shape, dtype=np.float64, buffer=data_shm.buf)
+    _worker_folds = np.ndarray((n_rows,), dtype=np.int8, buffer=folds_shm.buf)
+    _worker_candidates = candidates
+    # One BLAS/OpenMP thread per worker, or folds oversubscribe the cores
+    threadpool_limits(1)
+
+
+def _score_fold(candidate_index, fold):
+    spec = _worker_candidates[candidate_index]
+    start = time.perf_counter()
+    validation = _worker_folds == fold
+    X, y = _worker_data[:, :-1], _worker_data[:, -1]
+    estimator = build_estimator(spec)
+    estimator.fit(X[~validation], y[~validation])
+    y_pred = estimator.predict(X[validation])
+    y_true = y[validation]
+    mse = mean_squared_error(y_true, y_pred)
+    return candidate_index, fold, {
+        'rmse': mse ** 0.5,
+        'mae': mean_absolute_error(y_true, y_pred),
+        'r2': r2_score(y_true, y_pred),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _summarize(spec, fold_metrics):
+    summary = {'name': spec['name'], 'model': spec['model'], 'params': spec.get('params', {})}
+    for key in ('rmse', 'mae', 'r2'):
+        values = np.array([m[key] for m in fold_metrics])
+        summary[f'{key}_mean'] = float(values.mean())
+        summary[f'{key}_std'] = float(values.std())
+    summary['fit_seconds'] = float(sum(m['seconds'] for m in fold_metrics))
+    summary['folds'] = fold_metrics
+    return summary
+
+
+def run_sweep(data, candidates, folds=MODEL_SWEEP_FOLDS, workers=MODEL_SWEEP_WORKERS):
+    """
+    K-fold CV of every candidate on `data` ([features | target] matrix).
+
+    Every (candidate, fold) pair is a task on a process pool. The matrix and
+    the fold assignment live in shared memory that workers map at start-up,
+    so a task is two integers in and four floats out. Returns the candidate
+    summaries sorted by mean RMSE (best first).
+    """
+    n_rows = len(data)
+    if n_rows < folds:
+        raise ValueError(f"❌ {n_rows} rows is not enough for {folds}-fold CV")
+    fold_of_row = assign_folds(n_rows, folds)
+
+    data_shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    folds_shm = shared_memory.SharedMemory(create=True, size=fold_of_row.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=data_shm.buf)[:] = data
+        np.ndarray(fold_of_row.shape, dtype=np.int8, buffer=folds_shm.buf)[:] = fold_of_row
+
+        tasks = [(i, fold) for i in range(len(candidates)) for fold in range(folds)]
+        tasks.sort(key=lambda task: candidates[task[0]]['model'] not in SLOW_MODELS)
+        results = {i: [None] * folds for i in range(len(candidates))}
+
+        initargs = (data_shm.name, data.shape, folds_shm.name, n_rows, candidates)
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                 initargs=initargs) as pool:
+            futures = [pool.submit(_score_fold, *task) for task in tasks]
+            for future in as_completed(futures):
+                index, fold, metrics = future.result()
+                results[index][fold] = metrics
+                if all(results[index]):
+                    summary = _summarize(candidates[index], results[index])
+                    logger.info(f"📊 {summary['name']}: RMSE {summary['rmse_mean']:.4f} "
+                                f"± {summary['rmse_std']:.4f}, R² {summary['r2_mean']:.4f}")
+    finally:
+        data_shm.close()
+        data_shm.unlink()
+        folds_shm.close()
+        folds_shm.unlink()
+
+    summaries = [_summarize(spec, results[i]) for i, spec in enumerate(candidates)]
+    return sorted(summaries, key=lambda s: s['rmse_mean'])
+
+
+def log_sweep_to_mlflow(summaries, sweep_id, folds, model_path=None, results_path=None):
+    """
+    One MLflow run per candidate (params and mean/std CV metrics, tagged with
+    the sweep id); the best one carries the refit model and the results file.
+    Runs are spooled when the server is down. Returns the record_run() results.
+    """
+    results = []
+    for rank, summary in enumerate(summaries):
+        metrics = {key: summary[key] for key in summary if key.endswith(('_mean', '_std'))}
+        artifacts = [(path, 'sweep') for path in (model_path, results_path) if path and rank == 0]
+        record = make_run_record(
+            {'model_type': summary['model'], 'candidate': summary['name'], 'folds': folds, **summary['params']},
+            {**metrics, 'fit_seconds': summary['fit_seconds']},
+            artifacts,
+            tags={'sweep_id': sweep_id, 'sweep_rank': rank + 1, 'sweep_best': rank == 0},
+        )
+        results.append(record_run(record))
+    logger.info(f"📊 Logged {len(results)} sweep candidates to MLflow "
+                f"({sum(r['status'] == 'spooled' for r in results)} spooled)")
+    return results
+
+
+def run_model_sweep(**kwargs):
+    """
+    Airflow task: CV sweep over the candidate grid, refit of the best
+    candidate on all rows, saved to SWEEP_DIR/sweep_best_model.pkl with every
+    candidate's metrics in sweep_results.json and one MLflow run per candidate.
+    Skipped unless MODEL_SWEEP_ENABLED is set.
+    """
+    if not MODEL_SWEEP_ENABLED:
+        logger.info("⏭️ Model sweep skipped (set MODEL_SWEEP_ENABLED=1 to run it)")
+        return None
+    start = time.perf_counter()
+    data_path = resolve_dataset(METER_DATA_CSV)
+    candidates = load_candidates()
+    data = load_sweep_data(data_path, MODEL_SWEEP_MAX_ROWS)
+    logger.info(f"🔍 Sweeping {len(candidates)} candidates x {MODEL_SWEEP_FOLDS} folds on {len(data)} rows "
+                f"with {MODEL_SWEEP_WORKERS} workers")
+
+    summaries = run_sweep(data, candidates, MODEL_SWEEP_FOLDS, MODEL_SWEEP_WORKERS)
+    best = summaries[0]
+    logger.info(f"🏆 Best candidate: {best['name']} (RMSE {best['rmse_mean']:.4f})")
+
+    best_spec = next(spec for spec in candidates if spec['name'] == best['name'])
+    model = build_estimator(best_spec).fit(data[:, :-1], data[:, -1])
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    joblib.dump(model, SWEEP_MODEL_PATH)
+
+    report = {
+        'data_path': data_path,
+        'rows': len(data),
+        'folds': MODEL_SWEEP_FOLDS,
+        'workers': MODEL_SWEEP_WORKERS,
+        'seconds': time.perf_counter() - start,
+        'best': best['name'],
+        'model_path': SWEEP_MODEL_PATH,
+        'candidates': summaries,
+    }
+    tmp_path = f"{SWEEP_RESULTS_PATH}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, SWEEP_RESULTS_PATH)
+    logger.info(f"💾 Saved {best['name']} to {SWEEP_MODEL_PATH} and sweep metrics to {SWEEP_RESULTS_PATH}")
+
+    sweep_id = kwargs.get('run_id') or time.strftime('%Y%m%dT%H%M%S')
+    log_sweep_to_mlflow(summaries, sweep_id, MODEL_SWEEP_FOLDS, SWEEP_MODEL_PATH, SWEEP_RESULTS_PATH)
+
+    ti = kwargs.get('ti')
+    if ti is not None:
+        ti.xcom_push(key='sweep_best', value=best['name'])
+        ti.xcom_push(key='sweep_best_rmse', value=best['rmse_mean'])
+    return report
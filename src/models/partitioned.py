@@ -0,0 +1,196 @@
+# src/models/partitioned.py
+
+import logging
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.models.streaming_train import GRAM_RCOND, min_norm_solve
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_FILENAME = 'partitioned_coefficients.npz'
+
+# Keys a partitioned model can be fit per
+PARTITION_KEYS = ('meter_id', 'connection_type')
+
+# Groups with fewer training rows than this use the global model
+PARTITION_MIN_ROWS = int(os.getenv('PARTITION_MIN_ROWS', '30'))
+
+# Rows per block when accumulating per-group Gram matrices (bounds the (rows, p, p) temporary)
+GRAM_BLOCK_ROWS = 65_536
+
+# Row of the coefficient table holding the global model
+GLOBAL_ROW = 0
+
+
+def grouped_least_squares(X, y, codes, n_groups, rcond=GRAM_RCOND):
+    """
+    Ordinary least squares for every group at once.
+
+    Rows are sorted by group code once; per-group means, then centered Gram
+    matrices and cross-products are summed segment-wise with np.add.reduceat
+    (in row blocks), and all (n_groups, p, p) systems are solved in one
+    batched eigendecomposition. Returns (coef (G, p), intercept (G,),
+    counts (G,), rank (G,)); groups without rows get zeros.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    codes = np.asarray(codes)
+    n_rows, p = X.shape
+
+    order = np.argsort(codes, kind='stable')
+    X, y, codes = X[order], y[order], codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n_rows else np.empty(0, dtype=np.intp)
+    present = codes[starts]
+
+    counts = np.zeros(n_groups, dtype=np.int64)
+    counts[present] = np.diff(np.r_[starts, n_rows])
+    mean_x = np.zeros((n_groups, p))
+    mean_y = np.zeros(n_groups)
+    if n_rows:
+        mean_x[present] = np.add.reduceat(X, starts, axis=0) / counts[present, None]
+        mean_y[present] = np.add.reduceat(y, starts) / counts[present]
+
+    cxx = np.zeros((n_groups, p, p))
+    cxy = np.zeros((n_groups, p))
+    for block_start in range(0, n_rows, GRAM_BLOCK_ROWS):
+        block = slice(block_start, min(block_start + GRAM_BLOCK_ROWS, n_rows))
+        block_codes = codes[block]
+        Xc = X[block] - mean_x[block_codes]
+        yc = y[block] - mean_y[block_codes]
+        # Segments of this block; a group may continue from the previous block, so add rather than assign
+        seg = np.flatnonzero(np.r_[True, block_codes[1:] != block_codes[:-1]])
+        groups = block_codes[seg]
+        cxx[groups] += np.add.reduceat(Xc[:, :, None] * Xc[:, None, :], seg, axis=0)
+        cxy[groups] += np.add.reduceat(Xc * yc[:, None], seg, axis=0)
+
+    coef, _, keep = min_norm_solve(cxx, cxy, rcond)
+    intercept = mean_y - np.einsum('gi,gi->g', mean_x, coef)
+    return coef, intercept, counts, keep.sum(axis=-1)
+
+
+class CoefficientTable:
+    """
+    Per-partition linear models as one table: row GLOBAL_ROW is the global
+    model, the other rows one model per group. `meter_ids` maps every meter
+    seen in training to its row (its own group, or the global row when the
+    group was too small), so scoring is a hash lookup plus a dot product.
+    """
+
+    def __init__(self, features, coef, intercept, meter_ids, meter_rows, group_labels, group_rows,
+                 partition_by, model_version=None):
+        self.features = list(features)
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = np.ascontiguousarray(intercept, dtype=np.float64)
+        self.meter_ids = np.asarray(meter_ids, dtype=str)
+        self.meter_rows = np.asarray(meter_rows, dtype=np.int64)
+        self.group_labels = np.asarray(group_labels, dtype=str)
+        self.group_rows = np.asarray(group_rows, dtype=np.int64)
+        self.partition_by = partition_by
+        self.model_version = model_version
+        self._index = pd.Index(self.meter_ids)
+        self._row_of = dict(zip(self.meter_ids.tolist(), self.meter_rows.tolist()))
+        self._coef_lists = self.coef.tolist()
+
+    @property
+    def n_partitions(self):
+        """Groups with their own model (excluding the global row)."""
+        return int(np.count_nonzero(self.group_rows != GLOBAL_ROW))
+
+    def rows_for(self, meter_ids):
+        """Table row per meter id; unknown (or missing) meters get the global row."""
+        positions = self._index.get_indexer(pd.Index(meter_ids, dtype=object))
+        rows = np.full(len(positions), GLOBAL_ROW, dtype=np.int64)
+        known = positions >= 0
+        rows[known] = self.meter_rows[positions[known]]
+        return rows
+
+    def predict(self, X, meter_ids):
+        """Scores an (N, F) float matrix in `features` order, row i with meter_ids[i]'s model."""
+        rows = self.rows_for(meter_ids)
+        X = np.asarray(X, dtype=np.float64)
+        return np.einsum('ij,ij->i', X, self.coef[rows]) + self.intercept[rows]
+
+    def predict_one(self, values, meter_id):
+        """Scores a single row given as a sequence of floats in `features` order."""
+        row = self._row_of.get(meter_id, GLOBAL_ROW)
+        return sum(map(operator.mul, self._coef_lists[row], values)) + float(self.intercept[row])
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            features=np.asarray(self.features, dtype=str),
+            coef=self.coef,
+            intercept=self.intercept,
+            meter_ids=self.meter_ids,
+            meter_rows=self.meter_rows,
+            group_labels=self.group_labels,
+            group_rows=self.group_rows,
+            partition_by=np.asarray(self.partition_by),
+            model_version=np.asarray(self.model_version or ''),
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data['features'].tolist(),
+                data['coef'],
+                data['intercept'],
+                data['meter_ids'],
+                data['meter_rows'],
+                data['group_labels'],
+                data['group_rows'],
+                str(data['partition_by']),
+                str(data['model_version']) or None,
+            )
+
+
+def fit_partitioned(X, y, meter_ids, groups, global_coef, global_intercept, features, partition_by,
+                    min_rows=PARTITION_MIN_ROWS):
+    """
+    Fits one linear model per distinct value of `groups` (meter ids or
+    connection types, aligned with the rows of X) in a single batched
+    computation. Groups with fewer than `min_rows` rows, or rows without a
+    group, fall back to the global coefficients.
+    """
+    groups = pd.Series(np.asarray(groups, dtype=object))
+    codes, labels = pd.factorize(groups)
+    labelled = codes >= 0
+    coef, intercept, counts, _ = grouped_least_squares(
+        np.asarray(X)[labelled], np.asarray(y)[labelled], codes[labelled], len(labels))
+
+    has_model = counts >= min_rows
+    group_rows = np.where(has_model, np.arange(1, len(labels) + 1), GLOBAL_ROW)
+    table_coef = np.vstack([np.asarray(global_coef, dtype=np.float64)[None, :], coef])
+    table_intercept = np.r_[float(global_intercept), intercept]
+
+    # Every meter seen in training maps to the row of its (last seen) group
+    pairs = pd.DataFrame({'meter_id': np.asarray(meter_ids, dtype=object), 'code': codes})
+    pairs = pairs[pairs['meter_id'].notna() & (pairs['code'] >= 0)].drop_duplicates('meter_id', keep='last')
+    meter_rows = group_rows[pairs['code'].to_numpy()]
+
+    logger.info(f"✅ Fit {int(has_model.sum())}/{len(labels)} {partition_by} partitions "
+                f"(min {min_rows} rows); the rest use the global model")
+    return CoefficientTable(
+        features, table_coef, table_intercept,
+        pairs['meter_id'].astype(str).to_numpy(), meter_rows,
+        np.asarray(labels, dtype=str), group_rows, partition_by,
+    )
+
+
+def load_partition_table(path, model_version):
+    """The coefficient table at `path` if it was fit alongside `model_version`, else None."""
+    if not os.path.exists(path):
+        return None
+    table = CoefficientTable.load(path)
+    if table.model_version != model_version:
+        logger.info(f"Ignoring {path}: fit for model {table.model_version}, serving {model_version}")
+        return None
+    return table
@@ -0,0 +1,400 @@
+# src/models/streaming_train.py
+
+import json
+import logging
+import os
+import time
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.data.storage import iter_csv_byte_range, iter_table, storage_format, tail_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Share of rows held out for evaluation, chosen by a hash of the row id
+TEST_FRACTION = 0.2
+
+# Eigenvalues of the centered Gram matrix below this (relative to the largest) count as zero.
+# Forming X'X squares the condition number, so this is ~sqrt(eps) on the singular-value scale.
+GRAM_RCOND = 1e-14
+
+TRAINING_STATE_FORMAT = 1
+
+
+def min_norm_solve(cxx, cxy, rcond=GRAM_RCOND):
+    """
+    Minimum-norm solution of cxx @ coef = cxy for one (p, p) centered Gram
+    matrix or a stack (..., p, p) of them, via eigh: eigenvalues below
+    rcond * largest are treated as zero (same solution as lstsq for
+    rank-deficient X). Returns (coef, eigenvalues, kept mask).
+    """
+    eigvals, eigvecs = np.linalg.eigh(cxx)
+    eigvals = np.clip(eigvals, 0.0, None)
+    keep = eigvals > eigvals.max(axis=-1, keepdims=True) * rcond
+    inverse = np.divide(1.0, eigvals, out=np.zeros_like(eigvals), where=keep)
+    projected = np.einsum('...ji,...j->...i', eigvecs, cxy)
+    coef = np.einsum('...ij,...j->...i', eigvecs, inverse * projected)
+    return coef, eigvals, keep
+
+
+def is_test_row(ids, test_fraction=TEST_FRACTION):
+    """
+    Deterministic train/test split on the row id (Fibonacci hashing), so any
+    chunking of the data, and any later run, puts each row on the same side.
+    """
+    h = np.asarray(ids, dtype=np.int64).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53) < test_fraction
+
+
+class SufficientStats:
+    """
+    Row count, means and centered cross-products of (X, y), updated chunk by
+    chunk with the pairwise (Chan et al.) merge, so memory is O(features²)
+    and no raw X'X with large uncentered values is ever formed.
+    """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.cxx = np.zeros((n_features, n_features))
+        self.cxy = np.zeros(n_features)
+        self.cyy = 0.0
+
+    def update(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        n_b = len(y)
+        if n_b == 0:
+            return self
+        mean_xb = X.mean(axis=0)
+        mean_yb = y.mean()
+        Xc = X - mean_xb
+        yc = y - mean_yb
+        self._merge(n_b, mean_xb, mean_yb, Xc.T @ Xc, Xc.T @ yc, yc @ yc)
+        return self
+
+    def merge(self, other):
+        if other.n:
+            self._merge(other.n, other.mean_x, other.mean_y, other.cxx, other.cxy, other.cyy)
+        return self
+
+    def _merge(self, n_b, mean_xb, mean_yb, cxx_b, cxy_b, cyy_b):
+        n_a = self.n
+        n = n_a + n_b
+        dx = mean_xb - self.mean_x
+        dy = mean_yb - self.mean_y
+        scale = n_a * n_b / n
+        self.cxx += cxx_b + scale * np.outer(dx, dx)
+        self.cxy += cxy_b + scale * dx * dy
+        self.cyy += cyy_b + scale * dy * dy
+        self.mean_x += dx * (n_b / n)
+        self.mean_y += dy * (n_b / n)
+        self.n = n
+
+    def to_dict(self):
+        return {
+            'n': self.n,
+            'mean_x': self.mean_x.tolist(),
+            'mean_y': self.mean_y,
+            'cxx': self.cxx.tolist(),
+            'cxy': self.cxy.tolist(),
+            'cyy': self.cyy,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(len(state['mean_x']))
+        stats.n = int(state['n'])
+        stats.mean_x = np.asarray(state['mean_x'], dtype=np.float64)
+        stats.mean_y = float(state['mean_y'])
+        stats.cxx = np.asarray(state['cxx'], dtype=np.float64)
+        stats.cxy = np.asarray(state['cxy'], dtype=np.float64)
+        stats.cyy = float(state['cyy'])
+        return stats
+
+    def residual_metrics(self, coef, intercept):
+        """MSE/RMSE/R² of y ≈ X @ coef + intercept over the accumulated rows, from the moments alone."""
+        if self.n == 0:
+            return {'mse': float('nan'), 'rmse': float('nan'), 'r2': float('nan'), 'rows': 0}
+        mean_residual = self.mean_y - self.mean_x @ coef - intercept
+        sse = self.cyy - 2 * coef @ self.cxy + coef @ self.cxx @ coef + self.n * mean_residual ** 2
+        mse = max(float(sse), 0.0) / self.n
+        return {
+            'mse': mse,
+            'rmse': mse ** 0.5,
+            'r2': 1.0 - mse * self.n / self.cyy if self.cyy > 0 else float('nan'),
+            'rows': self.n,
+        }
+
+    def solve(self, rcond=GRAM_RCOND):
+        """
+        Minimum-norm least-squares coefficients from the centered normal
+        equations (same solution as LinearRegression's lstsq, including for
+        rank-deficient X such as constant columns). Returns
+        (coef, intercept, rank, singular_values).
+        """
+        if self.n == 0:
+            raise ValueError("❌ No training rows")
+        coef, eigvals, keep = min_norm_solve(self.cxx, self.cxy, rcond)
+        intercept = self.mean_y - self.mean_x @ coef
+        singular = np.sqrt(eigvals)[::-1]
+        singular[~keep[::-1]] = 0.0
+        return coef, intercept, int(keep.sum()), singular
+
+
+class StreamedMetrics:
+    """MSE, MAE and R² accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.mean_y = 0.0
+        self.m2_y = 0.0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64)
+        err = y_true - y_pred
+        self.sse += float(err @ err)
+        self.sae += float(np.abs(err).sum())
+        # Pairwise merge of the target variance (for R²)
+        n_b = len(y_true)
+        if n_b:
+            mean_b = y_true.mean()
+            m2_b = float(((y_true - mean_b) ** 2).sum())
+            n = self.n + n_b
+            delta = mean_b - self.mean_y
+            self.m2_y += m2_b + delta * delta * self.n * n_b / n
+            self.mean_y += delta * n_b / n
+            self.n = n
+
+    def result(self):
+        if self.n == 0:
+            logger.warning("⚠️ No held-out rows to evaluate on; metrics are NaN")
+            nan = float('nan')
+            return {'mse': nan, 'rmse': nan, 'mae': nan, 'r2': nan, 'rows': 0}
+        mse = self.sse / self.n
+        return {
+            'mse': mse,
+            'rmse': mse ** 0.5,
+            'mae': self.sae / self.n,
+            'r2': 1.0 - self.sse / self.m2_y if self.m2_y > 0 else float('nan'),
+            'rows': self.n,
+        }
+
+
+def _column_means(path, columns, chunksize):
+    sums = np.zeros(len(columns))
+    counts = np.zeros(len(columns))
+    for chunk in iter_table(path, columns=columns, chunksize=chunksize):
+        values = chunk[columns].to_numpy(dtype=np.float64)
+        sums += np.nansum(values, axis=0)
+        counts += (~np.isnan(values)).sum(axis=0)
+    return dict(zip(columns, sums / counts))
+
+
+def _split_chunk(chunk, means):
+    """(is_test mask, X, y) of one chunk with NaNs filled from `means`."""
+    X = chunk[FEATURE_COLS].fillna({col: means[col] for col in FEATURE_COLS}).to_numpy(dtype=np.float64)
+    y = chunk[TARGET_COL].fillna(means[TARGET_COL]).to_numpy(dtype=np.float64)
+    return is_test_row(chunk['id'].to_numpy()), X, y
+
+
+def _iter_split_chunks(path, chunksize, means):
+    """Yields (is_test mask, X, y) per chunk with NaNs filled from the full-data means."""
+    columns = ['id'] + FEATURE_COLS + [TARGET_COL]
+    for chunk in iter_table(path, columns=columns, chunksize=chunksize):
+        yield _split_chunk(chunk, means)
+
+
+def _linear_model(coef, intercept, rank, singular):
+    """A fitted LinearRegression from solved coefficients."""
+    model = LinearRegression()
+    model.feature_names_in_ = np.asarray(FEATURE_COLS, dtype=object)
+    model.n_features_in_ = len(FEATURE_COLS)
+    model.coef_ = coef
+    model.intercept_ = float(intercept)
+    model.rank_ = rank
+    model.singular_ = singular
+    return model
+
+
+def _input_position(path):
+    """(offset, fingerprint) marking the end of a CSV, so the next run can read only appended bytes."""
+    if storage_format(path) != 'csv':
+        return None, None
+    size = os.path.getsize(path)
+    return size, tail_fingerprint(path, size)
+
+
+def fit_linear_regression_streaming(path, chunksize=100_000, test_fraction=TEST_FRACTION):
+    """
+    Trains LinearRegression on `path` (CSV/Parquet/Feather) without holding it in memory.
+
+    Pass 1 computes the full-data feature/target means used to fill NaNs
+    (as the in-memory trainer does), pass 2 accumulates SufficientStats over
+    the training rows, pass 3 scores the held-out rows for metrics. Returns
+    (model, metrics, feature_means); the model is a regular fitted
+    LinearRegression, so it is saved, served and cached like any other.
+    """
+    model, metrics, feature_means, _ = _fit_full(path, chunksize, test_fraction)
+    return model, metrics, feature_means
+
+
+def _fit_full(path, chunksize, test_fraction):
+    timings = {}
+    offset, fingerprint = _input_position(path)
+    # Pass 1 reads every row (for the fill means): the load stage of a streamed fit
+    start = time.perf_counter()
+    means = _column_means(path, FEATURE_COLS + [TARGET_COL], chunksize)
+    timings['load_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = SufficientStats(len(FEATURE_COLS))
+    held_out = SufficientStats(len(FEATURE_COLS))
+    max_id = None
+    columns = ['id'] + FEATURE_COLS + [TARGET_COL]
+    for chunk in iter_table(path, columns=columns, chunksize=chunksize):
+        if len(chunk):
+            chunk_max = int(chunk['id'].max())
+            max_id = chunk_max if max_id is None else max(max_id, chunk_max)
+        test, X, y = _split_chunk(chunk, means)
+        stats.update(X[~test], y[~test])
+        held_out.update(X[test], y[test])
+    coef, intercept, rank, singular = stats.solve()
+    timings['fit_seconds'] = time.perf_counter() - start
+
+    model = _linear_model(coef, intercept, rank, singular)
+
+    start = time.perf_counter()
+    scores = StreamedMetrics()
+    for test, X, y in _iter_split_chunks(path, chunksize, means):
+        if test.any():
+            scores.update(y[test], X[test] @ coef + intercept)
+    timings['evaluate_seconds'] = time.perf_counter() - start
+
+    metrics = dict(scores.result(), train_rows=stats.n, mode='full', **timings)
+    logger.info(f"✅ Streamed fit on {stats.n} rows (rank {rank}), evaluated on {scores.n} held-out rows")
+    feature_means = {col: means[col] for col in FEATURE_COLS}
+    state = {
+        'format': TRAINING_STATE_FORMAT,
+        'features': FEATURE_COLS,
+        'test_fraction': test_fraction,
+        'fill_means': means,
+        'train': stats.to_dict(),
+        'test': held_out.to_dict(),
+        'max_id': max_id,
+        'input_offset': offset,
+        'input_fingerprint': fingerprint,
+        'mae': metrics['mae'],
+    }
+    return model, metrics, feature_means, state
+
+
+def save_training_state(state, path):
+    """Writes the training state JSON atomically (floats round-trip exactly)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_training_state(path, test_fraction=TEST_FRACTION):
+    """The saved training state, or None if missing or not compatible with this code."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if (state.get('format') != TRAINING_STATE_FORMAT or state.get('features') != FEATURE_COLS
+            or state.get('test_fraction') != test_fraction):
+        logger.warning(f"⚠️ Training state {path} does not match the current features/split; ignoring it")
+        return None
+    return state
+
+
+def _iter_new_rows(path, state, chunksize):
+    """Chunks of `path` with id past the state's watermark; reads only appended bytes of an appended-to CSV."""
+    columns = ['id'] + FEATURE_COLS + [TARGET_COL]
+    offset = state['input_offset']
+    chunks = None
+    if storage_format(path) == 'csv' and offset is not None:
+        size = os.path.getsize(path)
+        if size >= offset and tail_fingerprint(path, offset) == state['input_fingerprint']:
+            chunks = iter_csv_byte_range(path, (offset, size), usecols=columns, chunksize=chunksize)
+        else:
+            logger.warning(f"⚠️ {path} was rewritten; scanning it for ids > {state['max_id']}")
+    if chunks is None:
+        chunks = iter_table(path, columns=columns, chunksize=chunksize)
+    for chunk in chunks:
+        if state['max_id'] is not None:
+            chunk = chunk[chunk['id'] > state['max_id']]
+        if len(chunk):
+            yield chunk
+
+
+def retrain_linear_regression(path, state=None, chunksize=100_000, full=False, test_fraction=TEST_FRACTION):
+    """
+    Warm-start retraining: folds only rows added since `state` into the saved
+    sufficient statistics and re-solves. Runs a full streamed fit when there
+    is no usable state or `full` is set. Returns (model, metrics,
+    feature_means, state) with the updated state to persist.
+
+    New rows have NaNs filled with the state's fill means (those of the last
+    full fit, which inference also uses), so without missing values an
+    incremental fit equals a full fit on the same rows. RMSE/R² cover all
+    held-out rows (from their moments); MAE only the new held-out rows, since
+    absolute errors of old rows can't be updated without re-reading them.
+    """
+    if full or state is None:
+        logger.info(f"🔁 Full retrain on {path}")
+        return _fit_full(path, chunksize, test_fraction)
+
+    start = time.perf_counter()
+    means = state['fill_means']
+    stats = SufficientStats.from_dict(state['train'])
+    held_out = SufficientStats.from_dict(state['test'])
+    offset, fingerprint = _input_position(path)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    max_id = state['max_id']
+    new_rows = 0
+    for chunk in _iter_new_rows(path, state, chunksize):
+        test, X, y = _split_chunk(chunk, means)
+        stats.update(X[~test], y[~test])
+        held_out.update(X[test], y[test])
+        chunk_max = int(chunk['id'].max())
+        max_id = chunk_max if max_id is None else max(max_id, chunk_max)
+        new_rows += len(chunk)
+    coef, intercept, rank, singular = stats.solve()
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = StreamedMetrics()
+    if new_rows:
+        for chunk in _iter_new_rows(path, state, chunksize):
+            test, X, y = _split_chunk(chunk, means)
+            if test.any():
+                scores.update(y[test], X[test] @ coef + intercept)
+    mae = scores.result()['mae'] if scores.n else state['mae']
+    evaluate_seconds = time.perf_counter() - start
+
+    metrics = dict(held_out.residual_metrics(coef, intercept), mae=mae, mae_rows=scores.n,
+                   train_rows=stats.n, new_rows=new_rows, mode='incremental',
+                   load_seconds=load_seconds, fit_seconds=fit_seconds, evaluate_seconds=evaluate_seconds)
+    logger.info(f"✅ Folded {new_rows} new rows into the training state ({stats.n} train rows, rank {rank})")
+    state = dict(
+        state,
+        train=stats.to_dict(),
+        test=held_out.to_dict(),
+        max_id=max_id,
+        input_offset=offset,
+        input_fingerprint=fingerprint,
+        mae=mae,
+    )
+    feature_means = {col: means[col] for col in FEATURE_COLS}
+    return _linear_model(coef, intercept, rank, singular), metrics, feature_means, state
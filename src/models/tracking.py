@@ -0,0 +1,316 @@
+# src/models/tracking.py
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://mlflow_server:5000")
+MLFLOW_EXPERIMENT = os.getenv("MLFLOW_EXPERIMENT", "meter_units_regression")
+
+# Runs whose logging has not finished, replayed by replay_spooled_runs(). Kept out of
+# the model artifacts so the model registry never serves the spooled copies.
+MLFLOW_SPOOL_DIR = os.getenv(
+    "MLFLOW_SPOOL_DIR", os.path.join(os.path.dirname(__file__), "../../data/mlflow_spool")
+)
+
+# Seconds to wait for the server's /health before spooling instead
+MLFLOW_CONNECT_TIMEOUT = float(os.getenv("MLFLOW_CONNECT_TIMEOUT", "3"))
+# Seconds without upload progress after which a replay takes over a claimed spooled run
+MLFLOW_UPLOAD_TIMEOUT = float(os.getenv("MLFLOW_UPLOAD_TIMEOUT", "300"))
+# Seconds record_run waits for the artifact upload before returning
+MLFLOW_UPLOAD_WAIT = float(os.getenv("MLFLOW_UPLOAD_WAIT", "300"))
+
+RUN_RECORD_NAME = "run.json"
+# Present while a process uploads a spooled run: "<host> <pid>"
+UPLOAD_MARKER_NAME = "uploading"
+
+
+def tracking_server_available(tracking_uri=None, timeout=None):
+    """
+    True when `tracking_uri` answers: one GET /health for HTTP servers
+    (instead of retrying blocking client calls), always True for local stores.
+    """
+    tracking_uri = tracking_uri or MLFLOW_TRACKING_URI
+    if not tracking_uri.startswith(("http://", "https://")):
+        return True
+    try:
+        with urllib.request.urlopen(f"{tracking_uri.rstrip('/')}/health",
+                                    timeout=timeout or MLFLOW_CONNECT_TIMEOUT) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.warning(f"⚠️ MLflow tracking server {tracking_uri} unreachable: {e}")
+        return False
+
+
+def make_run_record(params, metrics, artifacts=(), tags=None, experiment=None):
+    """
+    Everything one training run logs: params, metrics, tags and artifact
+    files as [{'path', 'artifact_path'}]. Plain JSON, so it can be spooled.
+    """
+    return {
+        "id": uuid.uuid4().hex,
+        "experiment": experiment or MLFLOW_EXPERIMENT,
+        "created_at_ms": int(time.time() * 1000),
+        "params": {key: str(value) for key, value in params.items()},
+        "metrics": {key: float(value) for key, value in metrics.items()},
+        "tags": {key: str(value) for key, value in (tags or {}).items()},
+        "artifacts": [{"path": path, "artifact_path": artifact_path} for path, artifact_path in artifacts],
+        # Set once the params/metrics are on the server, so a replay only uploads artifacts
+        "run_id": None,
+    }
+
+
+def _default_client(tracking_uri):
+    from mlflow.tracking import MlflowClient
+
+    return MlflowClient(tracking_uri=tracking_uri)
+
+
+def _experiment_id(client, name):
+    experiment = client.get_experiment_by_name(name)
+    if experiment is not None:
+        return experiment.experiment_id
+    logger.info(f"🧪 Creating MLflow experiment {name}")
+    return client.create_experiment(name)
+
+
+def _upload_artifacts(client, run_id, artifacts, marker=None):
+    for artifact in artifacts:
+        client.log_artifact(run_id, artifact["path"], artifact_path=artifact["artifact_path"])
+        if marker:
+            # Heartbeat: a slow upload is not mistaken for an abandoned one
+            os.utime(marker)
+    client.set_terminated(run_id)
+    return len(artifacts)
+
+
+def log_run_record(client, record):
+    """
+    Creates the run and sends all params, metrics and tags in one log_batch
+    call, unless the record already has a run_id. Returns the run_id.
+    """
+    if record["run_id"] is not None:
+        return record["run_id"]
+    from mlflow.entities import Metric, Param, RunTag
+
+    run = client.create_run(_experiment_id(client, record["experiment"]), start_time=record["created_at_ms"])
+    run_id = run.info.run_id
+    client.log_batch(
+        run_id,
+        metrics=[Metric(key, value, record["created_at_ms"], 0) for key, value in record["metrics"].items()],
+        params=[Param(key, value) for key, value in record["params"].items()],
+        tags=[RunTag(key, value) for key, value in record["tags"].items()],
+    )
+    logger.info(f"📊 Logged {len(record['params'])} params and {len(record['metrics'])} metrics "
+                f"to run {run_id} in one batch")
+    return run_id
+
+
+def _read_record(run_dir):
+    with open(os.path.join(run_dir, RUN_RECORD_NAME)) as f:
+        return json.load(f)
+
+
+def _write_record(run_dir, record):
+    path = os.path.join(run_dir, RUN_RECORD_NAME)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _marker_is_stale(marker, stale_after):
+    try:
+        with open(marker) as f:
+            host, pid = f.read().split()
+        age = time.time() - os.path.getmtime(marker)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        return True
+    if age > stale_after:
+        return True
+    if host != socket.gethostname():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _claim(run_dir, stale_after=None):
+    """
+    Marks a spooled run as being uploaded by this process. False when another
+    upload holds it, unless that claim is abandoned: its process is gone or it
+    has not made progress for `stale_after` (MLFLOW_UPLOAD_TIMEOUT) seconds.
+    """
+    marker = os.path.join(run_dir, UPLOAD_MARKER_NAME)
+    if _marker_is_stale(marker, MLFLOW_UPLOAD_TIMEOUT if stale_after is None else stale_after):
+        logger.warning(f"⚠️ Taking over the abandoned upload of {run_dir}")
+        _release(run_dir)
+    try:
+        fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except (FileExistsError, FileNotFoundError):
+        # Held by another upload, or already uploaded and removed
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{socket.gethostname()} {os.getpid()}")
+    return True
+
+
+def _release(run_dir):
+    try:
+        os.remove(os.path.join(run_dir, UPLOAD_MARKER_NAME))
+    except FileNotFoundError:
+        pass
+
+
+def spool_run_record(record, spool_dir=None, claim=False):
+    """
+    Writes the record and copies of its artifacts under spool_dir/<id>/ for a
+    later replay. With `claim`, the run is marked as being uploaded by this
+    process before it becomes visible to replays.
+    """
+    spool_dir = spool_dir or MLFLOW_SPOOL_DIR
+    run_dir = os.path.join(spool_dir, record["id"])
+    tmp_dir = f"{run_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "artifacts"))
+
+    spooled = []
+    for i, artifact in enumerate(record["artifacts"]):
+        # Copy now: the originals are overwritten by the next training run
+        name = f"{i:03d}-{os.path.basename(artifact['path'])}"
+        shutil.copy2(artifact["path"], os.path.join(tmp_dir, "artifacts", name))
+        spooled.append(dict(artifact, path=os.path.join(run_dir, "artifacts", name)))
+
+    _write_record(tmp_dir, dict(record, artifacts=spooled))
+    if claim:
+        _claim(tmp_dir)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.rename(tmp_dir, run_dir)
+    logger.info(f"💾 Spooled MLflow run {record['id']} to {run_dir}")
+    return run_dir
+
+
+def _upload_spooled_run(client, record, run_dir):
+    """Uploads a claimed run's artifacts and deletes it from the spool; releases the claim on failure."""
+    try:
+        _upload_artifacts(client, record["run_id"], record["artifacts"],
+                          marker=os.path.join(run_dir, UPLOAD_MARKER_NAME))
+    except Exception:
+        _release(run_dir)
+        raise
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _upload_in_background(client, record, run_dir):
+    try:
+        _upload_spooled_run(client, record, run_dir)
+    except Exception as e:
+        logger.warning(f"⚠️ Artifact upload for run {record['run_id']} failed ({e}); it stays spooled for replay")
+        return
+    logger.info(f"✅ Artifacts of run {record['run_id']} uploaded")
+
+
+def record_run(record, tracking_uri=None, spool_dir=None, client_factory=None, wait=None):
+    """
+    Logs `record`'s params and metrics to the tracking server and uploads its
+    artifacts on a thread, waiting up to `wait` (MLFLOW_UPLOAD_WAIT) seconds
+    for it so the upload is not cut short when the task exits. The run is
+    spooled first: if the server is down, the logging fails or the upload is
+    still running when the process exits, a replay finishes it under the
+    same run_id.
+    Returns {'status': 'logged' | 'uploading' | 'spooled', 'run_id', 'path', 'upload'}.
+    """
+    tracking_uri = tracking_uri or MLFLOW_TRACKING_URI
+    if not tracking_server_available(tracking_uri):
+        return {"status": "spooled", "run_id": None, "path": spool_run_record(record, spool_dir), "upload": None}
+
+    run_dir = spool_run_record(record, spool_dir, claim=True)
+    record = _read_record(run_dir)
+    try:
+        client = (client_factory or _default_client)(tracking_uri)
+        record["run_id"] = log_run_record(client, record)
+        # Persist the run id, so a replay only re-sends the artifacts
+        _write_record(run_dir, record)
+    except Exception as e:
+        logger.warning(f"⚠️ MLflow logging failed ({e}); the run stays spooled for replay")
+        _release(run_dir)
+        return {"status": "spooled", "run_id": record["run_id"], "path": run_dir, "upload": None}
+
+    upload = threading.Thread(target=_upload_in_background, args=(client, record, run_dir),
+                              name="mlflow-upload", daemon=True)
+    upload.start()
+    upload.join(MLFLOW_UPLOAD_WAIT if wait is None else wait)
+    if upload.is_alive():
+        logger.warning(f"⚠️ Run {record['run_id']} logged to {tracking_uri}; its artifacts are still uploading "
+                       f"and are replayed if this process exits first")
+        return {"status": "uploading", "run_id": record["run_id"], "path": run_dir, "upload": upload}
+    logger.info(f"✅ Run {record['run_id']} logged to {tracking_uri}")
+    return {"status": "logged", "run_id": record["run_id"], "path": run_dir, "upload": upload}
+
+
+def replay_spooled_runs(tracking_uri=None, spool_dir=None, client_factory=None, stale_after=None):
+    """
+    Sends spooled runs to the tracking server, oldest first, deleting each
+    one once it is fully logged. Runs another process is still uploading are
+    skipped. Stops at the first failure. Returns the number of runs replayed.
+    """
+    tracking_uri = tracking_uri or MLFLOW_TRACKING_URI
+    spool_dir = spool_dir or MLFLOW_SPOOL_DIR
+    if not os.path.isdir(spool_dir):
+        return 0
+    records = []
+    for name in os.listdir(spool_dir):
+        run_dir = os.path.join(spool_dir, name)
+        if not name.endswith(".tmp") and os.path.exists(os.path.join(run_dir, RUN_RECORD_NAME)):
+            records.append((_read_record(run_dir), run_dir))
+    if not records or not tracking_server_available(tracking_uri):
+        return 0
+
+    client = (client_factory or _default_client)(tracking_uri)
+    replayed = 0
+    for record, run_dir in sorted(records, key=lambda item: item[0]["created_at_ms"]):
+        if not _claim(run_dir, stale_after):
+            logger.info(f"⏭️ Spooled run {record['id']} is being uploaded by another process")
+            continue
+        try:
+            # Re-read under the claim: the previous owner may have logged the run meanwhile
+            record = _read_record(run_dir)
+            record["run_id"] = log_run_record(client, record)
+            _write_record(run_dir, record)
+            _upload_spooled_run(client, record, run_dir)
+        except Exception as e:
+            _release(run_dir)
+            logger.warning(f"⚠️ Replay of spooled run {record['id']} failed: {e}")
+            break
+        replayed += 1
+        logger.info(f"📤 Replayed spooled run {record['id']} as {record['run_id']}")
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay MLflow runs spooled while the server was down")
+    parser.add_argument("--tracking-uri", default=None, help=f"Default: {MLFLOW_TRACKING_URI}")
+    parser.add_argument("--spool-dir", default=None, help=f"Default: {MLFLOW_SPOOL_DIR}")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    count = replay_spooled_runs(args.tracking_uri, args.spool_dir)
+    print(f"Replayed {count} spooled run(s)")
+
+
+if __name__ == "__main__":
+    main()
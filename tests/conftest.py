@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
@@ -18,3 +20,10 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "slow: Slow tests"
     )
+
+
+@pytest.fixture(autouse=True)
+def isolated_dataset_cache(tmp_path, monkeypatch):
+    """Keep preprocessed-dataset cache entries of test inputs out of data/cache"""
+    from src.data import dataset_cache
+    monkeypatch.setattr(dataset_cache, '_default_cache', dataset_cache.DatasetCache(str(tmp_path / 'dataset_cache')))
@@ -0,0 +1,694 @@
+"""
+Unit tests for the model API server
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.server import app
+
+
+SAMPLE_FEATURES = {
+    'voltage': 220.5,
+    'temperature': 25.0,
+    'power_factor': 0.95,
+    'load_kw': 2.5,
+    'frequency_hz': 50.0,
+    'hour': 12,
+    'day_of_week': 2,
+    'is_weekend': 0,
+    'voltage_flag': 1,
+    'pf_issue': 0,
+    'high_temp': 0,
+    'load_intensity': 10.5
+}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.mark.unit
+class TestBatchPredict:
+    """Test the /predict/batch endpoint"""
+
+    def test_records_match_single_predictions(self, client):
+        """Test batch records score the same as single /predict calls"""
+        other = dict(SAMPLE_FEATURES, voltage=240.0, load_kw=7.5, hour=20)
+        single = [client.post('/predict', json=f).json()['prediction']
+                  for f in (SAMPLE_FEATURES, other)]
+
+        response = client.post('/predict/batch', json={'records': [SAMPLE_FEATURES, other]})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['count'] == 2
+        assert body['predictions'] == single
+        assert body['model_version']
+
+    def test_columnar_payload(self, client):
+        """Test columnar payload gives the same result as records"""
+        records = [SAMPLE_FEATURES, dict(SAMPLE_FEATURES, temperature=35.0)]
+        columns = {col: [r[col] for r in records] for col in SAMPLE_FEATURES}
+
+        by_records = client.post('/predict/batch', json={'records': records}).json()
+        by_columns = client.post('/predict/batch', json={'columns': columns}).json()
+
+        assert by_columns['predictions'] == by_records['predictions']
+
+    def test_rejects_ragged_or_ambiguous_payload(self, client):
+        """Test invalid batch payloads are rejected"""
+        columns = {col: [SAMPLE_FEATURES[col]] for col in SAMPLE_FEATURES}
+        columns['voltage'] = [220.0, 221.0]
+
+        assert client.post('/predict/batch', json={'columns': columns}).status_code == 422
+        assert client.post('/predict/batch', json={}).status_code == 422
+
+
+@pytest.mark.unit
+class TestCompiledScorer:
+    """Test the compiled linear scorer against sklearn"""
+
+    def _training_frame(self):
+        import numpy as np
+        import pandas as pd
+        from src.api.server import FEATURE_COLUMNS
+
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((200, len(FEATURE_COLUMNS))) * 100, columns=FEATURE_COLUMNS)
+        y = X.to_numpy() @ rng.random(len(FEATURE_COLUMNS)) + rng.random(200)
+        return X, y
+
+    def test_linear_parity_with_sklearn(self):
+        """Test LinearScorer matches LinearRegression.predict"""
+        import numpy as np
+        from sklearn.linear_model import LinearRegression
+        from src.api.scoring import LinearScorer, build_scorer
+
+        X, y = self._training_frame()
+        # Train on shuffled column order to check weights are reordered by name
+        shuffled = list(reversed(X.columns))
+        model = LinearRegression().fit(X[shuffled], y)
+
+        scorer = build_scorer(model, list(X.columns))
+
+        assert isinstance(scorer, LinearScorer)
+        expected = model.predict(X[shuffled])
+        np.testing.assert_allclose(scorer.predict(X.to_numpy()), expected, rtol=1e-10)
+        assert scorer.predict_one(X.iloc[0].tolist()) == pytest.approx(expected[0], rel=1e-10)
+
+    def test_non_linear_model_falls_back(self):
+        """Test non-linear models are scored through their own predict()"""
+        import numpy as np
+        from sklearn.tree import DecisionTreeRegressor
+        from src.api.scoring import EstimatorScorer, build_scorer
+
+        X, y = self._training_frame()
+        model = DecisionTreeRegressor(max_depth=3, random_state=0).fit(X, y)
+
+        scorer = build_scorer(model, list(X.columns))
+
+        assert isinstance(scorer, EstimatorScorer)
+        np.testing.assert_allclose(scorer.predict(X.to_numpy()), model.predict(X))
+
+
+@pytest.mark.unit
+class TestMicroBatcher:
+    """Test coalescing of concurrent single-row requests"""
+
+    def test_concurrent_rows_are_coalesced(self):
+        """Test concurrent submits are scored in few vectorized calls"""
+        import asyncio
+        import numpy as np
+        from src.api.batching import MicroBatcher
+
+        batch_sizes = []
+
+        def score(X):
+            batch_sizes.append(len(X))
+            return X.sum(axis=1), 'v1'
+
+        async def run():
+            batcher = MicroBatcher(score, max_batch_size=16, max_wait_us=20000)
+            await batcher.start()
+            try:
+                rows = [[float(i), 1.0] for i in range(40)]
+                return await asyncio.gather(*(batcher.submit(r) for r in rows))
+            finally:
+                await batcher.stop()
+
+        results = asyncio.run(run())
+
+        assert results == [(i + 1.0, 'v1') for i in range(40)]
+        assert sum(batch_sizes) == 40
+        assert max(batch_sizes) <= 16
+        assert len(batch_sizes) < 40
+
+    def test_scoring_error_propagates_to_callers(self):
+        """Test a failing batch rejects every waiting request"""
+        import asyncio
+        from src.api.batching import MicroBatcher
+
+        def score(X):
+            raise RuntimeError('boom')
+
+        async def run():
+            batcher = MicroBatcher(score, max_batch_size=4, max_wait_us=1000)
+            await batcher.start()
+            try:
+                return await asyncio.gather(batcher.submit([1.0]), return_exceptions=True)
+            finally:
+                await batcher.stop()
+
+        [error] = asyncio.run(run())
+        assert isinstance(error, RuntimeError)
+
+    def test_scoring_runs_off_the_event_loop_unless_inline(self):
+        """Test score_fn runs in a worker thread by default and on the loop when marked cheap"""
+        import asyncio
+        import threading
+        from src.api.batching import MicroBatcher
+
+        async def run(inline):
+            threads = []
+
+            def score(X):
+                threads.append(threading.current_thread())
+                return X.sum(axis=1), 'v1'
+
+            batcher = MicroBatcher(score, max_batch_size=4, max_wait_us=1000, inline=inline)
+            await batcher.start()
+            try:
+                await asyncio.gather(batcher.submit([1.0]), batcher.submit([2.0]))
+            finally:
+                await batcher.stop()
+            return threads, threading.current_thread()
+
+        threads, loop_thread = asyncio.run(run(inline=False))
+        assert threads and loop_thread not in threads
+        threads, loop_thread = asyncio.run(run(inline=lambda: True))
+        assert threads and set(threads) == {loop_thread}
+
+    def test_predict_endpoint_with_microbatching(self, monkeypatch):
+        """Test /predict gives the same answer with micro-batching enabled"""
+        from src.api import server
+
+        with TestClient(app) as plain_client:
+            expected = plain_client.post('/predict', json=SAMPLE_FEATURES).json()
+
+        monkeypatch.setattr(server, 'MICROBATCH_ENABLED', True)
+        server.prediction_cache.clear()  # make sure the request reaches the batcher
+        with TestClient(app) as batched_client:
+            assert server.batcher is not None
+            response = batched_client.post('/predict', json=SAMPLE_FEATURES)
+
+        assert response.json() == expected
+        assert server.batcher is None
+
+
+@pytest.mark.unit
+class TestModelManager:
+    """Test hot reload and rollback of the served model"""
+
+    def _fit(self, path, offset):
+        import joblib
+        import numpy as np
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+        from src.api.server import FEATURE_COLUMNS
+
+        rng = np.random.default_rng(1)
+        X = pd.DataFrame(rng.random((50, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+        y = X.sum(axis=1) + offset
+        joblib.dump(LinearRegression().fit(X, y), path)
+
+    def test_reload_and_rollback(self, tmp_path):
+        """Test a changed artifact is swapped in and the old one kept for rollback"""
+        import os
+        from src.api.model_manager import ModelManager
+        from src.api.server import FEATURE_COLUMNS
+
+        path = str(tmp_path / 'model.pkl')
+        self._fit(path, offset=0.0)
+        manager = ModelManager(path, FEATURE_COLUMNS, poll_interval=0)
+        first = manager.load()
+
+        assert manager.reload_if_changed() is False
+
+        self._fit(path, offset=100.0)
+        os.utime(path, ns=(1, 1))  # make sure the mtime differs from the first write
+        assert manager.reload_if_changed() is True
+
+        second = manager.current
+        assert second.version != first.version
+        assert manager.previous is first
+        assert second.scorer.predict_one([0.0] * 12) == pytest.approx(
+            first.scorer.predict_one([0.0] * 12) + 100.0)
+
+        assert manager.rollback() is first
+        assert manager.previous is second
+
+    def test_partition_table_is_loaded_for_its_model_version(self, tmp_path):
+        """Test a coefficient table is served only alongside the model version it was fit for"""
+        import numpy as np
+        from src.api.model_manager import ModelManager
+        from src.api.server import FEATURE_COLUMNS
+        from src.models.partitioned import PARTITIONS_FILENAME, CoefficientTable
+
+        path = str(tmp_path / 'model.pkl')
+        self._fit(path, offset=0.0)
+        table = CoefficientTable(FEATURE_COLUMNS, np.zeros((2, 12)), [0.0, 42.0], ['MTR0000001'], [1],
+                                 ['MTR0000001'], [1], 'meter_id', model_version='stale')
+        table.save(str(tmp_path / PARTITIONS_FILENAME))
+        assert ModelManager(path, FEATURE_COLUMNS, poll_interval=0).load().partitions is None
+
+        version = ModelManager(path, FEATURE_COLUMNS, poll_interval=0).load().version
+        table.model_version = version
+        table.save(str(tmp_path / PARTITIONS_FILENAME))
+        served = ModelManager(path, FEATURE_COLUMNS, poll_interval=0).load()
+        assert served.partitions.predict_one([1.0] * 12, 'MTR0000001') == 42.0
+        assert served.info()['partitions'] == 1
+
+    def test_predict_by_meter_id(self, client, monkeypatch):
+        """Test /predict and /predict/batch use the meter's coefficients and fall back to the global model"""
+        import numpy as np
+        from src.api.server import FEATURE_COLUMNS, model_manager
+        from src.models.partitioned import CoefficientTable
+
+        version = model_manager.current
+        table = CoefficientTable(FEATURE_COLUMNS, np.zeros((2, 12)), [0.0, 42.0], ['MTR0000001'], [1],
+                                 ['MTR0000001'], [1], 'meter_id', model_version=version.version)
+        monkeypatch.setattr(version, 'partitions', table)
+        global_prediction = client.post('/predict', json=SAMPLE_FEATURES).json()['prediction']
+
+        assert client.post('/predict', json={**SAMPLE_FEATURES, 'meter_id': 'MTR0000001'}).json()['prediction'] == 42.0
+        records = [{**SAMPLE_FEATURES, 'meter_id': 'MTR0000001'}, {**SAMPLE_FEATURES, 'meter_id': 'MTR0000999'}]
+        body = client.post('/predict/batch', json={'records': records}).json()
+        assert body['predictions'][0] == 42.0
+        # Unknown meters get row 0 of the table, which here is all zeros
+        assert body['predictions'][1] == 0.0
+        assert global_prediction != 42.0
+
+    def test_responses_report_model_version(self, client):
+        """Test /predict and /model report the same served version"""
+        version = client.get('/model').json()['current']['version']
+
+        assert client.post('/predict', json=SAMPLE_FEATURES).json()['model_version'] == version
+
+
+@pytest.mark.unit
+class TestPredictionCache:
+    """Test the LRU prediction cache"""
+
+    def test_lru_eviction_and_counters(self):
+        """Test the least recently used entry is evicted at the cap"""
+        from src.api.cache import PredictionCache
+
+        cache = PredictionCache(max_entries=2, ttl_seconds=60)
+        cache.put((1.0,), 'v1', 10.0)
+        cache.put((2.0,), 'v1', 20.0)
+        assert cache.get((1.0,), 'v1') == 10.0  # (2.0,) is now least recently used
+        cache.put((3.0,), 'v1', 30.0)
+
+        assert cache.get((2.0,), 'v1') is None
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1)
+
+    def test_quantization_ttl_and_version_invalidation(self, monkeypatch):
+        """Test quantized keys, expiry and invalidation on a new model version"""
+        from src.api import cache as cache_module
+        from src.api.cache import PredictionCache
+
+        cache = PredictionCache(max_entries=10, ttl_seconds=5, quantum=0.1)
+        key = cache.make_key([220.51, 1])
+        assert cache.make_key([220.49, 1]) == key
+
+        cache.put(key, 'v1', 42.0)
+        assert cache.get(key, 'v2') is None  # new version clears the cache
+        assert cache.stats()['invalidations'] == 1
+
+        cache.put(key, 'v2', 43.0)
+        now = cache_module.time.monotonic()
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + 10)
+        assert cache.get(key, 'v2') is None
+        assert cache.stats()['expirations'] == 1
+
+    def test_repeat_predict_is_served_from_cache(self, client):
+        """Test a repeated /predict request is a cache hit"""
+        from src.api.server import prediction_cache
+
+        prediction_cache.clear()
+        hits_before = prediction_cache.stats()['hits']
+        first = client.post('/predict', json=SAMPLE_FEATURES).json()
+        second = client.post('/predict', json=SAMPLE_FEATURES).json()
+
+        assert second == first
+        assert client.get('/cache/stats').json()['hits'] == hits_before + 1
+
+
+@pytest.mark.unit
+class TestStreamPredict:
+    """Test the /predict/stream endpoint"""
+
+    def _rows(self, n):
+        return [dict(SAMPLE_FEATURES, id=i, load_kw=float(i)) for i in range(n)]
+
+    def _batch_predictions(self, client, rows):
+        records = [{k: v for k, v in r.items() if k != 'id'} for r in rows]
+        return client.post('/predict/batch', json={'records': records}).json()['predictions']
+
+    def test_ndjson_stream(self, client, monkeypatch):
+        """Test NDJSON rows are scored in chunks and echoed with their ids"""
+        import json
+        from src.api import server
+
+        monkeypatch.setattr(server, 'STREAM_CHUNK_ROWS', 3)
+        rows = self._rows(7)
+
+        def body():
+            # Split lines across network chunks to exercise partial-line buffering
+            payload = ''.join(json.dumps(r) + '\n' for r in rows).encode()
+            for start in range(0, len(payload), 50):
+                yield payload[start:start + 50]
+
+        response = client.post('/predict/stream', content=body(),
+                               headers={'Content-Type': 'application/x-ndjson'})
+
+        assert response.status_code == 200
+        assert response.headers['x-model-version']
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line['id'] for line in lines] == list(range(7))
+        assert [line['prediction'] for line in lines] == self._batch_predictions(client, rows)
+
+    def test_ndjson_stream_reports_bad_row(self, client, monkeypatch):
+        """Test a malformed row ends the stream with an error line, or gets a 400 in the first chunk"""
+        import json
+        from src.api import server
+
+        payload = json.dumps(SAMPLE_FEATURES) + '\n{"voltage": 1}\n'
+        response = client.post('/predict/stream', content=payload,
+                               headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 400
+
+        monkeypatch.setattr(server, 'STREAM_CHUNK_ROWS', 1)
+        response = client.post('/predict/stream', content=payload,
+                               headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 200
+        last = json.loads(response.text.splitlines()[-1])
+        assert 'error' in last and last['rows_scored'] == 1
+
+    def test_oversized_line_is_rejected(self, client, monkeypatch):
+        """Test a line past the length limit gets 413 up front and ends a started stream"""
+        import json
+        from src.api import server
+
+        monkeypatch.setattr(server, 'STREAM_MAX_LINE_BYTES', 1024)
+        huge = 'x' * 5000
+
+        def body():
+            yield b'{"padding": "'
+            for _ in range(100):  # never sends a newline
+                yield huge.encode()
+
+        response = client.post('/predict/stream', content=body(),
+                               headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 413
+
+        monkeypatch.setattr(server, 'STREAM_CHUNK_ROWS', 1)
+        payload = json.dumps(SAMPLE_FEATURES) + '\n' + json.dumps(dict(SAMPLE_FEATURES, padding=huge)) + '\n'
+        response = client.post('/predict/stream', content=payload,
+                               headers={'Content-Type': 'application/x-ndjson'})
+        last = json.loads(response.text.splitlines()[-1])
+        assert 'longer than 1024 bytes' in last['error'] and last['rows_scored'] == 1
+
+    def test_stream_uses_meter_partitions(self, client, monkeypatch):
+        """Test streamed rows with a meter_id are scored from the coefficient table like /predict"""
+        import json
+        import numpy as np
+        from src.api import server
+        from src.api.server import FEATURE_COLUMNS
+        from src.models.partitioned import CoefficientTable
+
+        version = server.model_manager.current
+        table = CoefficientTable(FEATURE_COLUMNS, np.zeros((2, 12)), [0.0, 42.0], ['MTR0000001'], [1],
+                                 ['MTR0000001'], [1], 'meter_id', model_version=version.version)
+        monkeypatch.setattr(version, 'partitions', table)
+        rows = [dict(SAMPLE_FEATURES, meter_id='MTR0000001'), SAMPLE_FEATURES]
+
+        response = client.post('/predict/stream', content=''.join(json.dumps(r) + '\n' for r in rows),
+                               headers={'Content-Type': 'application/x-ndjson'})
+        predictions = [json.loads(line)['prediction'] for line in response.text.splitlines()]
+        single = [client.post('/predict', json=r).json()['prediction'] for r in rows]
+        assert predictions == single and predictions[0] == 42.0
+
+    def test_arrow_stream(self, client):
+        """Test Arrow IPC record batches are scored like NDJSON rows"""
+        import json
+        pa = pytest.importorskip('pyarrow')
+
+        rows = self._rows(5)
+        table = pa.Table.from_pylist(rows)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=2):
+                writer.write_batch(batch)
+
+        response = client.post('/predict/stream', content=sink.getvalue().to_pybytes(),
+                               headers={'Content-Type': 'application/vnd.apache.arrow.stream'})
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line['id'] for line in lines] == list(range(5))
+        assert [line['prediction'] for line in lines] == self._batch_predictions(client, rows)
+
+
+@pytest.mark.unit
+class TestMetrics:
+    """Test the Prometheus /metrics endpoint"""
+
+    def test_histogram_rendering(self):
+        """Test histogram buckets are cumulative in the exposition format"""
+        from src.api.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        latency = registry.histogram('demo_seconds', 'Demo latency', ('stage',), buckets=(0.1, 1.0))
+        latency.observe('score', value=0.05)
+        latency.observe('score', value=0.5)
+        latency.observe('score', value=5.0)
+
+        text = registry.render()
+
+        assert 'demo_seconds_bucket{stage="score",le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{stage="score",le="1.0"} 2' in text
+        assert 'demo_seconds_bucket{stage="score",le="+Inf"} 3' in text
+        assert 'demo_seconds_count{stage="score"} 3' in text
+
+    def test_predict_is_instrumented(self, client):
+        """Test /predict updates stage histograms and counters"""
+        from src.api.server import prediction_cache
+
+        prediction_cache.clear()
+        client.post('/predict', json=SAMPLE_FEATURES)
+        client.post('/predict/batch', json={'records': [SAMPLE_FEATURES] * 3})
+
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/plain')
+        text = response.text
+        for stage in ('parse_validate', 'features', 'score', 'serialize'):
+            assert f'model_api_stage_seconds_count{{endpoint="predict",stage="{stage}"}}' in text
+        assert 'model_api_requests_total{method="POST",path="/predict",status="200"}' in text
+        assert 'model_api_rows_scored_total{endpoint="predict_batch"}' in text
+        assert 'model_api_model_load_seconds{version=' in text
+        assert 'model_api_requests_in_flight' in text
+
+
+@pytest.mark.unit
+class TestModelRegistry:
+    """Test serving multiple artifacts by name and version"""
+
+    def _dump(self, path, offset, n_features=3):
+        import joblib
+        import numpy as np
+        from sklearn.linear_model import LinearRegression
+
+        X = np.random.default_rng(2).random((30, n_features))
+        joblib.dump(LinearRegression().fit(X, X.sum(axis=1) + offset), path)
+
+    def test_lazy_load_versions_and_lru_eviction(self, tmp_path):
+        """Test models load on first use and are evicted beyond the memory budget"""
+        import os
+        from src.api.registry import ModelNotFoundError, ModelRegistry
+
+        (tmp_path / 'old').mkdir()
+        self._dump(tmp_path / 'old' / 'meter.pkl', offset=0.0)
+        os.utime(tmp_path / 'old' / 'meter.pkl', (1, 1))
+        self._dump(tmp_path / 'meter.pkl', offset=10.0)
+        self._dump(tmp_path / 'other.joblib', offset=5.0)
+        (tmp_path / 'cache').mkdir()
+        self._dump(tmp_path / 'cache' / 'copy.pkl', offset=0.0)
+
+        registry = ModelRegistry([str(tmp_path), str(tmp_path / 'old')], memory_budget_bytes=10 ** 9)
+        models = registry.scan()
+        assert len(models['meter']) == 2
+        assert 'copy' not in models  # subdirectories of a root are not scanned
+        assert registry.loaded_bytes() == 0
+
+        newest = registry.get('meter')
+        oldest = registry.get('meter', models['meter'][1].version)
+        assert newest.predict(instances=[[0, 0, 0]])[0] == pytest.approx(
+            oldest.predict(instances=[[0, 0, 0]])[0] + 10.0)
+
+        # Budget for a single model: loading another evicts the least recently used
+        registry.memory_budget_bytes = newest.memory_bytes
+        registry.get('other')
+        assert registry.evictions == 2
+        assert [v['loaded'] for v in registry.describe()['other']] == [True]
+
+        with pytest.raises(ModelNotFoundError):
+            registry.get('missing')
+
+    def test_unknown_names_do_not_force_rescans(self, tmp_path, monkeypatch):
+        """Test misses rescan at most once per interval and unchanged files are not re-hashed"""
+        import hashlib
+        from src.api import registry as registry_module
+        from src.api.registry import ModelNotFoundError, ModelRegistry
+
+        self._dump(tmp_path / 'meter.pkl', offset=0.0)
+        registry = ModelRegistry([str(tmp_path)], rescan_interval=3600)
+        registry.scan()
+        hashed = []
+
+        class CountingHashlib:
+            @staticmethod
+            def sha256(data):
+                hashed.append(len(data))
+                return hashlib.sha256(data)
+        monkeypatch.setattr(registry_module, 'hashlib', CountingHashlib)
+
+        for name in ('a', 'b', 'c'):
+            with pytest.raises(ModelNotFoundError):
+                registry.get(name)
+        self._dump(tmp_path / 'new.pkl', offset=1.0)
+        with pytest.raises(ModelNotFoundError):
+            registry.get('new')  # within the interval: no rescan
+        assert hashed == []
+
+        registry.scan()  # explicit reload
+        assert registry.get('new').entry.name == 'new'
+        assert len(hashed) == 1  # only the new file
+
+        registry.rescan_interval = 0
+        self._dump(tmp_path / 'late.pkl', offset=2.0)
+        assert registry.get('late').entry.name == 'late'
+
+    def test_model_is_served_with_its_preprocessor(self, tmp_path):
+        """Test a paired encoder transforms record columns first and is not listed on its own"""
+        import joblib
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+        from sklearn.preprocessing import OneHotEncoder
+        from src.api.registry import ModelNotFoundError, ModelRegistry
+
+        frame = pd.DataFrame({'x': [0.0, 1.0, 2.0, 3.0], 'color': ['red', 'blue', 'red', 'blue']})
+        encoder = OneHotEncoder(sparse_output=False).fit(frame[['color']])
+        features = pd.concat([frame[['x']], pd.DataFrame(
+            encoder.transform(frame[['color']]), columns=encoder.get_feature_names_out())], axis=1)
+        joblib.dump(encoder, tmp_path / 'encoder.pkl')
+        joblib.dump(LinearRegression().fit(features, frame['x'] + 10 * (frame['color'] == 'red')),
+                    tmp_path / 'model.pkl')
+
+        registry = ModelRegistry([str(tmp_path)], preprocessors={'model': 'encoder'})
+        assert sorted(registry.scan()) == ['model']
+        assert registry.describe()['model'][0]['preprocessor']['name'] == 'encoder'
+        with pytest.raises(ModelNotFoundError):
+            registry.get('encoder')
+
+        model = registry.get('model')
+        predictions = model.predict(records=[{'x': 1.0, 'color': 'red'}, {'x': 1.0, 'color': 'blue'}])
+        assert predictions == pytest.approx([11.0, 1.0])
+        with pytest.raises(ValueError, match='records'):
+            model.predict(instances=[[1.0, 0.0, 1.0]])
+
+    def test_torch_model_rejects_records(self, client, tmp_path, monkeypatch):
+        """Test named records sent to a torch model are a client error, not a server error"""
+        from src.api import server
+        from src.api.registry import LoadedModel, ModelEntry, ModelNotServableError
+
+        entry = ModelEntry('lstm', 'v1', str(tmp_path / 'lstm.pt'), 10, 0.0)
+        loaded = LoadedModel(entry, object(), load_seconds=0.0)
+        with pytest.raises(ModelNotServableError, match='instances'):
+            loaded.predict(records=[{'x': 1.0}])
+
+        monkeypatch.setattr(server.model_registry, 'get', lambda name, version=None: loaded)
+        response = client.post('/models/lstm/predict', json={'records': [{'x': 1.0}]})
+        assert response.status_code == 422
+
+    def test_models_endpoint(self, client):
+        """Test the shipped artifacts are listed and servable by name"""
+        listing = client.get('/models').json()['models']
+        assert 'linear_regression_model' in listing
+        assert 'lstm_meter_model' in listing
+        assert 'encoder' not in listing
+        assert listing['logistic_regression_model'][0]['preprocessor']['name'] == 'encoder'
+
+        response = client.post('/models/linear_regression_model/predict',
+                               json={'records': [SAMPLE_FEATURES]})
+        assert response.status_code == 200
+        single = client.post('/predict', json=SAMPLE_FEATURES).json()['prediction']
+        assert round(response.json()['predictions'][0], 2) == single
+
+        assert client.post('/models/nope/predict', json={'instances': [[1]]}).status_code == 404
+
+
+@pytest.mark.unit
+class TestSharedModelMemory:
+    """Test memory-mapped model loading shared between workers"""
+
+    def test_model_arrays_are_memory_mapped(self, tmp_path):
+        """Test mmap loading exports once and maps the same arrays read-only"""
+        import os
+        import numpy as np
+        from src.api.model_manager import ModelManager
+        from src.api.server import FEATURE_COLUMNS, model_path
+
+        mmap_dir = str(tmp_path / 'shm')
+        plain = ModelManager(model_path, FEATURE_COLUMNS, poll_interval=0).load()
+        first = ModelManager(model_path, FEATURE_COLUMNS, poll_interval=0, mmap_dir=mmap_dir).load()
+        # A second "worker" reuses the export written by the first
+        second = ModelManager(model_path, FEATURE_COLUMNS, poll_interval=0, mmap_dir=mmap_dir).load()
+
+        assert os.listdir(mmap_dir) == [f'{first.version}.joblib']
+        assert isinstance(first.model.coef_, np.memmap)
+        assert not first.model.coef_.flags.writeable
+        assert second.version == first.version == plain.version
+        row = [220.5, 25.0, 0.95, 2.5, 50.0, 12, 2, 0, 1, 0, 0, 10.5]
+        assert second.scorer.predict_one(row) == pytest.approx(plain.scorer.predict_one(row))
+
+
+@pytest.mark.unit
+class TestLoadTestHarness:
+    """Test the API load-test benchmark harness"""
+
+    def test_in_process_run_reports_latency_percentiles(self):
+        """Test an in-process run scores every request and reports throughput and percentiles"""
+        import asyncio
+        import importlib.util
+
+        spec = importlib.util.spec_from_file_location('api_load_test', 'benchmarks/api_load_test.py')
+        harness = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(harness)
+
+        payloads = harness.load_payloads(limit=50)
+        report = asyncio.run(harness.run_benchmark(
+            scenarios=('predict', 'batch'), requests=20, concurrency=4,
+            batch_size=10, warmup=2, payloads=payloads,
+        ))
+
+        results = {r['scenario']: r for r in report['results']}
+        assert report['target'] == 'in-process'
+        assert results['predict']['requests'] == 20 and results['predict']['errors'] == 0
+        assert results['batch']['rows'] == 200
+        latency = results['batch']['latency_ms']
+        assert latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
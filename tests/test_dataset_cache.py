@@ -0,0 +1,116 @@
+"""
+Unit tests for the preprocessed dataset cache
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import dataset_cache
+from src.data.dataset_cache import DatasetCache
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.models import inference
+
+
+@pytest.fixture
+def meter_csv(tmp_path):
+    """Meter features CSV with missing features, target and meter ids"""
+    df = pd.read_csv(inference.METER_DATA_CSV, nrows=60)
+    df.loc[[2, 9, 41], 'voltage'] = np.nan
+    df.loc[[9, 30], 'load_kw'] = np.nan
+    df.loc[[5], TARGET_COL] = np.nan
+    df.loc[[7], 'meter_id'] = np.nan
+    path = tmp_path / 'meter_features.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.unit
+class TestDatasetCache:
+    """Test fingerprinted, memory-mapped preprocessed datasets"""
+
+    def test_entry_matches_pandas_preprocessing(self, meter_csv, tmp_path):
+        """Test cached arrays equal parse + fillna(mean) of the source"""
+        dataset = DatasetCache(str(tmp_path / 'cache')).load(str(meter_csv), chunksize=16)
+        df = pd.read_csv(meter_csv)
+
+        expected_X = df[FEATURE_COLS].fillna(df[FEATURE_COLS].mean())
+        np.testing.assert_allclose(dataset.feature_matrix(), expected_X.to_numpy())
+        np.testing.assert_allclose(dataset.target(), df[TARGET_COL].fillna(df[TARGET_COL].mean()))
+        assert isinstance(dataset.X, np.memmap)
+        frame = dataset.frame()
+        assert frame['id'].tolist() == df['id'].tolist()
+        assert frame['meter_id'].tolist() == df['meter_id'].where(df['meter_id'].notna(), None).tolist()
+        assert (frame['date'] == pd.to_datetime(df['date'])).all()
+        assert sorted(map(tuple, dataset.missing.tolist())) == [(2, 0), (9, 0), (9, 3), (30, 3), (41, 0)]
+
+    def test_unchanged_source_is_not_parsed_again(self, meter_csv, tmp_path, monkeypatch):
+        """Test a second load (even after touching mtime) reuses the entry without parsing"""
+        cache = DatasetCache(str(tmp_path / 'cache'))
+        first = cache.load(str(meter_csv))
+        os.utime(meter_csv)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("source was parsed again")
+        monkeypatch.setattr(dataset_cache, 'iter_table', fail)
+        assert cache.load(str(meter_csv)).entry_dir == first.entry_dir
+
+    def test_changed_content_gets_a_new_entry(self, meter_csv, tmp_path):
+        """Test edits to the source produce a new fingerprint and fresh arrays"""
+        cache = DatasetCache(str(tmp_path / 'cache'))
+        first = cache.load(str(meter_csv))
+        df = pd.read_csv(meter_csv)
+        df.loc[0, 'voltage'] = 1.0
+        df.to_csv(meter_csv, index=False)
+
+        second = cache.load(str(meter_csv))
+        assert second.entry_dir != first.entry_dir
+        assert second.feature_matrix()[0, 0] == 1.0
+
+    def test_other_fill_values_patch_only_missing_cells(self, meter_csv, tmp_path):
+        """Test inference-time fill means replace exactly the originally missing values"""
+        dataset = DatasetCache(str(tmp_path / 'cache')).load(str(meter_csv))
+        means = {col: -1.0 for col in FEATURE_COLS}
+        df = pd.read_csv(meter_csv)
+
+        chunks = list(dataset.iter_chunks(25, means))
+        X = pd.concat([X for X, _ in chunks])
+        pd.testing.assert_frame_equal(X, df[FEATURE_COLS].fillna(-1.0).astype(float))
+        assert dataset.feature_matrix(0, 5)[2, 0] == dataset.fill_means['voltage']
+
+    def test_least_recently_used_entries_are_evicted(self, meter_csv, tmp_path):
+        """Test the cache keeps at most max_entries datasets"""
+        cache = DatasetCache(str(tmp_path / 'cache'), max_entries=2)
+        df = pd.read_csv(meter_csv)
+        entries = []
+        for i in range(3):
+            df.loc[0, 'voltage'] = float(i)
+            df.to_csv(meter_csv, index=False)
+            entries.append(cache.load(str(meter_csv)).entry_dir)
+
+        assert [os.path.exists(entry) for entry in entries] == [False, True, True]
+
+    def test_inference_from_cache_matches_parsing(self, meter_csv, tmp_path, monkeypatch):
+        """Test make_predictions writes the same file with and without the dataset cache"""
+        outputs, watermarks = [], []
+        for enabled in (False, True, True):
+            monkeypatch.setattr(dataset_cache, 'DATASET_CACHE', enabled)
+            output = tmp_path / f'predictions_{len(outputs)}.csv'
+            inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=16,
+                                       workers=1, incremental=False)
+            outputs.append(output.read_bytes())
+            watermarks.append(inference.load_watermark(inference.watermark_path_for(str(output))))
+        assert outputs[0] == outputs[1] == outputs[2]
+        assert watermarks[0]['max_date'] == watermarks[1]['max_date'] == watermarks[2]['max_date']
+        assert watermarks[0]['max_date'] == pd.to_datetime(pd.read_csv(meter_csv)['date']).max().isoformat(sep=' ')
+
+    def test_cache_is_off_by_default_and_not_built_for_inference_prep(self, meter_csv, monkeypatch):
+        """Test preparing inference doesn't hash or parse the input into the cache"""
+        assert os.getenv('DATASET_CACHE') is not None or not dataset_cache.DATASET_CACHE
+        monkeypatch.setattr(dataset_cache, 'DATASET_CACHE', True)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("dataset cache was built")
+        monkeypatch.setattr(dataset_cache, 'load_dataset', fail)
+        inference.prepare_features_for_inference(str(meter_csv), chunksize=16)
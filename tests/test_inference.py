@@ -0,0 +1,236 @@
+"""
+Unit tests for batch inference
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.features import FEATURE_COLS, compute_feature_means, save_feature_means
+from src.models import inference
+
+
+@pytest.fixture
+def meter_csv(tmp_path):
+    """Small meter features CSV with missing values"""
+    df = pd.read_csv(inference.METER_DATA_CSV, nrows=25)
+    df.loc[[1, 7, 20], 'voltage'] = np.nan
+    df.loc[[3, 12], 'load_kw'] = np.nan
+    path = tmp_path / 'meter_features.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.unit
+class TestChunkedInference:
+    """Test chunked, bounded-memory inference"""
+
+    def test_streaming_means_match_in_memory_means(self, meter_csv):
+        """Test the one-pass streamed means equal pandas means over the full frame"""
+        expected = pd.read_csv(meter_csv)[FEATURE_COLS].mean()
+        means = compute_feature_means(meter_csv, chunksize=4)
+        assert means == pytest.approx(expected.to_dict())
+
+    def test_chunked_output_matches_full_frame(self, meter_csv, tmp_path, monkeypatch):
+        """Test chunked scoring writes the same predictions as scoring the whole frame"""
+        means_path = tmp_path / 'feature_means.json'
+        df = pd.read_csv(meter_csv)
+        save_feature_means(df[FEATURE_COLS].mean(), str(means_path))
+        monkeypatch.setattr(inference, 'FEATURE_MEANS_PATH', str(means_path))
+
+        output = tmp_path / 'predictions.csv'
+        summary = inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=6)
+
+        model = inference.load_latest_model()
+        expected = model.predict(df[FEATURE_COLS].fillna(df[FEATURE_COLS].mean()))
+        written = pd.read_csv(output)
+        assert summary['rows'] == len(df) == len(written)
+        assert list(written.columns) == ['id', 'meter_id', 'actual_units', 'predicted_units']
+        assert written['id'].tolist() == df['id'].tolist()
+        np.testing.assert_allclose(written['predicted_units'], expected)
+
+    def test_chunks_fill_with_training_means(self, meter_csv, tmp_path, monkeypatch):
+        """Test NaNs are filled from the saved training means, not per-chunk means"""
+        means = {col: 1000.0 + i for i, col in enumerate(FEATURE_COLS)}
+        means_path = tmp_path / 'feature_means.json'
+        save_feature_means(means, str(means_path))
+        monkeypatch.setattr(inference, 'FEATURE_MEANS_PATH', str(means_path))
+
+        chunks = list(inference.iter_inference_chunks(str(meter_csv), chunksize=5))
+        X = pd.concat([X for X, _ in chunks])
+        assert len(chunks) == 5
+        assert X.loc[[1, 7, 20], 'voltage'].tolist() == [means['voltage']] * 3
+        assert X.loc[[3, 12], 'load_kw'].tolist() == [means['load_kw']] * 2
+
+    def test_partitioned_table_scores_by_meter(self, meter_csv, tmp_path, monkeypatch):
+        """Test a coefficient table saved for the current model is used per meter_id"""
+        from src.models.partitioned import CoefficientTable
+
+        df = pd.read_csv(meter_csv)
+        model = inference.load_latest_model()
+        meter = df['meter_id'].iloc[0]
+        table = CoefficientTable(FEATURE_COLS, np.vstack([model.coef_, np.zeros(12)]),
+                                 [model.intercept_, 7.0], [meter], [1], [meter], [1], 'meter_id',
+                                 model_version=inference.model_version())
+        monkeypatch.setattr(inference, 'PARTITIONS_PATH', table.save(str(tmp_path / 'table.npz')))
+
+        output = tmp_path / 'predictions.csv'
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=6,
+                                   workers=1, incremental=False)
+        written = pd.read_csv(output)
+        own = written['meter_id'] == meter
+        assert (written.loc[own, 'predicted_units'] == 7.0).all()
+        expected = model.predict(df[FEATURE_COLS].fillna(inference.get_feature_means()))
+        np.testing.assert_allclose(written.loc[~own, 'predicted_units'], expected[~own.to_numpy()])
+
+
+@pytest.mark.unit
+class TestParallelInference:
+    """Test process-pool sharded inference"""
+
+    def test_byte_ranges_cover_every_row_once(self, meter_csv):
+        """Test shards start on line boundaries and together cover all data rows"""
+        ranges = inference.split_csv_byte_ranges(str(meter_csv), 4)
+        raw = meter_csv.read_bytes()
+        header_end = raw.index(b'\n') + 1
+
+        assert ranges[0][0] == header_end and ranges[-1][1] == len(raw)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        assert all(raw[start - 1:start] == b'\n' for start, _ in ranges)
+        rows = sum(raw[start:end].count(b'\n') for start, end in ranges)
+        assert rows == 25
+
+    def test_parallel_output_matches_sequential(self, meter_csv, tmp_path):
+        """Test sharded scoring keeps input order, columns and predictions, run after run"""
+        sequential = tmp_path / 'sequential.csv'
+        parallel = tmp_path / 'parallel.csv'
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(sequential), chunksize=4)
+        summary = inference.make_predictions(csv_path=str(meter_csv), output_path=str(parallel),
+                                             chunksize=4, workers=2)
+        first_run = parallel.read_bytes()
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(parallel), chunksize=4, workers=2,
+                                   incremental=False)
+
+        expected = pd.read_csv(sequential)
+        written = pd.read_csv(parallel)
+        assert summary['rows'] == 25
+        assert parallel.read_bytes() == first_run
+        assert list(written.columns) == list(expected.columns)
+        assert written['id'].tolist() == expected['id'].tolist()
+        np.testing.assert_allclose(written['predicted_units'], expected['predicted_units'], rtol=1e-12)
+        assert not list(tmp_path.glob('*.part*'))
+
+
+@pytest.mark.unit
+class TestIncrementalInference:
+    """Test watermark-based incremental inference"""
+
+    def _append_rows(self, csv_path, start_id, count):
+        rows = pd.read_csv(inference.METER_DATA_CSV, skiprows=range(1, 101), nrows=count)
+        rows['id'] = range(start_id, start_id + count)
+        rows.to_csv(csv_path, mode='a', header=False, index=False)
+
+    def test_only_new_rows_are_scored_and_appended(self, meter_csv, tmp_path):
+        """Test a second run scores only appended rows and matches a full re-score"""
+        output = tmp_path / 'predictions.csv'
+        first = inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+        unchanged = inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+
+        self._append_rows(meter_csv, 1001, 7)
+        increment = inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+
+        full = tmp_path / 'full.csv'
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(full), chunksize=4, incremental=False)
+        watermark = inference.load_watermark(inference.watermark_path_for(str(output)))
+
+        assert (first['mode'], first['rows']) == ('full', 25)
+        assert (unchanged['mode'], unchanged['rows']) == ('incremental', 0)
+        assert (increment['mode'], increment['rows'], increment['total_rows']) == ('incremental', 7, 32)
+        assert watermark['max_id'] == 1007 and watermark['rows'] == 32
+        expected, written = pd.read_csv(full), pd.read_csv(output)
+        assert written['id'].tolist() == expected['id'].tolist()
+        np.testing.assert_allclose(written['predicted_units'], expected['predicted_units'], rtol=1e-12)
+
+    def test_model_version_change_rescores_everything(self, meter_csv, tmp_path, monkeypatch):
+        """Test a new model version triggers a full re-score instead of an append"""
+        output = tmp_path / 'predictions.csv'
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+
+        monkeypatch.setattr(inference, 'model_version', lambda model_path=None: 'new-version')
+        summary = inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+
+        assert (summary['mode'], summary['rows']) == ('full', 25)
+        assert inference.load_watermark(inference.watermark_path_for(str(output)))['model_version'] == 'new-version'
+
+    def test_partial_append_from_crashed_run_is_discarded(self, meter_csv, tmp_path):
+        """Test rows appended after the last saved watermark are dropped, not duplicated"""
+        output = tmp_path / 'predictions.csv'
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+        with open(output, 'a') as f:
+            f.write('1001,MTR0000001,1.0,2.0\n')  # written by a run that died before saving its watermark
+
+        self._append_rows(meter_csv, 1001, 3)
+        inference.make_predictions(csv_path=str(meter_csv), output_path=str(output), chunksize=4)
+
+        ids = pd.read_csv(output)['id']
+        assert len(ids) == 28 and ids.is_unique
+
+
+@pytest.mark.unit
+class TestModelArtifactCache:
+    """Test content-addressed model loading"""
+
+    def _loader(self, calls):
+        import joblib
+
+        def loader(path):
+            calls.append(path)
+            return joblib.load(path)
+        return loader
+
+    def test_fast_path_skips_unpickling(self, tmp_path):
+        """Test a fresh cache rebuilds the model from .npy arrays without calling the loader"""
+        from src.models.artifact_cache import ArtifactCache
+
+        calls = []
+        first = ArtifactCache(str(tmp_path)).load(inference.MODEL_PATH, self._loader(calls))
+        cache = ArtifactCache(str(tmp_path))  # e.g. the next Airflow task's process
+        rebuilt = cache.load(inference.MODEL_PATH, self._loader(calls))
+
+        X = pd.read_csv(inference.METER_DATA_CSV, nrows=20)[FEATURE_COLS]
+        assert len(calls) == 1
+        assert type(rebuilt) is type(first)
+        assert list(rebuilt.feature_names_in_) == FEATURE_COLS
+        np.testing.assert_array_equal(rebuilt.predict(X), first.predict(X))
+        assert cache.load(inference.MODEL_PATH, self._loader(calls)) is rebuilt
+
+    def test_tampered_arrays_fall_back_to_the_pickle(self, tmp_path):
+        """Test an array that fails its hash check is discarded and the artifact re-read"""
+        from src.models.artifact_cache import ArtifactCache
+
+        calls = []
+        ArtifactCache(str(tmp_path)).load(inference.MODEL_PATH, self._loader(calls))
+        (coef_path,) = tmp_path.glob('*/coef_.npy')
+        np.save(coef_path, np.zeros(len(FEATURE_COLS)))
+
+        model = ArtifactCache(str(tmp_path)).load(inference.MODEL_PATH, self._loader(calls))
+        assert len(calls) == 2
+        assert np.any(model.coef_ != 0)
+
+    def test_new_artifact_content_gets_a_new_entry(self, tmp_path):
+        """Test rewriting the artifact invalidates the in-process model"""
+        import shutil
+        from src.models.artifact_cache import ArtifactCache
+
+        model_copy = tmp_path / 'model.pkl'
+        shutil.copy(inference.MODEL_PATH, model_copy)
+        cache = ArtifactCache(str(tmp_path / 'cache'))
+        first = cache.load(str(model_copy))
+
+        refit = pd.read_csv(inference.METER_DATA_CSV, nrows=200)
+        from sklearn.linear_model import LinearRegression
+        import joblib
+        joblib.dump(LinearRegression().fit(refit[FEATURE_COLS], refit['units']), model_copy)
+
+        second = cache.load(str(model_copy))
+        assert second is not first
+        assert len(list((tmp_path / 'cache').iterdir())) == 2
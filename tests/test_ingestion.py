@@ -0,0 +1,308 @@
+"""
+Unit tests for raw-table ingestion
+"""
+import csv
+import io
+import re
+import threading
+
+import pandas as pd
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from src.data import ingestion
+from src.models.inference import METER_DATA_CSV
+
+
+class FakeCursor:
+    """Cursor that parses COPY'd CSV into rows (lineage last) and keeps checkpoints in a dict"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.db = conn.db
+        self.result = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        with self.db.lock:
+            self.db.statements.append(sql)
+            if sql.startswith('SELECT column_name, data_type'):
+                self.result = list(self.db.columns.items())
+            elif sql.startswith('ALTER TABLE') and 'ALTER COLUMN' in sql:
+                if self.db.fail_cast:
+                    raise psycopg2.DataError('invalid input syntax for type integer')
+                for col, sql_type in re.findall(r'ALTER COLUMN (\w+) TYPE ([A-Z ]+?) USING', sql):
+                    self.db.columns[col] = ingestion.PG_DATA_TYPES[sql_type]
+            elif sql.startswith('SELECT start_byte'):
+                self.result = [(start, end, fingerprint, rows)
+                               for (table, source, start), (end, fingerprint, rows) in self.db.checkpoints.items()
+                               if (table, source) == params]
+            elif sql.startswith('DELETE FROM meter_data_raw'):
+                source, starts = params
+                deleted = [i for i, row in enumerate(self.db.rows)
+                           if row[-2] == source and row[-1] is not None and int(row[-1]) in starts]
+                self.conn.deleted_rows.extend(deleted)
+                self.rowcount = len(deleted)
+        if sql.startswith('INSERT INTO ingestion_checkpoints'):
+            table, source, start, end, fingerprint, rows = params
+            self.conn.pending_checkpoints[(table, source, start)] = (end, fingerprint, rows)
+        elif sql.startswith('DELETE FROM ingestion_checkpoints'):
+            table, source, starts = params
+            self.conn.deleted_checkpoints.extend((table, source, start) for start in starts)
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, file):
+        with self.db.lock:
+            self.db.statements.append(sql)
+            self.db.copies += 1
+            if self.db.fail_copy is not None and self.db.copies == self.db.fail_copy:
+                raise IOError('connection lost')
+        for values in csv.reader(io.StringIO(file.read())):
+            self.conn.pending.append([value if value != '' else None for value in values])
+
+
+class FakeConnection:
+    """psycopg2-like connection: writes become visible on commit, `with conn` commits or rolls back"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rollback()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        with self.db.lock:
+            deleted = set(self.deleted_rows)
+            self.db.rows[:] = [row for i, row in enumerate(self.db.rows) if i not in deleted]
+            self.db.rows.extend(self.pending)
+            self.db.checkpoints.update(self.pending_checkpoints)
+            for key in self.deleted_checkpoints:
+                self.db.checkpoints.pop(key, None)
+        self.rollback()
+
+    def rollback(self):
+        self.pending = []
+        self.pending_checkpoints = {}
+        self.deleted_checkpoints = []
+        self.deleted_rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.rollback() if exc_type else self.commit()
+
+
+class FakePool:
+    """ThreadedConnectionPool stand-in over one in-memory database"""
+
+    def __init__(self, fail_copy=None, columns=None, fail_cast=False):
+        self.lock = threading.Lock()
+        self.statements = []
+        # information_schema types of a table that already exists
+        self.columns = dict(columns or {})
+        self.fail_cast = fail_cast
+        self.rows = []
+        self.checkpoints = {}
+        self.copies = 0
+        self.fail_copy = fail_copy
+        self.in_use = 0
+        self.max_in_use = 0
+        self.closed_connections = 0
+
+    def getconn(self):
+        with self.lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+        return FakeConnection(self)
+
+    def putconn(self, conn, close=False):
+        with self.lock:
+            self.in_use -= 1
+            self.closed_connections += close
+
+
+@pytest.fixture
+def raw_csv(tmp_path, monkeypatch):
+    """A meter features CSV under a temporary BASE_DATA_DIR, with a few missing values"""
+    monkeypatch.setattr(ingestion, 'BASE_DATA_DIR', str(tmp_path))
+    df = pd.read_csv(METER_DATA_CSV, nrows=250)
+    df.loc[df.index[::40], 'temperature'] = None
+    (tmp_path / 'raw').mkdir()
+    df.to_csv(tmp_path / 'raw' / 'meter.csv', index=False)
+    return df
+
+
+def load(pool, path='raw/meter.csv', workers=3, chunk_bytes=4096):
+    return ingestion.load_csv_to_raw_table(path, 'meter_data_raw', chunksize=10, workers=workers,
+                                           chunk_bytes=chunk_bytes, pool=pool)
+
+
+@pytest.mark.unit
+class TestLoadCsvToRawTable:
+    """Test the parallel, checkpointed COPY loader"""
+
+    def test_every_row_is_copied_once_over_the_pool(self, raw_csv):
+        """Test all rows arrive through COPY in byte-range chunks, each with a checkpoint"""
+        pool = FakePool()
+        stats = load(pool)
+
+        assert stats['rows'] == len(pool.rows) == 250 and stats['rows_per_second'] > 0
+        assert stats['chunks'] == len(pool.checkpoints) > 3 and stats['skipped_chunks'] == 0
+        assert 1 <= pool.max_in_use <= 3 and pool.in_use == 0
+        assert pool.statements[0].startswith('CREATE TABLE IF NOT EXISTS meter_data_raw')
+        copies = [sql for sql in pool.statements if sql.startswith('COPY')]
+        assert copies[0].startswith(f"COPY meter_data_raw ({', '.join(raw_csv.columns)}, _source, _start_byte) "
+                                    "FROM STDIN")
+        assert {row[-2] for row in pool.rows} == {str(ingestion.resolve_csv_path('raw/meter.csv'))}
+        assert {int(row[-1]) for row in pool.rows} == {start for _, _, start in pool.checkpoints}
+        by_id = {int(row[0]): row for row in pool.rows}
+        assert sorted(by_id) == raw_csv['id'].tolist()
+        assert [by_id[i][1] for i in raw_csv['id']] == raw_csv['meter_id'].tolist()
+        assert by_id[raw_csv['id'][0]][raw_csv.columns.get_loc('temperature')] is None
+        voltage = raw_csv.columns.get_loc('voltage')
+        assert [float(by_id[i][voltage]) for i in raw_csv['id']] == raw_csv['voltage'].tolist()
+
+    def test_failed_load_resumes_from_checkpoints(self, raw_csv):
+        """Test a crash keeps committed chunks and the rerun loads only the missing ones"""
+        pool = FakePool(fail_copy=5)  # in the second chunk: the first one has already committed
+        with pytest.raises(IOError):
+            load(pool, workers=1)
+        loaded, checkpoints = len(pool.rows), len(pool.checkpoints)
+        assert 0 < loaded < 250 and checkpoints >= 1 and pool.closed_connections == 1
+
+        pool.fail_copy = None
+        stats = load(pool)
+        assert stats['skipped_chunks'] == checkpoints and stats['rows'] == 250 - loaded
+        assert sorted(int(row[0]) for row in pool.rows) == raw_csv['id'].tolist()
+        assert load(pool)['rows'] == 0  # nothing left to load
+
+    def test_appended_rows_are_loaded_incrementally(self, raw_csv, tmp_path):
+        """Test rows appended to the CSV are loaded on the next run without reloading the rest"""
+        pool = FakePool()
+        load(pool)
+        extra = pd.read_csv(METER_DATA_CSV, skiprows=range(1, 251), nrows=40)
+        extra.to_csv(tmp_path / 'raw' / 'meter.csv', mode='a', header=False, index=False)
+
+        assert load(pool)['rows'] == 40
+        assert sorted(int(row[0]) for row in pool.rows) == list(range(1, 291))
+
+    def test_rewritten_csv_replaces_the_changed_rows(self, raw_csv, tmp_path):
+        """Test rows and checkpoints of bytes that changed are deleted and those bytes loaded again once"""
+        pool = FakePool()
+        load(pool)
+        raw_csv.assign(units=raw_csv['units'] + 1).to_csv(tmp_path / 'raw' / 'meter.csv', index=False)
+
+        stats = load(pool)
+        assert stats['rows'] > 0 and len(pool.rows) == 250
+        assert sorted(int(row[0]) for row in pool.rows) == raw_csv['id'].tolist()
+        units = raw_csv.columns.get_loc('units')
+        by_id = {int(row[0]): float(row[units]) for row in pool.rows}
+        assert [by_id[i] for i in raw_csv['id']] == pytest.approx((raw_csv['units'] + 1).tolist())
+        assert any(sql.startswith('DELETE FROM ingestion_checkpoints') for sql in pool.statements)
+
+    def test_edit_far_from_the_chunk_end_is_detected(self, raw_csv, tmp_path):
+        """Test the whole chunk is fingerprinted, not only the bytes before its end"""
+        pool = FakePool()
+        load(pool, chunk_bytes=16384)
+        chunks = len(pool.checkpoints)
+        raw_csv.loc[0, 'units'] += 1  # first row of the first chunk
+        raw_csv.to_csv(tmp_path / 'raw' / 'meter.csv', index=False)
+
+        stats = load(pool, chunk_bytes=16384)
+        assert stats['skipped_chunks'] == chunks - 1 and len(pool.rows) == 250
+        units = raw_csv.columns.get_loc('units')
+        assert [float(row[units]) for row in pool.rows if int(row[0]) == raw_csv['id'][0]] == pytest.approx([raw_csv['units'][0]])
+
+    def test_changed_rows_without_lineage_refuse_to_reload(self, raw_csv, tmp_path):
+        """Test a rewrite is refused, leaving the table as it was, when the old rows can't be found"""
+        pool = FakePool()
+        load(pool)
+        for row in pool.rows:
+            row[-2:] = [None, None]  # loaded before rows carried their lineage
+        raw_csv.assign(units=raw_csv['units'] + 1).to_csv(tmp_path / 'raw' / 'meter.csv', index=False)
+        checkpoints = dict(pool.checkpoints)
+
+        with pytest.raises(ValueError, match='truncate meter_data_raw'):
+            load(pool)
+        assert len(pool.rows) == 250 and pool.checkpoints == checkpoints
+
+    def test_header_only_csv_is_rejected(self, tmp_path, monkeypatch):
+        """Test a CSV without data rows fails instead of creating an empty table"""
+        monkeypatch.setattr(ingestion, 'BASE_DATA_DIR', str(tmp_path))
+        (tmp_path / 'empty.csv').write_text('id,meter_id,units\n')
+        pool = FakePool()
+        with pytest.raises(ValueError, match='empty'):
+            load(pool, path='empty.csv')
+        assert pool.statements == []
+
+
+@pytest.mark.unit
+class TestSchemaInference:
+    """Test typed raw-table schemas inferred from a CSV sample"""
+
+    def test_existing_text_columns_are_migrated(self, raw_csv, tmp_path):
+        """Test an all-TEXT table from an earlier load is altered to the inferred types, wider types are kept"""
+        columns = {col.lower(): 'text' for col in raw_csv.columns}
+        columns.update({'hour': 'bigint', '_source': 'text', '_start_byte': 'bigint'})
+        pool = FakePool(columns=columns)
+
+        assert load(pool)['rows'] == len(raw_csv)
+        migration = next(s for s in pool.statements if 'ALTER COLUMN' in s)
+        assert 'ALTER COLUMN id TYPE INTEGER USING id::INTEGER' in migration
+        assert 'ALTER COLUMN date TYPE TIMESTAMP USING date::TIMESTAMP' in migration
+        assert 'ALTER COLUMN hour' not in migration and 'meter_id' not in migration
+        assert pool.columns['voltage'] == 'double precision' and pool.columns['hour'] == 'bigint'
+
+    def test_rows_that_do_not_cast_fail_the_migration(self, raw_csv):
+        """Test an existing table whose rows don't fit the inferred types fails loudly before loading"""
+        pool = FakePool(columns={'id': 'text'}, fail_cast=True)
+
+        with pytest.raises(ValueError, match='drop the table'):
+            load(pool)
+        assert pool.rows == [] and pool.copies == 0
+
+    def test_meter_columns_get_typed(self, raw_csv, tmp_path):
+        """Test ids and flags are integers, readings doubles, dates timestamps, labels text"""
+        schema = dict(ingestion.infer_table_schema(str(tmp_path / 'raw' / 'meter.csv')))
+
+        assert schema['id'] == schema['hour'] == schema['is_weekend'] == 'INTEGER'
+        assert schema['voltage'] == schema['temperature'] == schema['load_intensity'] == 'DOUBLE PRECISION'
+        assert schema['date'] == 'TIMESTAMP'
+        assert schema['meter_id'] == schema['voltage_status'] == 'TEXT'
+
+    def test_tail_of_the_file_is_sampled(self, tmp_path):
+        """Test values only at the end of a large file still widen the type"""
+        df = pd.DataFrame({'id': range(1, 2001), 'code': ['7'] * 1999 + ['x'],
+                           'ts': ['2024-01-01 10:00:00'] * 2000})
+        df.loc[1999, 'id'] = 2 ** 40
+        path = tmp_path / 'big.csv'
+        df.to_csv(path, index=False)
+
+        schema = dict(ingestion.infer_table_schema(str(path), sample_rows=100))
+        assert schema == {'id': 'BIGINT', 'code': 'TEXT', 'ts': 'TIMESTAMP'}
+        assert dict(ingestion.infer_table_schema(str(path), sample_rows=5000))['id'] == 'BIGINT'
+
+    def test_value_outside_the_inferred_type_fails_the_load(self, tmp_path, monkeypatch):
+        """Test a fraction in a column sampled as INTEGER raises instead of being truncated"""
+        monkeypatch.setattr(ingestion, 'BASE_DATA_DIR', str(tmp_path))
+        monkeypatch.setattr(ingestion, 'INGEST_SCHEMA_SAMPLE_ROWS', 100)
+        values = ['1'] * 500 + ['2.5'] + ['3'] * 500
+        (tmp_path / 'odd.csv').write_text('hour\n' + '\n'.join(values) + '\n')
+        pool = FakePool()
+
+        with pytest.raises(ValueError, match='inferred schema'):
+            ingestion.load_csv_to_raw_table('odd.csv', 'odd_raw', pool=pool)
+        assert pool.rows == [] and pool.statements[0] == ('CREATE TABLE IF NOT EXISTS odd_raw '
+                                                     '( hour INTEGER, _source TEXT, _start_byte BIGINT );')
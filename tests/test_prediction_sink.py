@@ -0,0 +1,132 @@
+"""
+Unit tests for the Postgres predictions sink
+"""
+import csv
+import io
+
+import pandas as pd
+import pytest
+
+from src.data.prediction_sink import PREDICTION_COLUMNS, PostgresPredictionSink, create_predictions_table
+from src.models import inference
+
+
+class FakeCursor:
+    """Cursor that applies COPY into staging and the upsert to an in-memory table"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql):
+        self.db.statements.append(' '.join(sql.split()))
+        if 'INSERT INTO' in sql:
+            for row in self.db.staged:
+                self.db.table[(row['id'], row['model_version'])] = row
+            self.db.staged = []
+
+    def copy_expert(self, sql, file):
+        self.db.statements.append(sql)
+        names = [name for name, _ in PREDICTION_COLUMNS]
+        for values in csv.reader(io.StringIO(file.read())):
+            row = dict(zip(names, values))
+            row['id'] = int(row['id'])
+            self.db.staged.append(row)
+            self.db.copied_rows += 1
+
+
+class FakeConnection:
+    """psycopg2-like connection backed by a dict keyed on (id, model_version)"""
+
+    def __init__(self):
+        self.statements = []
+        self.staged = []
+        self.table = {}
+        self.copied_rows = 0
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.staged = []  # ON COMMIT DELETE ROWS
+
+    def rollback(self):
+        self.staged = []
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.unit
+class TestPostgresPredictionSink:
+    """Test COPY + upsert of prediction chunks"""
+
+    def test_chunks_are_copied_and_upserted_per_model_version(self):
+        """Test re-writing a chunk overwrites rows of the same version and keeps other versions"""
+        conn = FakeConnection()
+        chunk = pd.DataFrame({'id': [1, 2], 'meter_id': ['MTR1', 'MTR2'],
+                              'actual_units': [10.0, 12.0], 'predicted_units': [11.0, 13.0]})
+
+        with PostgresPredictionSink('v1', connect=lambda: conn) as sink:
+            sink.write(chunk)
+            sink.write(chunk.assign(predicted_units=[21.0, 23.0]))
+        with PostgresPredictionSink('v2', connect=lambda: conn) as sink:
+            sink.write(chunk)
+
+        assert conn.closed
+        assert len(conn.table) == 4
+        assert conn.table[(1, 'v1')]['predicted_units'] == '21.0'
+        assert conn.table[(1, 'v2')]['predicted_units'] == '11.0'
+        assert any('ON CONFLICT (id, model_version) DO UPDATE' in s for s in conn.statements)
+        assert any(s.startswith('COPY meter_unit_predictions_staging') for s in conn.statements)
+
+    def test_inference_streams_into_postgres_without_csv(self, tmp_path, monkeypatch):
+        """Test the postgres-only sink writes every prediction and no predictions file"""
+        pytest.importorskip('psycopg2')
+        import src.data.ingestion as ingestion
+
+        conn = FakeConnection()
+        monkeypatch.setattr(ingestion, 'get_pg_connection', lambda: conn)
+        input_csv = tmp_path / 'meter_features.csv'
+        pd.read_csv(inference.METER_DATA_CSV, nrows=30).to_csv(input_csv, index=False)
+        output = tmp_path / 'predictions.csv'
+
+        summary = inference.make_predictions(csv_path=str(input_csv), output_path=str(output),
+                                             chunksize=8, sinks='postgres')
+        again = inference.make_predictions(csv_path=str(input_csv), output_path=str(output),
+                                           chunksize=8, sinks='postgres')
+
+        assert summary['rows'] == 30 and again['mode'] == 'incremental' and again['rows'] == 0
+        assert not output.exists()
+        assert sorted(key[0] for key in conn.table) == list(range(1, 31))
+        assert {key[1] for key in conn.table} == {summary['model_version']}
+        assert conn.commits >= 4  # one transaction per chunk
+        creates = [s for s in conn.statements if s.startswith('CREATE TABLE')]
+        assert len(creates) == 2  # once per run, before any sink opens
+
+    def test_sinks_only_create_their_staging_table(self):
+        """Test the target table is created once up front and open() only sets up the temp table"""
+        conn = FakeConnection()
+
+        create_predictions_table(connect=lambda: conn)
+        for version in ('v1', 'v2'):
+            with PostgresPredictionSink(version, connect=lambda: conn):
+                pass
+
+        creates = [s for s in conn.statements if s.startswith('CREATE')]
+        assert creates[0].startswith('CREATE TABLE IF NOT EXISTS meter_unit_predictions (')
+        assert 'PRIMARY KEY (id, model_version)' in creates[0]
+        assert all(s.startswith('CREATE TEMP TABLE') for s in creates[1:]) and len(creates) == 3
+
+    def test_unknown_sink_is_rejected(self):
+        """Test a typo in the sinks setting fails fast"""
+        with pytest.raises(ValueError):
+            inference.make_predictions(sinks='file,s3')
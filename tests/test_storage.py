@@ -0,0 +1,94 @@
+"""
+Unit tests for columnar (Parquet/Feather) storage
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.data.storage import iter_table, read_columns, read_table, resolve_dataset, with_format, write_table
+from src.models import inference
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def meter_df():
+    """First rows of the meter features dataset"""
+    return pd.read_csv(inference.METER_DATA_CSV, nrows=40)
+
+
+@pytest.mark.unit
+class TestColumnarStorage:
+    """Test Parquet/Feather read and write helpers"""
+
+    @pytest.mark.parametrize('suffix', ['.parquet', '.feather'])
+    def test_round_trip_is_typed_and_projected(self, meter_df, tmp_path, suffix):
+        """Test date is stored as a timestamp and only requested columns are read"""
+        path = write_table(meter_df, str(tmp_path / f'features{suffix}'))
+
+        assert read_columns(path) == list(meter_df.columns)
+        projected = read_table(path, columns=FEATURE_COLS + [TARGET_COL])
+        assert list(projected.columns) == FEATURE_COLS + [TARGET_COL]
+        pd.testing.assert_frame_equal(projected, meter_df[FEATURE_COLS + [TARGET_COL]])
+        assert pd.api.types.is_datetime64_any_dtype(read_table(path, columns=['date'])['date'])
+
+    @pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.feather'])
+    def test_iter_table_yields_bounded_chunks(self, meter_df, tmp_path, suffix):
+        """Test chunked reads cover every row with at most chunksize rows each"""
+        path = write_table(meter_df, str(tmp_path / f'features{suffix}'))
+        chunks = list(iter_table(path, columns=['id', 'voltage'], chunksize=15))
+
+        assert [len(c) for c in chunks] == [15, 15, 10]
+        assert pd.concat(chunks)['id'].tolist() == meter_df['id'].tolist()
+
+    def test_feather_is_read_one_record_batch_at_a_time(self, meter_df, tmp_path):
+        """Test Feather chunks come from the file's record batches instead of one materialized table"""
+        import pyarrow as pa
+        import pyarrow.feather  # noqa: F401
+
+        path = str(tmp_path / 'features.feather')
+        pa.feather.write_feather(pa.Table.from_pandas(meter_df, preserve_index=False), path,
+                                 compression='uncompressed', chunksize=7)
+        chunks = list(iter_table(path, columns=['id', 'voltage'], chunksize=5))
+
+        assert [len(c) for c in chunks] == [5, 2] * 5 + [5]
+        assert pd.concat(chunks)['id'].tolist() == meter_df['id'].tolist()
+        assert list(chunks[0].columns) == ['id', 'voltage']
+
+    def test_resolve_dataset_prefers_existing_columnar_copy(self, meter_df, tmp_path):
+        """Test DATA_FORMAT picks the Parquet sibling only when it exists"""
+        csv_path = str(tmp_path / 'features.csv')
+        meter_df.to_csv(csv_path, index=False)
+        assert resolve_dataset(csv_path, 'parquet') == csv_path
+
+        write_table(meter_df, with_format(csv_path, 'parquet'))
+        assert resolve_dataset(csv_path, 'parquet') == str(tmp_path / 'features.parquet')
+        assert resolve_dataset(csv_path, 'csv') == csv_path
+
+
+@pytest.mark.unit
+class TestColumnarInference:
+    """Test inference on Parquet inputs and into Parquet outputs"""
+
+    def test_parquet_input_and_dataset_output_match_csv(self, meter_df, tmp_path):
+        """Test Parquet in / Parquet dataset out gives the CSV pipeline's predictions, incrementally"""
+        csv_path = str(tmp_path / 'features.csv')
+        meter_df.head(30).to_csv(csv_path, index=False)
+        parquet_path = write_table(meter_df.head(30), with_format(csv_path, 'parquet'))
+
+        output = str(tmp_path / 'predictions.parquet')
+        first = inference.make_predictions(csv_path=parquet_path, output_path=output, chunksize=8)
+        write_table(meter_df, parquet_path)  # ten new readings arrive
+        increment = inference.make_predictions(csv_path=parquet_path, output_path=output, chunksize=8)
+
+        expected_path = str(tmp_path / 'expected.csv')
+        meter_df.to_csv(csv_path, index=False)
+        inference.make_predictions(csv_path=csv_path, output_path=expected_path, chunksize=8, incremental=False)
+
+        written = pd.read_parquet(output)
+        expected = pd.read_csv(expected_path)
+        assert (first['rows'], increment['mode'], increment['rows']) == (30, 'incremental', 10)
+        assert list(written.columns) == list(expected.columns)
+        assert written['id'].tolist() == expected['id'].tolist()
+        np.testing.assert_allclose(written['predicted_units'], expected['predicted_units'], rtol=1e-12)
@@ -0,0 +1,499 @@
+"""
+Unit tests for model training
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from src.data.features import FEATURE_COLS, TARGET_COL
+from src.models.inference import METER_DATA_CSV
+from src.models.model_sweep import assign_folds, load_candidates, log_sweep_to_mlflow, run_sweep
+from src.models.partitioned import CoefficientTable, fit_partitioned, grouped_least_squares
+from src.models.streaming_train import (
+    StreamedMetrics,
+    SufficientStats,
+    fit_linear_regression_streaming,
+    is_test_row,
+    load_training_state,
+    retrain_linear_regression,
+    save_training_state,
+)
+from src.models.tracking import (
+    RUN_RECORD_NAME,
+    UPLOAD_MARKER_NAME,
+    make_run_record,
+    record_run,
+    replay_spooled_runs,
+    spool_run_record,
+    tracking_server_available,
+)
+
+
+@pytest.fixture
+def meter_csv(tmp_path):
+    """Meter features CSV with some missing values"""
+    df = pd.read_csv(METER_DATA_CSV, nrows=1200)
+    df.loc[df.index[::37], 'temperature'] = np.nan
+    df.loc[df.index[::53], TARGET_COL] = np.nan
+    path = tmp_path / 'meter_features.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+class TaskInstance:
+    """Airflow task instance stand-in recording XCom pushes"""
+
+    def __init__(self):
+        self.xcom = {}
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+@pytest.mark.unit
+class TestStreamingTraining:
+    """Test out-of-core linear regression from streamed sufficient statistics"""
+
+    @pytest.mark.parametrize('mode', ['memory', 'streaming', 'incremental'])
+    def test_every_mode_reports_stage_timings(self, mode, meter_csv, tmp_path, monkeypatch):
+        """Test load, fit, evaluate and save timings are pushed whatever the TRAIN_MODE"""
+        from src.models import train
+        monkeypatch.setattr(train, 'TRAIN_MODE', mode)
+        monkeypatch.setattr(train, 'METER_DATA_CSV', str(meter_csv))
+        monkeypatch.setattr(train, 'MODEL_DIR', str(tmp_path))
+        monkeypatch.setattr(train, 'TRAINING_STATE_PATH', str(tmp_path / 'training_state.json'))
+        monkeypatch.setattr(train, 'PARTITIONS_PATH', str(tmp_path / 'partitions.npz'))
+        ti = TaskInstance()
+
+        train.train_logistic_regression(ti=ti)
+
+        timings = ti.xcom['timings']
+        assert set(timings) == {'load_seconds', 'fit_seconds', 'evaluate_seconds', 'save_seconds', 'total_seconds'}
+        assert all(value >= 0 for value in timings.values())
+        assert timings['total_seconds'] >= timings['fit_seconds']
+
+    def test_missing_partition_column_fails_before_training(self, meter_csv, tmp_path, monkeypatch):
+        """Test TRAIN_PARTITION on data without the column points at create_datasets.py"""
+        from src.models import train
+        monkeypatch.setattr(train, 'TRAIN_MODE', 'memory')
+        monkeypatch.setattr(train, 'TRAIN_PARTITION', 'connection_type')
+        monkeypatch.setattr(train, 'METER_DATA_CSV', str(meter_csv))
+        monkeypatch.setattr(train, 'MODEL_DIR', str(tmp_path))
+
+        with pytest.raises(ValueError, match='create_datasets.py'):
+            train.train_logistic_regression(ti=TaskInstance())
+        assert not (tmp_path / 'linear_regression_model.pkl').exists()
+
+    def test_matches_sklearn_on_the_same_split(self, meter_csv):
+        """Test coefficients and held-out metrics equal LinearRegression.fit on the same rows"""
+        model, metrics, means = fit_linear_regression_streaming(str(meter_csv), chunksize=97)
+
+        df = pd.read_csv(meter_csv)
+        X = df[FEATURE_COLS].fillna(df[FEATURE_COLS].mean())
+        y = df[TARGET_COL].fillna(df[TARGET_COL].mean())
+        test = is_test_row(df['id'].to_numpy())
+        reference = LinearRegression().fit(X[~test], y[~test])
+        y_pred = reference.predict(X[test])
+
+        # The data has constant columns, so this also checks the minimum-norm solution
+        assert model.rank_ == reference.rank_ < len(FEATURE_COLS)
+        np.testing.assert_allclose(model.coef_, reference.coef_, rtol=1e-7, atol=1e-9)
+        assert model.intercept_ == pytest.approx(reference.intercept_, rel=1e-9)
+        np.testing.assert_allclose(model.predict(X), reference.predict(X), rtol=1e-9)
+        assert metrics['rows'] == test.sum() and metrics['train_rows'] == (~test).sum()
+        assert metrics['rmse'] == pytest.approx(mean_squared_error(y[test], y_pred) ** 0.5, rel=1e-9)
+        assert metrics['mae'] == pytest.approx(mean_absolute_error(y[test], y_pred), rel=1e-9)
+        assert metrics['r2'] == pytest.approx(r2_score(y[test], y_pred), rel=1e-9)
+        assert means == pytest.approx(df[FEATURE_COLS].mean().to_dict())
+
+    def test_result_does_not_depend_on_chunking(self, meter_csv):
+        """Test merged chunk statistics equal statistics over all rows at once"""
+        df = pd.read_csv(meter_csv).dropna()
+        X, y = df[FEATURE_COLS].to_numpy(dtype=float), df[TARGET_COL].to_numpy()
+        whole = SufficientStats(len(FEATURE_COLS)).update(X, y)
+        merged = SufficientStats(len(FEATURE_COLS))
+        for part in np.array_split(np.arange(len(y)), 7):
+            merged.merge(SufficientStats(len(FEATURE_COLS)).update(X[part], y[part]))
+
+        np.testing.assert_allclose(merged.cxx, whole.cxx, rtol=1e-10, atol=1e-8)
+        np.testing.assert_allclose(merged.solve()[0], whole.solve()[0], rtol=1e-8, atol=1e-10)
+
+    def test_metrics_without_held_out_rows_are_nan(self, monkeypatch):
+        """Test evaluating on zero rows warns and returns NaN metrics instead of dividing by zero"""
+        from src.models import streaming_train
+        warnings = []
+        monkeypatch.setattr(streaming_train.logger, 'warning', warnings.append)
+
+        metrics = StreamedMetrics().result()
+        assert metrics['rows'] == 0
+        assert all(np.isnan(metrics[key]) for key in ('mse', 'rmse', 'mae', 'r2'))
+        assert len(warnings) == 1 and 'No held-out rows' in warnings[0]
+
+    def test_split_is_deterministic_and_near_target_fraction(self):
+        """Test the id-hash split is stable and holds out about 20% of rows"""
+        ids = np.arange(1, 100_001)
+        test = is_test_row(ids)
+        assert np.array_equal(test, is_test_row(ids))
+        assert 0.19 < test.mean() < 0.21
+
+
+@pytest.fixture
+def complete_meter_df():
+    """Meter features without missing values (so fill means don't matter)"""
+    return pd.read_csv(METER_DATA_CSV, nrows=1500).dropna(subset=FEATURE_COLS + [TARGET_COL])
+
+
+@pytest.mark.unit
+class TestIncrementalTraining:
+    """Test warm-start retraining from persisted training state"""
+
+    def test_incremental_fit_matches_full_fit(self, complete_meter_df, tmp_path):
+        """Test folding appended rows into saved state equals a full retrain on all rows"""
+        path = tmp_path / 'meter_features.csv'
+        state_path = tmp_path / 'training_state.json'
+        head, tail = complete_meter_df.iloc[:900], complete_meter_df.iloc[900:]
+        head.to_csv(path, index=False)
+        _, _, _, state = retrain_linear_regression(str(path), None, chunksize=128)
+        save_training_state(state, str(state_path))
+
+        tail.to_csv(path, mode='a', header=False, index=False)
+        model, metrics, _, new_state = retrain_linear_regression(
+            str(path), load_training_state(str(state_path)), chunksize=128)
+        full_model, full_metrics, _, full_state = retrain_linear_regression(
+            str(path), new_state, chunksize=128, full=True)
+
+        assert metrics['mode'] == 'incremental' and full_metrics['mode'] == 'full'
+        assert metrics['new_rows'] == len(tail)
+        assert new_state['max_id'] == full_state['max_id'] == int(complete_meter_df['id'].max())
+        assert metrics['train_rows'] == full_metrics['train_rows']
+        assert model.rank_ == full_model.rank_
+        np.testing.assert_allclose(model.coef_, full_model.coef_, rtol=1e-7, atol=1e-9)
+        assert model.intercept_ == pytest.approx(full_model.intercept_, rel=1e-9)
+        assert metrics['rmse'] == pytest.approx(full_metrics['rmse'], rel=1e-7)
+        assert metrics['r2'] == pytest.approx(full_metrics['r2'], rel=1e-7)
+
+    def test_no_new_rows_keeps_the_model(self, complete_meter_df, tmp_path):
+        """Test a retrain with nothing appended reads no rows and reproduces the model"""
+        path = tmp_path / 'meter_features.csv'
+        complete_meter_df.to_csv(path, index=False)
+        model, _, _, state = retrain_linear_regression(str(path), None, chunksize=256)
+        again, metrics, _, _ = retrain_linear_regression(str(path), state, chunksize=256)
+
+        assert metrics['new_rows'] == 0
+        np.testing.assert_array_equal(again.coef_, model.coef_)
+
+    def test_rewritten_input_is_scanned_by_id(self, complete_meter_df, tmp_path):
+        """Test a rewritten (not appended) file still only contributes rows past the id watermark"""
+        path = tmp_path / 'meter_features.csv'
+        complete_meter_df.iloc[:900].to_csv(path, index=False)
+        _, _, _, state = retrain_linear_regression(str(path), None, chunksize=256)
+
+        complete_meter_df.iloc[::-1].to_csv(path, index=False)
+        _, metrics, _, _ = retrain_linear_regression(str(path), state, chunksize=256)
+        assert metrics['new_rows'] == len(complete_meter_df) - 900
+
+    def test_state_for_other_features_is_ignored(self, tmp_path):
+        """Test a state saved for a different feature list forces a full retrain"""
+        state_path = tmp_path / 'training_state.json'
+        save_training_state({'format': 1, 'features': ['voltage'], 'test_fraction': 0.2}, str(state_path))
+        assert load_training_state(str(state_path)) is None
+        assert load_training_state(str(tmp_path / 'missing.json')) is None
+
+
+@pytest.fixture
+def sweep_data():
+    """[features | target] matrix with a known linear target"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 3))
+    y = X @ np.array([1.5, -2.0, 0.5]) + 3.0 + rng.normal(scale=0.1, size=400)
+    return np.column_stack([X, y])
+
+
+@pytest.mark.unit
+class TestModelSweep:
+    """Test the parallel k-fold model sweep"""
+
+    def test_parallel_folds_match_sequential_cross_validation(self, sweep_data):
+        """Test fold metrics from shared-memory workers equal a plain in-process fit on the same folds"""
+        candidates = [
+            {'name': 'linear', 'model': 'linear', 'params': {}},
+            {'name': 'ridge_alpha_1000', 'model': 'ridge', 'params': {'alpha': 1000.0}},
+        ]
+        summaries = run_sweep(sweep_data, candidates, folds=4, workers=2)
+
+        assert [s['name'] for s in summaries] == ['linear', 'ridge_alpha_1000']
+        fold_of_row = assign_folds(len(sweep_data), 4)
+        X, y = sweep_data[:, :-1], sweep_data[:, -1]
+        for fold, metrics in enumerate(summaries[0]['folds']):
+            validation = fold_of_row == fold
+            y_pred = LinearRegression().fit(X[~validation], y[~validation]).predict(X[validation])
+            assert metrics['rmse'] == pytest.approx(mean_squared_error(y[validation], y_pred) ** 0.5)
+        assert summaries[0]['rmse_mean'] < 0.2 < summaries[1]['rmse_mean']
+
+    def test_folds_partition_rows_evenly(self):
+        """Test every row is in exactly one fold and fold sizes differ by at most one"""
+        fold_of_row = assign_folds(103, 5)
+        counts = np.bincount(fold_of_row)
+        assert counts.sum() == 103 and counts.max() - counts.min() <= 1
+        assert np.array_equal(fold_of_row, assign_folds(103, 5))
+
+    def test_grid_file_is_validated(self, tmp_path):
+        """Test a grid with an unknown model type fails before any fold runs"""
+        grid = tmp_path / 'grid.json'
+        grid.write_text('[{"name": "svm", "model": "svm", "params": {}}]')
+        with pytest.raises(ValueError, match='Unknown model'):
+            load_candidates(str(grid))
+        assert {spec['model'] for spec in load_candidates(None)} >= {'ridge', 'lasso', 'random_forest'}
+
+    def test_sweep_is_opt_in(self, monkeypatch):
+        """Test the DAG task does no work unless MODEL_SWEEP_ENABLED is set"""
+        from src.models import model_sweep
+
+        def fail(*args, **kwargs):
+            raise AssertionError('sweep data loaded')
+        monkeypatch.setattr(model_sweep, 'MODEL_SWEEP_ENABLED', False)
+        monkeypatch.setattr(model_sweep, 'load_sweep_data', fail)
+        assert model_sweep.run_model_sweep() is None
+
+    def test_candidates_are_logged_as_runs(self, sweep_data, tmp_path, monkeypatch):
+        """Test every candidate becomes a run (spooled offline) and only the best carries the model"""
+        from src.models import tracking
+        monkeypatch.setattr(tracking, 'MLFLOW_TRACKING_URI', UNREACHABLE_URI)
+        monkeypatch.setattr(tracking, 'MLFLOW_SPOOL_DIR', str(tmp_path / 'spool'))
+        candidates = [
+            {'name': 'linear', 'model': 'linear', 'params': {}},
+            {'name': 'ridge_alpha_1000', 'model': 'ridge', 'params': {'alpha': 1000.0}},
+        ]
+        summaries = run_sweep(sweep_data, candidates, folds=3, workers=1)
+        (tmp_path / 'best.pkl').write_bytes(b'model')
+
+        results = log_sweep_to_mlflow(summaries, 'sweep-1', 3, str(tmp_path / 'best.pkl'))
+
+        assert [r['status'] for r in results] == ['spooled', 'spooled']
+        records = [json.loads(open(os.path.join(r['path'], RUN_RECORD_NAME)).read()) for r in results]
+        assert [r['params']['candidate'] for r in records] == ['linear', 'ridge_alpha_1000']
+        assert records[1]['params']['alpha'] == '1000.0' and records[0]['tags']['sweep_id'] == 'sweep-1'
+        assert records[0]['metrics']['rmse_mean'] == pytest.approx(summaries[0]['rmse_mean'])
+        assert [len(r['artifacts']) for r in records] == [1, 0]
+
+
+@pytest.fixture
+def grouped_data():
+    """Rows from three groups with different true coefficients, plus one tiny group"""
+    rng = np.random.default_rng(3)
+    codes = np.r_[np.repeat([0, 1, 2], 60), [3, 3]]
+    rng.shuffle(codes)
+    X = rng.normal(size=(len(codes), 4)) + [0, 5, 0, 0]
+    X[:, 3] = 1.0  # constant column: every group is rank deficient
+    weights = np.array([[1.0, 2.0, 0.0, 0.0], [-1.0, 0.5, 3.0, 0.0], [0.0, 0.0, -2.0, 0.0], [9.0, 9.0, 9.0, 0.0]])
+    y = np.einsum('ij,ij->i', X, weights[codes]) + codes * 10.0 + rng.normal(scale=0.01, size=len(codes))
+    return X, y, codes
+
+
+@pytest.mark.unit
+class TestPartitionedModels:
+    """Test batched per-group least squares and the coefficient table"""
+
+    def test_grouped_fit_matches_one_fit_per_group(self, grouped_data, monkeypatch):
+        """Test one batched solve equals LinearRegression fit on each group separately"""
+        from src.models import partitioned
+        monkeypatch.setattr(partitioned, 'GRAM_BLOCK_ROWS', 50)  # groups straddle row blocks
+        X, y, codes = grouped_data
+        coef, intercept, counts, rank = grouped_least_squares(X, y, codes, 5)
+
+        assert counts.tolist() == [60, 60, 60, 2, 0]
+        for g in range(4):
+            reference = LinearRegression().fit(X[codes == g], y[codes == g])
+            np.testing.assert_allclose(coef[g], reference.coef_, atol=1e-9)
+            assert intercept[g] == pytest.approx(reference.intercept_)
+            assert rank[g] == reference.rank_
+        assert not coef[4].any() and rank[4] == 0
+
+    def test_sparse_groups_and_unknown_meters_use_the_global_model(self, grouped_data, tmp_path):
+        """Test small groups map to the global row and the table round-trips through .npz"""
+        X, y, codes = grouped_data
+        meter_ids = np.array([f"MTR{c:07d}" for c in codes], dtype=object)
+        global_model = LinearRegression().fit(X, y)
+        table = fit_partitioned(X, y, meter_ids, meter_ids, global_model.coef_, global_model.intercept_,
+                                ['a', 'b', 'c', 'd'], 'meter_id', min_rows=10)
+        table.model_version = 'abc123'
+        loaded = CoefficientTable.load(table.save(str(tmp_path / 'table.npz')))
+
+        assert loaded.n_partitions == 3 and loaded.model_version == 'abc123'
+        lookup = ['MTR0000001', 'MTR0000003', 'MTR9999999', None]
+        rows = loaded.rows_for(lookup)
+        assert rows[1] == rows[2] == rows[3] == 0 and rows[0] != 0
+        predictions = loaded.predict(X[:4], lookup)
+        assert predictions[1] == pytest.approx(global_model.predict(X[1:2])[0])
+        own = LinearRegression().fit(X[codes == 1], y[codes == 1])
+        assert predictions[0] == pytest.approx(own.predict(X[:1])[0])
+        assert loaded.predict_one(X[0].tolist(), 'MTR0000001') == pytest.approx(predictions[0])
+
+    def test_connection_type_partitions_map_every_meter(self, grouped_data):
+        """Test per-connection-type models are looked up through each meter's type"""
+        X, y, codes = grouped_data
+        meter_ids = np.array([f"MTR{i:07d}" for i in range(len(codes))], dtype=object)
+        types = np.array(['Domestic', 'Commercial', 'Industrial', 'Other'], dtype=object)[codes]
+        table = fit_partitioned(X, y, meter_ids, types, np.zeros(4), 0.0, ['a', 'b', 'c', 'd'],
+                                'connection_type', min_rows=10)
+
+        rows = table.rows_for(meter_ids)
+        labels = np.r_[['global'], table.group_labels][rows]
+        assert np.array_equal(labels[codes < 3], types[codes < 3])
+        assert (rows[codes == 3] == 0).all()
+
+
+# Nothing listens on the discard port, so the health check fails fast
+UNREACHABLE_URI = 'http://127.0.0.1:9'
+
+
+@pytest.fixture
+def run_record(tmp_path):
+    model_path = tmp_path / 'model.pkl'
+    model_path.write_bytes(b'model v1')
+    return make_run_record({'model_type': 'LinearRegression', 'train_mode': 'memory'},
+                           {'rmse': 0.5, 'fit_seconds': 1.25}, [(str(model_path), 'model')])
+
+
+class FailingClient:
+    """Client whose first call fails, like a server dropping mid-run"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_experiment_by_name(self, name):
+        self.calls += 1
+        raise ConnectionError('connection reset')
+
+
+class UploadClient:
+    """Client recording artifact uploads, which wait for `release` to be set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.uploads = []
+        self.terminated = []
+
+    def log_artifact(self, run_id, path, artifact_path=None):
+        assert self.release.wait(timeout=10)
+        self.uploads.append((run_id, artifact_path))
+
+    def set_terminated(self, run_id):
+        self.terminated.append(run_id)
+
+
+@pytest.mark.unit
+class TestRunTracking:
+    """Test batched MLflow logging with a local spool fallback"""
+
+    def test_unreachable_server_spools_the_run(self, run_record, tmp_path):
+        """Test a down server spools params, metrics and a copy of the artifacts"""
+        spool_dir = tmp_path / 'spool'
+        assert not tracking_server_available(UNREACHABLE_URI, timeout=1)
+
+        result = record_run(run_record, UNREACHABLE_URI, str(spool_dir))
+        (tmp_path / 'model.pkl').write_bytes(b'model v2')  # the next training run overwrites it
+
+        assert result['status'] == 'spooled' and result['run_id'] is None
+        record = json.loads((spool_dir / run_record['id'] / RUN_RECORD_NAME).read_text())
+        assert record['metrics'] == {'rmse': 0.5, 'fit_seconds': 1.25}
+        assert record['params']['train_mode'] == 'memory'
+        assert open(record['artifacts'][0]['path'], 'rb').read() == b'model v1'
+        assert replay_spooled_runs(UNREACHABLE_URI, str(spool_dir)) == 0
+        assert (spool_dir / run_record['id']).exists()
+
+    def test_failure_while_logging_spools_the_run(self, run_record, tmp_path):
+        """Test an error from the client spools the run instead of failing the task"""
+        client = FailingClient()
+        result = record_run(run_record, 'file:///unused', str(tmp_path / 'spool'),
+                            client_factory=lambda uri: client)
+
+        assert result['status'] == 'spooled'
+        assert os.path.exists(os.path.join(result['path'], RUN_RECORD_NAME))
+        assert not os.path.exists(os.path.join(result['path'], UPLOAD_MARKER_NAME))
+
+    def test_record_run_waits_for_the_upload(self, run_record, tmp_path):
+        """Test record_run returns once the artifacts are uploaded and the spooled run is gone"""
+        spool_dir = str(tmp_path / 'spool')
+        client = UploadClient()
+        client.release.set()
+
+        result = record_run(dict(run_record, run_id='run-1'), 'file:///unused', spool_dir,
+                            client_factory=lambda uri: client)
+        assert result['status'] == 'logged' and not result['upload'].is_alive()
+        assert client.uploads == [('run-1', 'model')] and os.listdir(spool_dir) == []
+
+    def test_slow_upload_outlasting_the_wait_is_not_replayed_twice(self, run_record, tmp_path):
+        """Test record_run stops waiting after `wait` seconds and a replay skips the in-flight run"""
+        spool_dir = str(tmp_path / 'spool')
+        client = UploadClient()
+        record = dict(run_record, run_id='run-1')  # params/metrics already on the server
+
+        result = record_run(record, 'file:///unused', spool_dir, client_factory=lambda uri: client, wait=0.1)
+        assert result['status'] == 'uploading' and result['upload'].is_alive()
+        assert replay_spooled_runs('file:///unused', spool_dir, client_factory=lambda uri: client) == 0
+
+        client.release.set()
+        result['upload'].join(timeout=10)
+        assert client.uploads == [('run-1', 'model')] and client.terminated == ['run-1']
+        assert os.listdir(spool_dir) == []
+
+    def test_replay_takes_over_an_abandoned_upload(self, run_record, tmp_path):
+        """Test a claim left by a process that stopped uploading is replayed under the same run id"""
+        spool_dir = str(tmp_path / 'spool')
+        run_dir = spool_run_record(dict(run_record, run_id='run-1'), spool_dir, claim=True)
+        client = UploadClient()
+        client.release.set()
+
+        assert replay_spooled_runs('file:///unused', spool_dir, client_factory=lambda uri: client) == 0
+        marker = os.path.join(run_dir, UPLOAD_MARKER_NAME)
+        assert os.path.exists(marker)  # held by a live process that is still making progress
+
+        os.utime(marker, (1, 1))  # no progress for longer than MLFLOW_UPLOAD_TIMEOUT
+        assert replay_spooled_runs('file:///unused', spool_dir, client_factory=lambda uri: client) == 1
+        assert client.uploads == [('run-1', 'model')] and os.listdir(spool_dir) == []
+
+    def test_log_model_to_mlflow_works_offline(self, tmp_path, monkeypatch):
+        """Test the DAG task spools the run with timings when the server is unreachable"""
+        from src.models import tracking, train
+        monkeypatch.setattr(tracking, 'MLFLOW_TRACKING_URI', UNREACHABLE_URI)
+        monkeypatch.setattr(tracking, 'MLFLOW_SPOOL_DIR', str(tmp_path / 'spool'))
+        monkeypatch.setattr(train, 'MODEL_DIR', str(tmp_path))
+        monkeypatch.setattr(train, 'PARTITIONS_PATH', str(tmp_path / 'missing.npz'))
+        (tmp_path / 'linear_regression_model.pkl').write_bytes(b'model')
+        xcom = {'rmse': 0.5, 'mae': 0.4, 'r2': 0.9, 'params': {'train_mode': 'memory'},
+                'timings': {'load_seconds': 0.1, 'fit_seconds': 0.2}}
+
+        class TaskInstance:
+            def xcom_pull(self, task_ids, key):
+                return xcom.get(key)
+
+        train.log_model_to_mlflow(ti=TaskInstance())
+
+        (run_dir,) = (tmp_path / 'spool').iterdir()
+        record = json.loads((run_dir / RUN_RECORD_NAME).read_text())
+        assert record['metrics'] == {'rmse': 0.5, 'mae': 0.4, 'r2': 0.9, 'load_seconds': 0.1, 'fit_seconds': 0.2}
+        assert record['params']['model_type'] == 'LinearRegression'
+
+    def test_replay_logs_one_batch_per_run(self, run_record, tmp_path):
+        """Test a spooled run replays into a file store with one log_batch call"""
+        mlflow_tracking = pytest.importorskip('mlflow.tracking')
+        spool_dir = tmp_path / 'spool'
+        record_run(run_record, UNREACHABLE_URI, str(spool_dir))
+        store_uri = (tmp_path / 'mlruns').as_uri()
+        client = mlflow_tracking.MlflowClient(tracking_uri=store_uri)
+        batches = []
+        log_batch = client.log_batch
+        client.log_batch = lambda *args, **kw: batches.append(args) or log_batch(*args, **kw)
+
+        assert replay_spooled_runs(store_uri, str(spool_dir), client_factory=lambda uri: client) == 1
+        assert len(batches) == 1 and not os.listdir(spool_dir)
+        run = client.search_runs([client.get_experiment_by_name(run_record['experiment']).experiment_id])[0]
+        assert run.data.metrics == {'rmse': 0.5, 'fit_seconds': 1.25}
+        assert [a.path for a in client.list_artifacts(run.info.run_id, 'model')] == ['model/model.pkl']